@@ -0,0 +1,72 @@
+"""
+Бенчмарк маршрутизации callback_query: обычный Router против TrieRouter.
+
+Регистрирует N обработчиков F.data.startswith("act{i}_") и измеряет среднее
+время прохождения callback'а до последнего зарегистрированного обработчика
+(худший случай для линейного перебора).
+
+Запуск из корня репозитория:
+    python benchmarks/callback_dispatch.py
+    python benchmarks/callback_dispatch.py --handlers 10 100 1000 --iterations 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import F, Router  # noqa: E402
+from aiogram.types import CallbackQuery, User  # noqa: E402
+
+from bot.utils.callback_router import TrieRouter  # noqa: E402
+
+
+def build_router(router_cls, handlers: int) -> Router:
+    router = router_cls()
+
+    for i in range(handlers):
+        async def handler(callback: CallbackQuery, _i=i):
+            return _i
+
+        router.callback_query.register(handler, F.data.startswith(f"act{i}_"))
+
+    return router
+
+
+async def measure(router: Router, data: str, iterations: int) -> float:
+    """Среднее время одного прохождения события через роутер, мкс"""
+    event = CallbackQuery(
+        id="1",
+        from_user=User(id=1, is_bot=False, first_name="bench"),
+        chat_instance="bench",
+        data=data,
+    )
+
+    # Прогрев
+    for _ in range(50):
+        await router.propagate_event("callback_query", event)
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await router.propagate_event("callback_query", event)
+    return (time.perf_counter() - started) / iterations * 1_000_000
+
+
+async def main(handler_counts, iterations: int) -> None:
+    print(f"{'handlers':>9} | {'Router, мкс':>12} | {'TrieRouter, мкс':>16}")
+    print("-" * 44)
+    for count in handler_counts:
+        data = f"act{count - 1}_12345"
+        linear = await measure(build_router(Router, count), data, iterations)
+        trie = await measure(build_router(TrieRouter, count), data, iterations)
+        print(f"{count:>9} | {linear:>12.1f} | {trie:>16.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--handlers", type=int, nargs="+", default=[10, 50, 150, 500, 1000])
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main(args.handlers, args.iterations))
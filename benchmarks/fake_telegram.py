@@ -0,0 +1,193 @@
+"""
+Локальная замена Telegram Bot API для нагрузочных тестов.
+
+aiohttp-сервер принимает запросы вида /bot{token}/{method} и отвечает
+правдоподобными объектами: send*/edit* возвращают Message, sendMediaGroup —
+список Message, getFile — File, скачивание /file/bot{token}/{path} отдаёт
+случайные байты нужного размера. Остальные методы отвечают True.
+
+Сервер запоминает inline-кнопки, отправленные в каждый чат, чтобы сценарий
+нагрузочного теста мог «нажать» кнопку, которую на самом деле прислал бот.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from collections import Counter, defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "LoadTestBot", "username": "load_test_bot"}
+
+# Размер файла можно зашить в file_id: "lt-doc-65536-17" — 64 КБ
+_FILE_SIZE_RE = re.compile(r"-(\d+)-\d+$")
+DEFAULT_FILE_SIZE = 32 * 1024
+
+# Методы, отвечающие объектом Message
+_MESSAGE_METHODS = {
+    "sendMessage", "sendPhoto", "sendDocument", "sendVideo", "sendAnimation",
+    "sendAudio", "sendVoice", "sendSticker", "forwardMessage",
+    "editMessageText", "editMessageCaption", "editMessageReplyMarkup", "editMessageMedia",
+}
+
+_MEDIA_FIELDS = {
+    "sendPhoto": "photo",
+    "sendDocument": "document",
+    "sendVideo": "video",
+}
+
+
+def file_size_from_id(file_id: str) -> int:
+    """Размер файла, зашитый в file_id (или размер по умолчанию)"""
+    match = _FILE_SIZE_RE.search(file_id)
+    return int(match.group(1)) if match else DEFAULT_FILE_SIZE
+
+
+def _chat(chat_id: Any) -> Dict[str, Any]:
+    chat_id = int(chat_id)
+    if chat_id > 0:
+        return {"id": chat_id, "type": "private", "first_name": "User"}
+    return {"id": chat_id, "type": "supergroup", "title": "Chat"}
+
+
+def _callback_data(reply_markup: Optional[str]) -> List[str]:
+    if not reply_markup:
+        return []
+    try:
+        markup = json.loads(reply_markup)
+    except ValueError:
+        return []
+    return [
+        button["callback_data"]
+        for row in markup.get("inline_keyboard", ())
+        for button in row
+        if button.get("callback_data")
+    ]
+
+
+class FakeTelegramServer:
+    """Сервер-заглушка Bot API; latency — искусственная задержка ответа, сек"""
+
+    def __init__(self, latency: float = 0.0, keep_markups: int = 20) -> None:
+        self.latency = latency
+        self.keep_markups = keep_markups
+
+        self.calls: Counter = Counter()
+        self.downloaded_bytes = 0
+        self._markups: Dict[int, Deque[List[str]]] = defaultdict(lambda: deque(maxlen=self.keep_markups))
+        self._message_id = 0
+
+        self._app = web.Application()
+        self._app.router.add_post("/bot{token}/{method}", self._handle_method)
+        self._app.router.add_get("/file/bot{token}/{path:.+}", self._handle_download)
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Запустить сервер; возвращает базовый URL (порт 0 — любой свободный)"""
+        self._runner = web.AppRunner(self._app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{bound_port}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def find_callback(self, chat_id: int, prefix: str) -> Optional[str]:
+        """callback_data последней кнопки с указанным префиксом, отправленной в чат"""
+        for buttons in reversed(self._markups.get(chat_id, ())):
+            for data in buttons:
+                if data.startswith(prefix):
+                    return data
+        return None
+
+    def _next_message(self, chat_id: Any, message_id: Any = None) -> Dict[str, Any]:
+        if message_id is None:
+            self._message_id += 1
+            message_id = self._message_id
+        return {
+            "message_id": int(message_id),
+            "date": int(time.time()),
+            "chat": _chat(chat_id),
+            "from": BOT_USER,
+        }
+
+    def _remember_markup(self, chat_id: Any, reply_markup: Optional[str]) -> None:
+        buttons = _callback_data(reply_markup)
+        if buttons and chat_id is not None:
+            self._markups[int(chat_id)].append(buttons)
+
+    async def _handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        params = dict(await request.post())
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        return web.json_response({"ok": True, "result": self._result(method, params)})
+
+    def _result(self, method: str, params: Dict[str, Any]) -> Any:
+        chat_id = params.get("chat_id")
+
+        if method == "getMe":
+            return BOT_USER
+
+        if method == "getFile":
+            file_id = str(params["file_id"])
+            return {
+                "file_id": file_id,
+                "file_unique_id": file_id,
+                "file_size": file_size_from_id(file_id),
+                "file_path": f"documents/{file_id}",
+            }
+
+        if method == "sendMediaGroup":
+            media = json.loads(params.get("media") or "[]")
+            return [self._next_message(chat_id) for _ in media]
+
+        if method == "copyMessage":
+            self._remember_markup(chat_id, params.get("reply_markup"))
+            return {"message_id": self._next_message(chat_id)["message_id"]}
+
+        if method in _MESSAGE_METHODS:
+            if method.startswith("edit") and chat_id is None:
+                # Сообщение по inline_message_id
+                return True
+
+            self._remember_markup(chat_id, params.get("reply_markup"))
+            message = self._next_message(chat_id, params.get("message_id"))
+            if "text" in params:
+                message["text"] = params["text"]
+            if "caption" in params:
+                message["caption"] = params["caption"]
+
+            field = _MEDIA_FIELDS.get(method)
+            if field and isinstance(params.get(field), str):
+                file_id = params[field]
+                if field == "photo":
+                    message["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 1, "height": 1}]
+                else:
+                    message[field] = {"file_id": file_id, "file_unique_id": file_id}
+            return message
+
+        # answerCallbackQuery, deleteMessage, setMyCommands и прочие
+        return True
+
+    async def _handle_download(self, request: web.Request) -> web.Response:
+        self.calls["download"] += 1
+        path = request.match_info["path"]
+        size = file_size_from_id(path.rsplit("/", 1)[-1])
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        self.downloaded_bytes += size
+        return web.Response(body=os.urandom(size), content_type="application/octet-stream")
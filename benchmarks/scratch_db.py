@@ -0,0 +1,39 @@
+"""Общее для бенчмарков, которые работают с отдельной (scratch) базой PostgreSQL"""
+import argparse
+import os
+import sys
+
+SCRATCH_MARKERS = ("bench", "load", "test", "scratch")
+FAKE_BOT_TOKEN = "123456:LOADTEST-fake-token"
+
+
+def add_database_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--database-url", default=os.getenv("LOADTEST_DATABASE_URL"),
+                        help="URL тестовой БД (по умолчанию LOADTEST_DATABASE_URL; DATABASE_URL из .env не используется)")
+    parser.add_argument("--force", action="store_true", help="разрешить БД без bench/load/test/scratch в имени")
+
+
+def check_scratch_database(url: str, force: bool) -> None:
+    """Не даём случайно запустить бенчмарк на рабочей базе"""
+    from sqlalchemy.engine import make_url
+
+    if not url:
+        sys.exit("❌ Укажите --database-url или LOADTEST_DATABASE_URL")
+
+    database = (make_url(url).database or "").lower()
+    if force or any(marker in database for marker in SCRATCH_MARKERS):
+        return
+    sys.exit(
+        f"❌ База {database!r} не похожа на тестовую (ожидается bench/load/test/scratch в имени). "
+        f"Если уверены — добавьте --force."
+    )
+
+
+def use_database(url: str) -> None:
+    """
+    Переменные окружения для Data.config — вызывать до импорта модулей бота.
+
+    Токен всегда поддельный: бенчмарки не должны обращаться к настоящему Bot API.
+    """
+    os.environ["DATABASE_URL"] = url
+    os.environ["BOT_TOKEN"] = FAKE_BOT_TOKEN
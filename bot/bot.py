@@ -1,19 +1,96 @@
 """Модуль для создания и настройки бота"""
+from typing import Optional
+
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
-from Data.config import BOT_TOKEN
+from aiogram.client.session.base import BaseSession
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+from aiogram.fsm.storage.memory import MemoryStorage
+from Data.config import (
+    BOT_TOKEN, FSM_STORAGE, FSM_STATE_TTL, FSM_CLEANUP_INTERVAL, REDIS_URL,
+    UPDATE_CONCURRENCY, UPDATE_BACKLOG_LIMIT,
+    QUERY_STATS_ENABLED, N_PLUS_ONE_THRESHOLD, QUERY_STATS_LOG_ALL
+)
+from db.engine import engine
+from db.instrumentation import install_query_instrumentation
+from bot.middlewares import (
+    UpdateSchedulerMiddleware, CurrentUserMiddleware, QueryStatsMiddleware, PerfMiddleware,
+    HandlerTagMiddleware, LogContextMiddleware
+)
+from bot.utils.metrics import ApiTimingMiddleware
+
 
+def create_bot(session: Optional[BaseSession] = None) -> Bot:
+    """
+    Создает и возвращает экземпляр бота.
 
-def create_bot() -> Bot:
-    """Создает и возвращает экземпляр бота"""
-    return Bot(
+    session — своя HTTP-сессия (например, на локальный сервер Bot API
+    в нагрузочном тесте); по умолчанию запросы идут в api.telegram.org.
+    """
+    bot = Bot(
         token=BOT_TOKEN,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
+    # Время запросов к Telegram API учитывается в метриках обработчиков (/perf)
+    bot.session.middleware(ApiTimingMiddleware())
+    return bot
+
+
+def create_storage() -> BaseStorage:
+    """Создает хранилище FSM согласно FSM_STORAGE"""
+    if FSM_STORAGE == "postgres":
+        from bot.utils.fsm_storage import PostgresStorage
+        return PostgresStorage(state_ttl=FSM_STATE_TTL, cleanup_interval=FSM_CLEANUP_INTERVAL)
+
+    if FSM_STORAGE == "redis":
+        # Пакет redis нужен только в этом режиме
+        from aiogram.fsm.storage.redis import RedisStorage
+        from bot.utils.fsm_storage import dumps_compact
+        return RedisStorage.from_url(
+            REDIS_URL,
+            key_builder=DefaultKeyBuilder(with_destiny=True),
+            state_ttl=FSM_STATE_TTL,
+            data_ttl=FSM_STATE_TTL,
+            json_dumps=dumps_compact,
+        )
+
+    return MemoryStorage()
 
 
 def create_dispatcher() -> Dispatcher:
     """Создает и возвращает экземпляр диспетчера"""
-    return Dispatcher()
+    dp = Dispatcher(storage=create_storage())
+
+    # update_id и пользователь в каждой записи лога, в том числе из планировщика
+    dp.update.outer_middleware(LogContextMiddleware())
+
+    # Порядок обработки по пользователю + общий лимит параллельности;
+    # планировщик доступен обработчикам как update_scheduler (метрики очереди)
+    scheduler = UpdateSchedulerMiddleware(
+        max_concurrency=UPDATE_CONCURRENCY,
+        max_backlog=UPDATE_BACKLOG_LIMIT,
+    )
+    dp.update.outer_middleware(scheduler)
+    dp["update_scheduler"] = scheduler
+
+    # Учёт SQL-запросов обновления; регистрируется до CurrentUserMiddleware,
+    # чтобы в статистику попал и запрос пользователя при промахе кэша
+    if QUERY_STATS_ENABLED:
+        install_query_instrumentation(engine)
+        dp.update.outer_middleware(QueryStatsMiddleware(
+            n_plus_one_threshold=N_PLUS_ONE_THRESHOLD,
+            log_all=QUERY_STATS_LOG_ALL,
+        ))
+
+    # Гистограммы времени обработчиков (/perf, /metrics); внутри учёта запросов,
+    # чтобы на момент записи было известно время в БД
+    dp.update.outer_middleware(PerfMiddleware())
+    dp.message.middleware(HandlerTagMiddleware())
+    dp.callback_query.middleware(HandlerTagMiddleware())
+
+    # Пользователь из кэша передаётся обработчикам как current_user
+    dp.update.outer_middleware(CurrentUserMiddleware())
 
+    return dp
@@ -0,0 +1,5 @@
+"""Фильтры для Task Manager Bot"""
+
+from .role import RoleFilter
+
+__all__ = ["RoleFilter"]
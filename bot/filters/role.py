@@ -0,0 +1,27 @@
+"""Фильтр по роли пользователя"""
+from typing import Optional
+
+from aiogram.filters import BaseFilter
+from aiogram.types import TelegramObject
+
+from db.models import User, UserRole
+
+
+class RoleFilter(BaseFilter):
+    """
+    Пропускает событие, только если роль текущего пользователя входит в roles.
+
+    Роль берётся из current_user (CurrentUserMiddleware), поэтому проверка не
+    обращается к БД. Вешается на роутер целиком:
+
+        router.message.filter(RoleFilter(UserRole.ADMIN))
+
+    Если фильтр роутера не прошёл, aiogram пропускает и все его обработчики,
+    и вложенные роутеры.
+    """
+
+    def __init__(self, *roles: UserRole) -> None:
+        self.roles = frozenset(roles)
+
+    async def __call__(self, event: TelegramObject, current_user: Optional[User] = None) -> bool:
+        return current_user is not None and current_user.role in self.roles
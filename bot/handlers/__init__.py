@@ -7,6 +7,9 @@ def register_handlers(dp: Dispatcher):
     """Регистрация всех обработчиков"""
     dp.include_router(common.router)
     
+    # Роутеры ролей отсекаются фильтром RoleFilter на уровне роутера:
+    # обновление попадает только в роутер роли текущего пользователя
+    
     # 2. Обработчики для администраторов
     dp.include_router(admin.router)
     
@@ -15,3 +18,6 @@ def register_handlers(dp: Dispatcher):
     
     # 4. Обработчики для исполнителей
     dp.include_router(executor.router)
+    
+    # 5. Необработанные callback'и
+    dp.include_router(common.fallback_router)
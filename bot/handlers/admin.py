@@ -1,5 +1,7 @@
 """Обработчики для администратора"""
-from aiogram import Router, F, Bot
+from typing import Optional
+from aiogram import F, Bot
+from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.keyboard import InlineKeyboardBuilder
@@ -17,15 +19,20 @@ from db.queries import (
     ChatRequestQueries,
 )
 from db.queries.chat_queries import ChatQueries
-from db.models import UserRole, DirectionType, TaskStatus, Task
+from db.models import UserRole, DirectionType, TaskStatus, Task, User
+from bot.filters import RoleFilter
 from bot.keyboards.admin_kb import AdminKeyboards
 from bot.keyboards.common_kb import CommonKeyboards
 from states.admin_states import AdminStates
 from bot.utils.log_channel import LogChannel
 from bot.utils.message_utils import truncate_description_in_preview, TELEGRAM_MAX_MESSAGE_LENGTH
+from bot.utils.callback_router import TrieRouter
 from log import logger
 
-router = Router()
+router = TrieRouter()
+# Все обработчики роутера — только для администратора
+router.message.filter(RoleFilter(UserRole.ADMIN))
+router.callback_query.filter(RoleFilter(UserRole.ADMIN))
 
 
 async def notify_user_role_assigned(bot: Bot, user_telegram_id: int, role: UserRole, direction: DirectionType = None):
@@ -91,14 +98,10 @@ async def notify_user_role_assigned(bot: Bot, user_telegram_id: int, role: UserR
 
 
 @router.message(F.text == "📝 Заявки")
-async def admin_applications(message: Message):
+async def admin_applications(message: Message, current_user: Optional[User]):
     """Просмотр заявок (пользователей без роли)"""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await message.answer("❌ У вас нет доступа к этой функции")
-            return
+        user = current_user
         
         from sqlalchemy import select
         from db.models import User
@@ -137,12 +140,6 @@ async def admin_applications(message: Message):
 async def callback_applications(callback: CallbackQuery):
     """Обновление списка заявок"""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-        
         from sqlalchemy import select
         from db.models import User
         
@@ -266,12 +263,12 @@ async def callback_accept_application(callback: CallbackQuery, state: FSMContext
 
 
 @router.callback_query(F.data.startswith("admin_reject_application_"))
-async def callback_reject_application(callback: CallbackQuery):
+async def callback_reject_application(callback: CallbackQuery, current_user: Optional[User]):
     """Отклонение заявки"""
     user_id = int(callback.data.split("_")[-1])
     
     async with AsyncSessionLocal() as session:
-        admin = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
+        admin = current_user
         user = await UserQueries.get_user_by_id(session, user_id)
         
         if not user:
@@ -328,24 +325,19 @@ async def callback_reject_application(callback: CallbackQuery):
 
 
 @router.message(F.text == "👥 Управление пользователями")
-async def admin_user_management(message: Message):
+async def admin_user_management(message: Message, current_user: Optional[User]):
     """Управление пользователями"""
-    async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await message.answer("❌ У вас нет доступа к этой функции")
-            return
-        
-        text = """
+    user = current_user
+    
+    text = """
 👥 <b>УПРАВЛЕНИЕ ПОЛЬЗОВАТЕЛЯМИ</b>
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
 
 Выберите действие:
 """
-        
-        await message.answer(text, reply_markup=AdminKeyboards.user_management(), parse_mode="HTML")
-        logger.info(f"Админ {user.telegram_id} открыл управление пользователями")
+    
+    await message.answer(text, reply_markup=AdminKeyboards.user_management(), parse_mode="HTML")
+    logger.info(f"Админ {user.telegram_id} открыл управление пользователями")
 
 
 @router.callback_query(F.data == "admin_add_user")
@@ -433,7 +425,7 @@ async def process_role_selection(callback: CallbackQuery, state: FSMContext):
         return
     
     data = await state.get_data()
-    await state.update_data(role=selected_role)
+    await state.update_data(role=selected_role.value)
     
     user_name = data.get('user_name', 'Неизвестно')
     
@@ -477,7 +469,7 @@ async def process_role_selection(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("direction_"), AdminStates.waiting_user_direction)
-async def process_direction_selection(callback: CallbackQuery, state: FSMContext):
+async def process_direction_selection(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Обработка выбора направления"""
     direction_map = {
         "direction_design": DirectionType.DESIGN,
@@ -492,14 +484,14 @@ async def process_direction_selection(callback: CallbackQuery, state: FSMContext
         return
     
     data = await state.get_data()
-    await state.update_data(direction=selected_direction)
+    await state.update_data(direction=selected_direction.value)
     
     if data.get('edit_user_id'):
         user_id = data.get('edit_user_id')
-        new_role = data.get('new_role')
+        new_role = UserRole(data['new_role']) if data.get('new_role') else None
         
         async with AsyncSessionLocal() as session:
-            admin = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
+            admin = current_user
             user = await UserQueries.get_user_by_id(session, user_id)
             
             if not user:
@@ -585,6 +577,8 @@ async def process_direction_selection(callback: CallbackQuery, state: FSMContext
 async def create_new_user_with_temp_name(message, state: FSMContext, admin_telegram_id: int):
     """Создать нового пользователя с временным именем"""
     data = await state.get_data()
+    role = UserRole(data['role'])
+    direction = DirectionType(data['direction']) if data.get('direction') else None
     
     async with AsyncSessionLocal() as session:
         admin = await UserQueries.get_user_by_telegram_id(session, admin_telegram_id)
@@ -597,10 +591,10 @@ async def create_new_user_with_temp_name(message, state: FSMContext, admin_teleg
             new_user = await UserQueries.create_user(
                 session=session,
                 telegram_id=data['telegram_id'],
-                role=data['role'],
+                role=role,
                 first_name=temp_first_name,
                 last_name=temp_last_name,
-                direction=data.get('direction')
+                direction=direction
             )
             
 
@@ -612,8 +606,8 @@ async def create_new_user_with_temp_name(message, state: FSMContext, admin_teleg
                 entity_id=new_user.id,
                 details={
                     "telegram_id": data['telegram_id'],
-                    "role": data['role'].value,
-                    "direction": data.get('direction').value if data.get('direction') else None,
+                    "role": role.value,
+                    "direction": direction.value if direction else None,
                     "temp_name": True
                 }
             )
@@ -622,12 +616,12 @@ async def create_new_user_with_temp_name(message, state: FSMContext, admin_teleg
             notification_sent = await notify_user_role_assigned(
                 bot=bot,
                 user_telegram_id=new_user.telegram_id,
-                role=data['role'],
-                direction=data.get('direction')
+                role=role,
+                direction=direction
             )
             
             role_emoji = {"admin": "👑", "buyer": "👔", "executor": "🛠️"}
-            emoji = role_emoji.get(data['role'].value, "👤")
+            emoji = role_emoji.get(role.value, "👤")
             
             role_names = {
                 UserRole.ADMIN: "Администратор",
@@ -639,19 +633,19 @@ async def create_new_user_with_temp_name(message, state: FSMContext, admin_teleg
 ✅ <b>ПОЛЬЗОВАТЕЛЬ СОЗДАН</b>
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-{emoji} <b>Роль:</b> {role_names.get(data['role'], data['role'].value)}
+{emoji} <b>Роль:</b> {role_names.get(role, role.value)}
 🆔 <b>Telegram ID:</b> {data['telegram_id']}
 👤 <b>Статус:</b> Ожидается первый вход
 """
             
-            if data.get('direction'):
+            if direction:
                 direction_names = {
                     DirectionType.DESIGN: "🎨 Дизайн",
                     DirectionType.AGENCY: "🏢 Агенство",
                     DirectionType.COPYWRITING: "✍️ Копирайтинг",
                     DirectionType.MARKETING: "📱 Маркетинг"
                 }
-                success_text += f"📁 <b>Направление:</b> {direction_names.get(data['direction'], data['direction'].value)}\n"
+                success_text += f"📁 <b>Направление:</b> {direction_names.get(direction, direction.value)}\n"
             
             success_text += "\n━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
             
@@ -673,6 +667,8 @@ async def create_new_user_with_temp_name(message, state: FSMContext, admin_teleg
 async def assign_role_to_existing_user(message, state: FSMContext, admin_telegram_id: int):
     """Назначить роль существующему пользователю"""
     data = await state.get_data()
+    role = UserRole(data['role'])
+    direction = DirectionType(data['direction']) if data.get('direction') else None
     
     async with AsyncSessionLocal() as session:
         admin = await UserQueries.get_user_by_telegram_id(session, admin_telegram_id)
@@ -694,16 +690,17 @@ async def assign_role_to_existing_user(message, state: FSMContext, admin_telegra
         
         # Обновляем роль
         old_role = user.role
-        user.role = data['role']
+        user.role = role
         
         # Если исполнитель - обновляем направление
-        if data['role'] == UserRole.EXECUTOR and data.get('direction'):
-            user.direction = data['direction']
+        if role == UserRole.EXECUTOR and direction:
+            user.direction = direction
         # Если новая роль не исполнитель - удаляем направление
-        elif data['role'] != UserRole.EXECUTOR and user.direction is not None:
+        elif role != UserRole.EXECUTOR and user.direction is not None:
             user.direction = None
         
         await session.commit()
+        UserQueries.invalidate_cached_user(user.telegram_id)
         
         # Логируем
         action_type = "application_accepted" if data.get('is_application') else "role_assigned"
@@ -716,7 +713,7 @@ async def assign_role_to_existing_user(message, state: FSMContext, admin_telegra
             details={
                 "telegram_id": user.telegram_id,
                 "old_role": old_role.value if old_role else "без роли",
-                "new_role": data['role'].value,
+                "new_role": role.value,
                 "direction": user.direction.value if user.direction else None
             }
         )
@@ -726,12 +723,12 @@ async def assign_role_to_existing_user(message, state: FSMContext, admin_telegra
         notification_sent = await notify_user_role_assigned(
             bot=bot,
             user_telegram_id=user.telegram_id,
-            role=data['role'],
+            role=role,
             direction=user.direction
         )
         
         role_emoji = {"admin": "👑", "buyer": "👔", "executor": "🛠️"}
-        emoji = role_emoji.get(data['role'].value, "👤")
+        emoji = role_emoji.get(role.value, "👤")
         
         role_names = {
             UserRole.ADMIN: "Администратор",
@@ -745,7 +742,7 @@ async def assign_role_to_existing_user(message, state: FSMContext, admin_telegra
             UserRole.EXECUTOR: "🛠️"
         }
         
-        role_emoji = role_emojis.get(data['role'], "👤")
+        role_emoji = role_emojis.get(role, "👤")
         
         success_text = f"""
 ✅ <b>ЗАЯВКА ПРИНЯТА!</b>
@@ -754,7 +751,7 @@ async def assign_role_to_existing_user(message, state: FSMContext, admin_telegra
 👤 <b>Пользователь:</b> {user.first_name} {user.last_name or ''}
 📱 <b>Username:</b> @{user.username or 'не указан'}
 🆔 <b>Telegram ID:</b> <code>{user.telegram_id}</code>
-{role_emoji} <b>Роль:</b> {role_names.get(data['role'], data['role'].value)}
+{role_emoji} <b>Роль:</b> {role_names.get(role, role.value)}
 """
         
         if user.direction:
@@ -778,26 +775,23 @@ async def assign_role_to_existing_user(message, state: FSMContext, admin_telegra
         await message.answer(success_text, parse_mode="HTML")
         await state.clear()
         
-        logger.info(f"Админ {admin.telegram_id} назначил роль {data['role'].value} пользователю {user.telegram_id}")
+        logger.info(f"Админ {admin.telegram_id} назначил роль {role.value} пользователю {user.telegram_id}")
 
 
 @router.callback_query(F.data == "admin_list_users")
 async def callback_list_users(callback: CallbackQuery):
     """Список пользователей (оптимизировано)"""
     async with AsyncSessionLocal() as session:
-        # Быстрый подсчет без загрузки данных
-        total_count = await UserQueries.count_users_by_role(session, role=None, active_only=True)
+        # Страница и общее число одним запросом
+        page = 1
+        per_page = 8
+        users, total_count = await UserQueries.get_users_page(session, role=None, active_only=True, page=page, per_page=per_page)
         
         if total_count == 0:
             await callback.message.edit_text("📋 Пользователей не найдено")
             await callback.answer()
             return
         
-        # Загружаем только первую страницу (10 пользователей)
-        page = 1
-        per_page = 8
-        users = await UserQueries.get_all_users(session, role=None, active_only=True, page=page, per_page=per_page)
-        
         text = f"👥 <b>СПИСОК ПОЛЬЗОВАТЕЛЕЙ</b>\n\n📊 Всего: {total_count} пользователей\n\n"
         
         await callback.message.edit_text(
@@ -930,12 +924,6 @@ async def callback_general_stats(callback: CallbackQuery):
 async def admin_log_channels(message: Message):
     """Настройка каналов логов"""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await message.answer("❌ У вас нет доступа к этой функции")
-            return
-        
         # Получаем список каналов из БД
         from db.queries.channel_queries import ChannelQueries
         channels = await ChannelQueries.get_all_active_channels(session)
@@ -1024,7 +1012,7 @@ async def callback_add_channel(callback: CallbackQuery, state: FSMContext):
 
 
 @router.message(AdminStates.waiting_channel_id)
-async def process_channel_id(message: Message, state: FSMContext, bot: Bot):
+async def process_channel_id(message: Message, state: FSMContext, bot: Bot, current_user: Optional[User]):
     """Обработка ID канала"""
     try:
         channel_id = int(message.text.strip())
@@ -1048,7 +1036,7 @@ async def process_channel_id(message: Message, state: FSMContext, bot: Bot):
         
         async with AsyncSessionLocal() as session:
             from db.queries.channel_queries import ChannelQueries
-            user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
+            user = current_user
             
             # Добавляем канал в БД
             channel = await ChannelQueries.add_channel(
@@ -1092,13 +1080,9 @@ async def callback_list_channels(callback: CallbackQuery):
     """Список каналов (оптимизировано с пагинацией)"""
     async with AsyncSessionLocal() as session:
         from db.queries.channel_queries import ChannelQueries
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-        
-        total_count = await ChannelQueries.count_channels(session, active_only=True)
+        page = 1
+        per_page = 8
+        channels, total_count = await ChannelQueries.get_channels_page(session, active_only=True, page=page, per_page=per_page)
         
         if total_count == 0:
             await callback.message.edit_text(
@@ -1110,10 +1094,6 @@ async def callback_list_channels(callback: CallbackQuery):
             await callback.answer()
             return
         
-        page = 1
-        per_page = 8
-        channels = await ChannelQueries.get_all_channels(session, active_only=True, page=page, per_page=per_page)
-        
         text = f"📢 <b>УПРАВЛЕНИЕ КАНАЛАМИ</b>\n\n📊 Выберите канал из списка:\n\n"
         
         await callback.message.edit_text(
@@ -1133,13 +1113,7 @@ async def callback_channels_page(callback: CallbackQuery):
     
     async with AsyncSessionLocal() as session:
         from db.queries.channel_queries import ChannelQueries
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-        
-        total_count = await ChannelQueries.count_channels(session, active_only=True)
+        channels, total_count = await ChannelQueries.get_channels_page(session, active_only=True, page=page, per_page=per_page)
         
         if total_count == 0:
             await callback.message.edit_text(
@@ -1150,8 +1124,6 @@ async def callback_channels_page(callback: CallbackQuery):
             await callback.answer()
             return
         
-        channels = await ChannelQueries.get_all_channels(session, active_only=True, page=page, per_page=per_page)
-        
         text = f"📢 <b>УПРАВЛЕНИЕ КАНАЛАМИ</b>\n\n📊 Выберите канал из списка:\n\n"
         
         await callback.message.edit_text(
@@ -1170,12 +1142,6 @@ async def callback_view_channel(callback: CallbackQuery):
     
     async with AsyncSessionLocal() as session:
         from db.queries.channel_queries import ChannelQueries
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-        
         channel = await ChannelQueries.get_channel_by_db_id(session, channel_db_id)
         
         if not channel:
@@ -1267,12 +1233,6 @@ async def callback_delete_channel(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data == "noop")
-async def callback_noop(callback: CallbackQuery):
-    """Пустой callback для неактивных кнопок"""
-    await callback.answer()
-
-
 @router.callback_query(F.data == "stats_users")
 async def callback_stats_users(callback: CallbackQuery):
     """Статистика по пользователям (оптимизировано)"""
@@ -1491,6 +1451,117 @@ async def callback_stats_period(callback: CallbackQuery):
     await callback.answer()
 
 
+@router.callback_query(F.data == "stats_db")
+async def callback_stats_db(callback: CallbackQuery):
+    """Запросы к БД по обработчикам (с момента запуска)"""
+    from html import escape
+    from db.instrumentation import query_report
+
+    top = query_report.top(limit=10)
+    text = """
+🗄 <b>ЗАПРОСЫ К БД</b>
+━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+"""
+    if not top:
+        text += "📋 Данных пока нет.\n"
+    else:
+        text += "<b>Больше всего запросов на обновление:</b>\n"
+        for name, totals in top:
+            text += (
+                f"• <code>{escape(name)}</code>: "
+                f"{totals.statements / totals.updates:.1f} запр., "
+                f"{totals.db_time / totals.updates * 1000:.0f} мс "
+                f"(макс. {totals.max_statements}, вызовов {totals.updates})\n"
+            )
+
+    suspects = query_report.suspects()[:5]
+    if suspects:
+        text += "\n⚠️ <b>Вероятные N+1:</b>\n"
+        for name, shape, count in suspects:
+            text += f"• <code>{escape(name)}</code> ×{count}\n  <code>{escape(shape[:120])}</code>\n"
+
+    text += "\n━━━━━━━━━━━━━━━━━━━━━━━━━━"
+
+    await callback.message.edit_text(
+        text,
+        reply_markup=AdminKeyboards.statistics_menu(),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+def _render_perf(update_scheduler=None) -> str:
+    """Текст экрана производительности"""
+    from html import escape
+    from db.cache import task_card_cache, user_cache
+    from db.log_writer import log_writer
+    from bot.utils.metrics import perf_registry
+
+    def ms(seconds: float) -> str:
+        return f"{seconds * 1000:.0f}"
+
+    text = """
+⏱ <b>ПРОИЗВОДИТЕЛЬНОСТЬ</b>
+━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+"""
+    if update_scheduler:
+        queue = update_scheduler.stats()
+        text += (
+            f"📥 <b>Очередь:</b> в работе {queue['in_flight']}, ожидают {queue['backlog']} "
+            f"(макс. {queue['max_backlog_seen']}), обработано {queue['processed']}, "
+            f"отброшено {queue['shed']}\n"
+        )
+    cache = user_cache.stats()
+    text += f"👤 <b>Кэш пользователей:</b> попаданий {cache['hits']}, промахов {cache['misses']}\n"
+    cache = task_card_cache.stats()
+    text += f"📋 <b>Кэш карточек задач:</b> попаданий {cache['hits']}, промахов {cache['misses']}\n"
+    audit = log_writer.stats()
+    text += (
+        f"📝 <b>Буфер журнала:</b> в очереди {audit['backlog']}, записано {audit['written']} "
+        f"пачками {audit['batches']}, ожиданий {audit['blocked']}, потеряно {audit['failed']}\n\n"
+    )
+
+    top = perf_registry.top(limit=10)
+    if not top:
+        text += "📋 Данных пока нет.\n"
+    else:
+        text += "<b>Самые медленные (p50 / p95 / p99, мс):</b>\n"
+        for name, metrics in top:
+            wall = metrics.wall
+            text += (
+                f"• <code>{escape(name)}</code>: "
+                f"{ms(wall.quantile(0.5))} / {ms(wall.quantile(0.95))} / {ms(wall.quantile(0.99))}\n"
+                f"  БД p95 {ms(metrics.db.quantile(0.95))} · API p95 {ms(metrics.api.quantile(0.95))} · "
+                f"вызовов {wall.count} · ошибок {metrics.errors}\n"
+            )
+
+    text += "\n━━━━━━━━━━━━━━━━━━━━━━━━━━"
+    return text
+
+
+@router.message(Command("perf"))
+async def cmd_perf(message: Message, update_scheduler=None):
+    """Производительность обработчиков (/perf)"""
+    await message.answer(
+        _render_perf(update_scheduler),
+        reply_markup=AdminKeyboards.statistics_menu(),
+        parse_mode="HTML"
+    )
+
+
+@router.callback_query(F.data == "stats_perf")
+async def callback_stats_perf(callback: CallbackQuery, update_scheduler=None):
+    """Производительность обработчиков"""
+    await callback.message.edit_text(
+        _render_perf(update_scheduler),
+        reply_markup=AdminKeyboards.statistics_menu(),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
 @router.callback_query(F.data.startswith("period_"))
 async def callback_period_selected(callback: CallbackQuery):
     """Обработка выбора периода"""
@@ -1558,14 +1629,10 @@ async def callback_period_selected(callback: CallbackQuery):
 
 
 @router.message(F.text == "📋 Все задачи")
-async def admin_all_tasks(message: Message):
+async def admin_all_tasks(message: Message, current_user: Optional[User]):
     """Все задачи в системе"""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await message.answer("❌ У вас нет доступа к этой функции")
-            return
+        user = current_user
         
         from sqlalchemy import select
         from db.models import Task
@@ -1660,17 +1727,13 @@ async def callback_admin_task_details(callback: CallbackQuery):
     task_id = int(callback.data.replace("admin_task_details_", ""))
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа")
-            return
-        
-        task = await TaskQueries.get_task_by_id(session, task_id)
+        # Задача, участники, файлы (без содержимого) и число сообщений — из кэша карточек
+        details = await TaskQueries.get_cached_task_details(session, task_id)
         
-        if not task:
+        if not details:
             await callback.answer("❌ Задача не найдена")
             return
+        task = details.task
         
         from bot.utils.time_tracker import get_execution_time_display
         from db.models import FileType
@@ -1693,17 +1756,16 @@ async def callback_admin_task_details(callback: CallbackQuery):
         # Получаем время выполнения
         execution_time = get_execution_time_display(task)
         
-        # Получаем статистику файлов
-        files = await FileQueries.get_task_files(session, task_id)
+        # Статистика файлов
+        files = details.files
         initial_files = [f for f in files if f.file_type == FileType.INITIAL]
         result_files = [f for f in files if f.file_type == FileType.RESULT]
         message_files = [f for f in files if f.file_type == FileType.MESSAGE]
-        total_files_size = await FileQueries.get_total_files_size(session, task_id)
+        total_files_size = sum(f.file_size or 0 for f in files)
         total_files_size_mb = total_files_size / (1024 * 1024) if total_files_size else 0
         
-        # Получаем статистику сообщений
-        messages = await MessageQueries.get_task_messages(session, task_id)
-        messages_count = len(messages)
+        # Статистика сообщений
+        messages_count = details.message_count
         
         # Получаем статистику правок
         from sqlalchemy import select, func
@@ -1787,12 +1849,6 @@ async def callback_admin_view_files(callback: CallbackQuery):
     task_id = int(callback.data.replace("admin_view_files_", ""))
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа")
-            return
-        
         task = await TaskQueries.get_task_by_id(session, task_id)
         
         if not task:
@@ -1858,12 +1914,6 @@ async def callback_admin_view_messages(callback: CallbackQuery):
     task_id = int(callback.data.replace("admin_view_messages_", ""))
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа")
-            return
-        
         task = await TaskQueries.get_task_by_id(session, task_id)
         
         if not task:
@@ -1910,12 +1960,6 @@ async def callback_admin_download_file(callback: CallbackQuery, bot: Bot):
     file_id = int(callback.data.replace("admin_download_file_", ""))
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа")
-            return
-        
         file_record = await FileQueries.get_file_by_id(session, file_id)
         
         if not file_record:
@@ -2000,12 +2044,6 @@ async def callback_admin_download_file(callback: CallbackQuery, bot: Bot):
 async def callback_admin_all_tasks(callback: CallbackQuery):
     """Возврат к списку всех задач"""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа")
-            return
-        
         from sqlalchemy import select
         from db.models import Task
         
@@ -2038,12 +2076,6 @@ async def callback_admin_tasks_page(callback: CallbackQuery):
     page = int(callback.data.replace("admin_tasks_page_", ""))
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа")
-            return
-        
         from sqlalchemy import select
         from db.models import Task
         
@@ -2069,38 +2101,33 @@ async def callback_admin_tasks_page(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "admin_main")
-async def callback_admin_main(callback: CallbackQuery, state: FSMContext):
+async def callback_admin_main(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Возврат в главное меню администратора"""
     await state.clear()
     
-    async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-        
-        text = """
+    user = current_user
+    
+    text = """
 👑 <b>ПАНЕЛЬ АДМИНИСТРАТОРА</b>
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
 
 Выберите действие:
 """
-        
-        # Удаляем inline-клавиатуру из текущего сообщения
-        try:
-            await callback.message.edit_reply_markup(reply_markup=None)
-        except:
-            pass
-        
-        # Отправляем новое сообщение с reply-клавиатурой
-        await callback.message.answer(
-            text,
-            reply_markup=AdminKeyboards.main_menu(),
-            parse_mode="HTML"
-        )
-        await callback.answer()
-        logger.info(f"Админ {user.telegram_id} вернулся в главное меню")
+    
+    # Удаляем inline-клавиатуру из текущего сообщения
+    try:
+        await callback.message.edit_reply_markup(reply_markup=None)
+    except:
+        pass
+    
+    # Отправляем новое сообщение с reply-клавиатурой
+    await callback.message.answer(
+        text,
+        reply_markup=AdminKeyboards.main_menu(),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+    logger.info(f"Админ {user.telegram_id} вернулся в главное меню")
 
 
 # ============ РЕДАКТИРОВАНИЕ ПОЛЬЗОВАТЕЛЕЙ ============
@@ -2109,19 +2136,16 @@ async def callback_admin_main(callback: CallbackQuery, state: FSMContext):
 async def callback_edit_user(callback: CallbackQuery, state: FSMContext):
     """Редактирование пользователя - показываем список (оптимизировано)"""
     async with AsyncSessionLocal() as session:
-        # Быстрый подсчет без загрузки данных
-        total_count = await UserQueries.count_users_by_role(session, role=None, active_only=True)
+        # Страница и общее число одним запросом
+        page = 1
+        per_page = 8
+        users, total_count = await UserQueries.get_users_page(session, page=page, per_page=per_page)
         
         if total_count == 0:
             await callback.message.edit_text("📋 Пользователей не найдено")
             await callback.answer()
             return
         
-        # Загружаем только первую страницу
-        page = 1
-        per_page = 8
-        users = await UserQueries.get_all_users(session, page=page, per_page=per_page)
-        
         text = f"✏️ <b>РЕДАКТИРОВАНИЕ ПОЛЬЗОВАТЕЛЯ</b>\n\n📊 Выберите пользователя из списка:\n\n"
         
         await callback.message.edit_text(
@@ -2140,33 +2164,25 @@ async def callback_users_page(callback: CallbackQuery):
     per_page = 8
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-        
         # Определяем контекст по тексту сообщения
         message_text = callback.message.text or ""
         
         if "РЕДАКТИРОВАНИЕ ПОЛЬЗОВАТЕЛЯ" in message_text:
             # Контекст редактирования
-            total_count = await UserQueries.count_users_by_role(session, role=None, active_only=True)
+            users, total_count = await UserQueries.get_users_page(session, page=page, per_page=per_page)
             if total_count == 0:
                 await callback.message.edit_text("📋 Пользователей не найдено")
                 await callback.answer()
                 return
-            users = await UserQueries.get_all_users(session, page=page, per_page=per_page)
             text = f"✏️ <b>РЕДАКТИРОВАНИЕ ПОЛЬЗОВАТЕЛЯ</b>\n\n📊 Выберите пользователя из списка:\n\n"
             reply_markup = AdminKeyboards.user_list(users, page=page, per_page=per_page, total_count=total_count)
         elif "УДАЛЕНИЕ ПОЛЬЗОВАТЕЛЯ" in message_text:
             # Контекст удаления
-            total_count = await UserQueries.count_users_by_role(session, role=None, active_only=True)
+            users, total_count = await UserQueries.get_users_page(session, page=page, per_page=per_page)
             if total_count == 0:
                 await callback.message.edit_text("📋 Пользователей не найдено")
                 await callback.answer()
                 return
-            users = await UserQueries.get_all_users(session, page=page, per_page=per_page)
             text = f"🗑 <b>УДАЛЕНИЕ ПОЛЬЗОВАТЕЛЯ</b>\n\n⚠️ Выберите пользователя для удаления:\n\n"
             reply_markup = AdminKeyboards.user_list(users, page=page, per_page=per_page, total_count=total_count)
         elif "НЕАКТИВНЫЕ ПОЛЬЗОВАТЕЛИ" in message_text:
@@ -2193,12 +2209,11 @@ async def callback_users_page(callback: CallbackQuery):
             reply_markup = AdminKeyboards.user_list(inactive_users, page=page, per_page=per_page, total_count=inactive_count)
         else:
             # Контекст списка пользователей (по умолчанию)
-            total_count = await UserQueries.count_users_by_role(session, role=None, active_only=True)
+            users, total_count = await UserQueries.get_users_page(session, page=page, per_page=per_page)
             if total_count == 0:
                 await callback.message.edit_text("📋 Пользователей не найдено")
                 await callback.answer()
                 return
-            users = await UserQueries.get_all_users(session, page=page, per_page=per_page)
             text = f"👥 <b>СПИСОК ПОЛЬЗОВАТЕЛЕЙ</b>\n\n📊 Всего: {total_count} пользователей\n\n"
             reply_markup = AdminKeyboards.user_list(users, page=page, per_page=per_page, total_count=total_count)
         
@@ -2310,7 +2325,7 @@ async def callback_change_role(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("role_"), AdminStates.waiting_edit_value)
-async def process_role_change(callback: CallbackQuery, state: FSMContext):
+async def process_role_change(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Обработка изменения роли"""
     role_map = {
         "role_admin": UserRole.ADMIN,
@@ -2327,7 +2342,7 @@ async def process_role_change(callback: CallbackQuery, state: FSMContext):
     user_id = data.get('edit_user_id')
     
     async with AsyncSessionLocal() as session:
-        admin = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
+        admin = current_user
         user = await UserQueries.get_user_by_id(session, user_id)
         
         if not user:
@@ -2337,7 +2352,7 @@ async def process_role_change(callback: CallbackQuery, state: FSMContext):
         
         # Если выбран исполнитель, нужно направление (если его еще нет)
         if selected_role == UserRole.EXECUTOR and not user.direction:
-            await state.update_data(new_role=selected_role, edit_user_id=user_id)
+            await state.update_data(new_role=selected_role.value, edit_user_id=user_id)
             await callback.message.edit_text(
                 f"✅ Роль выбрана: Исполнитель\n\n"
                 f"👤 Пользователь: {user.first_name} {user.last_name or ''}\n\n"
@@ -2460,7 +2475,7 @@ async def callback_change_direction(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("direction_"), AdminStates.waiting_edit_value)
-async def process_direction_update(callback: CallbackQuery, state: FSMContext):
+async def process_direction_update(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Обработка обновления направления"""
     direction_map = {
         "direction_design": DirectionType.DESIGN,
@@ -2478,7 +2493,7 @@ async def process_direction_update(callback: CallbackQuery, state: FSMContext):
     user_id = data.get('edit_user_id')
     
     async with AsyncSessionLocal() as session:
-        admin = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
+        admin = current_user
         user = await UserQueries.get_user_by_id(session, user_id)
         
         if not user:
@@ -2557,7 +2572,7 @@ async def callback_change_name(callback: CallbackQuery, state: FSMContext):
 
 
 @router.message(AdminStates.waiting_user_name)
-async def process_name_change(message: Message, state: FSMContext):
+async def process_name_change(message: Message, state: FSMContext, current_user: Optional[User]):
     """Обработка изменения имени пользователя"""
     name_parts = message.text.strip().split(maxsplit=1)
     
@@ -2575,7 +2590,7 @@ async def process_name_change(message: Message, state: FSMContext):
     user_id = data.get('edit_user_id')
     
     async with AsyncSessionLocal() as session:
-        admin = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
+        admin = current_user
         user = await UserQueries.update_user_name(session, user_id, first_name, last_name)
         
         if not user:
@@ -2610,12 +2625,12 @@ async def process_name_change(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("admin_deactivate_"))
-async def callback_deactivate_user(callback: CallbackQuery):
+async def callback_deactivate_user(callback: CallbackQuery, current_user: Optional[User]):
     """Деактивация/активация пользователя"""
     user_id = int(callback.data.split("_")[-1])
     
     async with AsyncSessionLocal() as session:
-        admin = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
+        admin = current_user
         user = await UserQueries.get_user_by_id(session, user_id)
         
         if not user:
@@ -2662,19 +2677,16 @@ async def callback_deactivate_user(callback: CallbackQuery):
 async def callback_delete_user_list(callback: CallbackQuery):
     """Удаление пользователя - показываем список (оптимизировано)"""
     async with AsyncSessionLocal() as session:
-        # Быстрый подсчет без загрузки данных
-        total_count = await UserQueries.count_users_by_role(session, role=None, active_only=True)
+        # Страница и общее число одним запросом
+        page = 1
+        per_page = 8
+        users, total_count = await UserQueries.get_users_page(session, page=page, per_page=per_page)
         
         if total_count == 0:
             await callback.message.edit_text("📋 Пользователей не найдено")
             await callback.answer()
             return
         
-        # Загружаем только первую страницу
-        page = 1
-        per_page = 8
-        users = await UserQueries.get_all_users(session, page=page, per_page=per_page)
-        
         text = f"🗑 <b>УДАЛЕНИЕ ПОЛЬЗОВАТЕЛЯ</b>\n\n⚠️ Выберите пользователя для удаления:\n\n"
         
         await callback.message.edit_text(
@@ -2734,12 +2746,12 @@ async def callback_confirm_delete(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("delete_confirmed_"))
-async def callback_delete_confirmed(callback: CallbackQuery, state: FSMContext):
+async def callback_delete_confirmed(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Окончательное удаление пользователя"""
     user_id = int(callback.data.split("_")[-1])
     
     async with AsyncSessionLocal() as session:
-        admin = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
+        admin = current_user
         user = await UserQueries.get_user_by_id(session, user_id)
         
         if not user:
@@ -2786,16 +2798,11 @@ async def callback_delete_confirmed(callback: CallbackQuery, state: FSMContext):
 # ============ РАСПРЕДЕЛЕНИЕ ИСПОЛНИТЕЛЕЙ ============
 
 @router.message(F.text == "🔗 Распределение исполнителей")
-async def admin_executor_buyer_management(message: Message):
+async def admin_executor_buyer_management(message: Message, current_user: Optional[User]):
     """Меню управления распределением исполнителей"""
-    async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await message.answer("❌ У вас нет доступа к этой функции")
-            return
-        
-        text = """
+    user = current_user
+    
+    text = """
 🔗 <b>РАСПРЕДЕЛЕНИЕ ИСПОЛНИТЕЛЕЙ</b>
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
 
@@ -2809,13 +2816,13 @@ async def admin_executor_buyer_management(message: Message):
 
 Выберите действие:
 """
-        
-        await message.answer(
-            text,
-            reply_markup=AdminKeyboards.executor_buyer_management(),
-            parse_mode="HTML"
-        )
-        logger.info(f"Админ {user.telegram_id} открыл меню распределения исполнителей")
+    
+    await message.answer(
+        text,
+        reply_markup=AdminKeyboards.executor_buyer_management(),
+        parse_mode="HTML"
+    )
+    logger.info(f"Админ {user.telegram_id} открыл меню распределения исполнителей")
 
 
 @router.callback_query(F.data == "admin_assignments_menu")
@@ -2846,12 +2853,6 @@ async def callback_assignments_menu(callback: CallbackQuery):
 async def callback_assign_executor(callback: CallbackQuery, state: FSMContext):
     """Начало процесса назначения исполнителя баеру (оптимизировано)"""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-        
         # Получаем всех баеров (максимум 100 для безопасности)
         buyers = await UserQueries.get_all_users(session, role=UserRole.BUYER, active_only=True, page=1, per_page=100)
         
@@ -2994,18 +2995,14 @@ async def callback_select_executor(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("admin_confirm_assign_"), AdminStates.waiting_assignment_confirm)
-async def callback_confirm_assignment(callback: CallbackQuery, state: FSMContext):
+async def callback_confirm_assignment(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Подтверждение назначения"""
     parts = callback.data.replace("admin_confirm_assign_", "").split("_")
     executor_id = int(parts[0])
     buyer_id = int(parts[1])
     
     async with AsyncSessionLocal() as session:
-        admin = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not admin or admin.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
+        admin = current_user
         
         executor = await UserQueries.get_user_by_id(session, executor_id)
         buyer = await UserQueries.get_user_by_id(session, buyer_id)
@@ -3051,12 +3048,6 @@ async def callback_confirm_assignment(callback: CallbackQuery, state: FSMContext
 async def _show_assignments_list(callback: CallbackQuery, page: int = 1):
     """Вспомогательная функция для отображения списка назначений"""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-        
         # Получаем все назначения
         assignments = await UserQueries.get_all_assignments(session)
         
@@ -3163,7 +3154,7 @@ async def callback_remove_assignment_menu(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("admin_remove_assignment_"))
-async def callback_remove_assignment(callback: CallbackQuery):
+async def callback_remove_assignment(callback: CallbackQuery, current_user: Optional[User]):
     """Удаление назначения"""
     try:
         # Извлекаем ID из callback_data: "admin_remove_assignment_1_2" -> ["1", "2"]
@@ -3182,11 +3173,7 @@ async def callback_remove_assignment(callback: CallbackQuery):
         return
     
     async with AsyncSessionLocal() as session:
-        admin = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not admin or admin.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
+        admin = current_user
         
         executor = await UserQueries.get_user_by_id(session, executor_id)
         buyer = await UserQueries.get_user_by_id(session, buyer_id)
@@ -3447,14 +3434,9 @@ async def admin_chat_access_menu(message: Message, state: FSMContext):
     await state.clear()
 
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
-        if not user or user.role != UserRole.ADMIN:
-            await message.answer("❌ У вас нет доступа к этой функции")
-            return
-
         page = 1
         per_page = 10
-        total_count = await UserQueries.count_users_by_role(session, role=UserRole.BUYER)
+        buyers, total_count = await UserQueries.get_users_page(session, role=UserRole.BUYER, page=page, per_page=per_page)
         if total_count == 0:
             await message.answer(
                 "🔑 <b>ВЫДАЧА ЧАТОВ</b>\n\n❌ Баеры не найдены.",
@@ -3462,7 +3444,6 @@ async def admin_chat_access_menu(message: Message, state: FSMContext):
             )
             return
 
-        buyers = await UserQueries.get_all_users(session, role=UserRole.BUYER, page=page, per_page=per_page)
         await state.set_state(AdminStates.waiting_chat_access_buyer)
 
         text = """
@@ -3489,13 +3470,7 @@ async def callback_admin_chat_access_buyers_page(callback: CallbackQuery, state:
     per_page = 10
 
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-
-        total_count = await UserQueries.count_users_by_role(session, role=UserRole.BUYER)
-        buyers = await UserQueries.get_all_users(session, role=UserRole.BUYER, page=page, per_page=per_page)
+        buyers, total_count = await UserQueries.get_users_page(session, role=UserRole.BUYER, page=page, per_page=per_page)
 
         text = """
 🔑 <b>ВЫДАЧА ЧАТОВ</b>
@@ -3521,11 +3496,6 @@ async def callback_admin_chat_access_select_buyer(callback: CallbackQuery, state
     buyer_id = int(callback.data.replace("admin_chat_access_select_buyer_", ""))
 
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-
         buyer = await UserQueries.get_user_by_id(session, buyer_id)
         if not buyer or buyer.role != UserRole.BUYER:
             await callback.answer("❌ Баер не найден", show_alert=True)
@@ -3536,8 +3506,7 @@ async def callback_admin_chat_access_select_buyer(callback: CallbackQuery, state
 
         page = 1
         per_page = 8
-        total_count = await ChatQueries.count_chats(session)
-        chats = await ChatQueries.get_all_chats(session, page=page, per_page=per_page)
+        chats, total_count = await ChatQueries.get_chats_page(session, page=page, per_page=per_page)
 
         buyer_name = f"{buyer.first_name or 'User'} {buyer.last_name or ''}".strip()
         text = f"""
@@ -3566,15 +3535,9 @@ async def callback_admin_chat_access_back_to_buyers(callback: CallbackQuery, sta
     await state.clear()
 
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-
         page = 1
         per_page = 10
-        total_count = await UserQueries.count_users_by_role(session, role=UserRole.BUYER)
-        buyers = await UserQueries.get_all_users(session, role=UserRole.BUYER, page=page, per_page=per_page)
+        buyers, total_count = await UserQueries.get_users_page(session, role=UserRole.BUYER, page=page, per_page=per_page)
         await state.set_state(AdminStates.waiting_chat_access_buyer)
 
         text = """
@@ -3602,11 +3565,6 @@ async def callback_admin_chat_access_chats_page(callback: CallbackQuery, state:
     per_page = 8
 
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-
         data = await state.get_data()
         buyer_id = data.get("chat_access_buyer_id")
         buyer = await UserQueries.get_user_by_id(session, buyer_id) if buyer_id else None
@@ -3614,8 +3572,7 @@ async def callback_admin_chat_access_chats_page(callback: CallbackQuery, state:
             await callback.answer("❌ Баер не выбран", show_alert=True)
             return
 
-        total_count = await ChatQueries.count_chats(session)
-        chats = await ChatQueries.get_all_chats(session, page=page, per_page=per_page)
+        chats, total_count = await ChatQueries.get_chats_page(session, page=page, per_page=per_page)
 
         buyer_name = f"{buyer.first_name or 'User'} {buyer.last_name or ''}".strip()
         text = f"""
@@ -3644,11 +3601,6 @@ async def callback_admin_chat_access_select_chat(callback: CallbackQuery, state:
     chat_db_id = int(callback.data.replace("admin_chat_access_select_chat_", ""))
 
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-
         data = await state.get_data()
         buyer_id = data.get("chat_access_buyer_id")
         buyer = await UserQueries.get_user_by_id(session, buyer_id) if buyer_id else None
@@ -3688,11 +3640,6 @@ async def callback_admin_chat_access_select_chat(callback: CallbackQuery, state:
 @router.callback_query(F.data == "admin_chat_access_back_to_chats", AdminStates.waiting_chat_access_chat)
 async def callback_admin_chat_access_back_to_chats(callback: CallbackQuery, state: FSMContext):
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-
         data = await state.get_data()
         buyer_id = data.get("chat_access_buyer_id")
         buyer = await UserQueries.get_user_by_id(session, buyer_id) if buyer_id else None
@@ -3702,8 +3649,7 @@ async def callback_admin_chat_access_back_to_chats(callback: CallbackQuery, stat
 
         page = 1
         per_page = 8
-        total_count = await ChatQueries.count_chats(session)
-        chats = await ChatQueries.get_all_chats(session, page=page, per_page=per_page)
+        chats, total_count = await ChatQueries.get_chats_page(session, page=page, per_page=per_page)
 
         buyer_name = f"{buyer.first_name or 'User'} {buyer.last_name or ''}".strip()
         text = f"""
@@ -3728,13 +3674,9 @@ async def callback_admin_chat_access_back_to_chats(callback: CallbackQuery, stat
 
 
 @router.callback_query(F.data == "admin_chat_access_toggle", AdminStates.waiting_chat_access_chat)
-async def callback_admin_chat_access_toggle(callback: CallbackQuery, state: FSMContext):
+async def callback_admin_chat_access_toggle(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        if not user or user.role != UserRole.ADMIN:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-
+        user = current_user
         data = await state.get_data()
         buyer_id = data.get("chat_access_buyer_id")
         chat_db_id = data.get("chat_access_chat_db_id")
@@ -3777,16 +3719,10 @@ async def callback_admin_chat_access_toggle(callback: CallbackQuery, state: FSMC
 async def admin_chats_menu(message: Message):
     """Меню управления чатами"""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            # Позволяем другим роутерам обработать это сообщение
-            from aiogram.dispatcher.event.bases import UNHANDLED
-
-            return UNHANDLED
-        
         # Получаем список чатов
-        total_count = await ChatQueries.count_chats(session)
+        page = 1
+        per_page = 8
+        chats, total_count = await ChatQueries.get_chats_page(session, page=page, per_page=per_page)
         
         if total_count == 0:
             await message.answer(
@@ -3797,11 +3733,6 @@ async def admin_chats_menu(message: Message):
             )
             return
         
-        # Загружаем первую страницу
-        page = 1
-        per_page = 8
-        chats = await ChatQueries.get_all_chats(session, page=page, per_page=per_page)
-        
         text = f"💬 <b>УПРАВЛЕНИЕ ЧАТАМИ</b>\n\n📊 Выберите чат из списка:\n\n"
         
         await message.answer(
@@ -3815,14 +3746,9 @@ async def admin_chats_menu(message: Message):
 async def callback_chats_list(callback: CallbackQuery):
     """Список чатов (callback)"""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            from aiogram.dispatcher.event.bases import UNHANDLED
-
-            return UNHANDLED
-        
-        total_count = await ChatQueries.count_chats(session)
+        page = 1
+        per_page = 8
+        chats, total_count = await ChatQueries.get_chats_page(session, page=page, per_page=per_page)
         
         if total_count == 0:
             await callback.message.edit_text(
@@ -3834,10 +3760,6 @@ async def callback_chats_list(callback: CallbackQuery):
             await callback.answer()
             return
         
-        page = 1
-        per_page = 8
-        chats = await ChatQueries.get_all_chats(session, page=page, per_page=per_page)
-        
         text = f"💬 <b>УПРАВЛЕНИЕ ЧАТАМИ</b>\n\n📊 Выберите чат из списка:\n\n"
         
         await callback.message.edit_text(
@@ -3856,14 +3778,7 @@ async def callback_chats_page(callback: CallbackQuery):
     per_page = 8
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            from aiogram.dispatcher.event.bases import UNHANDLED
-
-            return UNHANDLED
-        
-        total_count = await ChatQueries.count_chats(session)
+        chats, total_count = await ChatQueries.get_chats_page(session, page=page, per_page=per_page)
         
         if total_count == 0:
             await callback.message.edit_text(
@@ -3874,8 +3789,6 @@ async def callback_chats_page(callback: CallbackQuery):
             await callback.answer()
             return
         
-        chats = await ChatQueries.get_all_chats(session, page=page, per_page=per_page)
-        
         text = f"💬 <b>УПРАВЛЕНИЕ ЧАТАМИ</b>\n\n📊 Выберите чат из списка:\n\n"
         
         await callback.message.edit_text(
@@ -3958,13 +3871,6 @@ async def callback_view_chat(callback: CallbackQuery):
     chat_db_id = int(callback.data.split("_")[-1])
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            from aiogram.dispatcher.event.bases import UNHANDLED
-
-            return UNHANDLED
-        
         chat = await ChatQueries.get_chat_by_db_id(session, chat_db_id)
         
         if not chat:
@@ -3981,13 +3887,6 @@ async def callback_edit_chat_title(callback: CallbackQuery, state: FSMContext):
     chat_db_id = int(callback.data.split("_")[-1])
 
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-
-        if not user or user.role != UserRole.ADMIN:
-            from aiogram.dispatcher.event.bases import UNHANDLED
-
-            return UNHANDLED
-
         chat = await ChatQueries.get_chat_by_db_id(session, chat_db_id)
         if not chat:
             await callback.answer("❌ Чат не найден", show_alert=True)
@@ -4037,12 +3936,6 @@ async def process_edit_chat_title(message: Message, state: FSMContext):
         return
 
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
-        if not user or user.role != UserRole.ADMIN:
-            from aiogram.dispatcher.event.bases import UNHANDLED
-
-            return UNHANDLED
-
         chat = await ChatQueries.update_chat_title_by_db_id(session, int(chat_db_id), new_title)
         if not chat:
             await message.answer("❌ Не удалось обновить название чата.")
@@ -4067,13 +3960,6 @@ async def callback_send_message_chat(callback: CallbackQuery, state: FSMContext)
     chat_db_id = int(callback.data.split("_")[-1])
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            from aiogram.dispatcher.event.bases import UNHANDLED
-
-            return UNHANDLED
-        
         chat = await ChatQueries.get_chat_by_db_id(session, chat_db_id)
         
         if not chat:
@@ -4100,12 +3986,6 @@ async def process_chat_message(message: Message, state: FSMContext, bot: Bot):
     """Обработка сообщения для отправки в чат"""
     data = await state.get_data()
 
-    async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
-        if not user or user.role != UserRole.ADMIN:
-            from aiogram.dispatcher.event.bases import UNHANDLED
-
-            return UNHANDLED
     chat_db_id = data.get("chat_db_id")
     chat_telegram_id = data.get("chat_telegram_id")
     
@@ -4208,20 +4088,21 @@ async def callback_send_task_chat(callback: CallbackQuery, state: FSMContext):
     chat_db_id = int(callback.data.split("_")[-1])
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            from aiogram.dispatcher.event.bases import UNHANDLED
-
-            return UNHANDLED
-        
         chat = await ChatQueries.get_chat_by_db_id(session, chat_db_id)
         
         if not chat:
             await callback.answer("❌ Чат не найден", show_alert=True)
             return
         
-        total_count = await UserQueries.count_users_by_role(session, role=UserRole.EXECUTOR, active_only=True)
+        page = 1
+        per_page = 8
+        executors, total_count = await UserQueries.get_users_page(
+            session,
+            role=UserRole.EXECUTOR,
+            active_only=True,
+            page=page,
+            per_page=per_page
+        )
         
         if total_count == 0:
             await callback.message.edit_text(
@@ -4233,16 +4114,6 @@ async def callback_send_task_chat(callback: CallbackQuery, state: FSMContext):
             await callback.answer()
             return
         
-        page = 1
-        per_page = 8
-        executors = await UserQueries.get_all_users(
-            session,
-            role=UserRole.EXECUTOR,
-            active_only=True,
-            page=page,
-            per_page=per_page
-        )
-        
         chat_title = chat.chat_title or f"Chat {chat.chat_id}"
         await state.update_data(
             chat_db_id=chat_db_id,
@@ -4283,17 +4154,16 @@ async def callback_chat_task_executors_page(callback: CallbackQuery, state: FSMC
     per_page = 8
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            from aiogram.dispatcher.event.bases import UNHANDLED
-
-            return UNHANDLED
-        
         data = await state.get_data()
         chat_title = data.get("chat_title", "Чат")
         
-        total_count = await UserQueries.count_users_by_role(session, role=UserRole.EXECUTOR, active_only=True)
+        executors, total_count = await UserQueries.get_users_page(
+            session,
+            role=UserRole.EXECUTOR,
+            active_only=True,
+            page=page,
+            per_page=per_page
+        )
         if total_count == 0:
             await callback.message.edit_text(
                 "❌ <b>Нет доступных исполнителей</b>\n\n"
@@ -4303,14 +4173,6 @@ async def callback_chat_task_executors_page(callback: CallbackQuery, state: FSMC
             await callback.answer()
             return
         
-        executors = await UserQueries.get_all_users(
-            session,
-            role=UserRole.EXECUTOR,
-            active_only=True,
-            page=page,
-            per_page=per_page
-        )
-        
         text = f"""
 📤 <b>ОТПРАВКА ЗАДАЧИ В ЧАТ</b>
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -4342,13 +4204,6 @@ async def callback_chat_task_select_executor(callback: CallbackQuery, state: FSM
     executor_id = int(callback.data.replace("admin_chat_task_select_executor_", ""))
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            from aiogram.dispatcher.event.bases import UNHANDLED
-
-            return UNHANDLED
-        
         executor = await UserQueries.get_user_by_id(session, executor_id)
         
         if not executor or executor.role != UserRole.EXECUTOR:
@@ -4401,13 +4256,6 @@ async def callback_chat_task_tasks_page(callback: CallbackQuery, state: FSMConte
     per_page = 8
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            from aiogram.dispatcher.event.bases import UNHANDLED
-
-            return UNHANDLED
-        
         data = await state.get_data()
         executor_id = data.get("selected_executor_id")
         executor_name = data.get("selected_executor_name", "Исполнитель")
@@ -4448,17 +4296,12 @@ async def callback_chat_task_tasks_page(callback: CallbackQuery, state: FSMConte
 
 
 @router.callback_query(F.data.startswith("admin_chat_task_select_"), AdminStates.waiting_chat_task_selection)
-async def callback_chat_task_select(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def callback_chat_task_select(callback: CallbackQuery, state: FSMContext, bot: Bot, current_user: Optional[User]):
     """Отправка выбранной задачи в чат"""
     task_id = int(callback.data.replace("admin_chat_task_select_", ""))
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            from aiogram.dispatcher.event.bases import UNHANDLED
-
-            return UNHANDLED
+        user = current_user
         
         data = await state.get_data()
         chat_db_id = data.get("chat_db_id")
@@ -4548,7 +4391,9 @@ async def callback_chat_task_select(callback: CallbackQuery, state: FSMContext,
                 details={
                     "chat_id": chat_telegram_id,
                     "task_number": task.task_number
-                }
+                },
+                # По этой записи кнопка «Выполнено» в чате находит тимлида — пишем сразу
+                immediate=True
             )
         except Exception as e:
             logger.error(f"Не удалось записать лог отправки задачи {task.task_number}: {e}")
@@ -4571,35 +4416,26 @@ async def callback_chat_task_select(callback: CallbackQuery, state: FSMContext,
 async def callback_chat_task_back_to_executors(callback: CallbackQuery, state: FSMContext):
     """Возврат к выбору исполнителя"""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            from aiogram.dispatcher.event.bases import UNHANDLED
-
-            return UNHANDLED
-        
         data = await state.get_data()
         chat_title = data.get("chat_title", "Чат")
         
-        total_count = await UserQueries.count_users_by_role(session, role=UserRole.EXECUTOR, active_only=True)
-        if total_count == 0:
-            await callback.message.edit_text(
-                "❌ <b>Нет доступных исполнителей</b>\n\n"
-                "В системе нет активных исполнителей для выбора.",
-                parse_mode="HTML"
-            )
-            await callback.answer()
-            return
-        
         page = 1
         per_page = 8
-        executors = await UserQueries.get_all_users(
+        executors, total_count = await UserQueries.get_users_page(
             session,
             role=UserRole.EXECUTOR,
             active_only=True,
             page=page,
             per_page=per_page
         )
+        if total_count == 0:
+            await callback.message.edit_text(
+                "❌ <b>Нет доступных исполнителей</b>\n\n"
+                "В системе нет активных исполнителей для выбора.",
+                parse_mode="HTML"
+            )
+            await callback.answer()
+            return
         
         await state.set_state(AdminStates.waiting_chat_task_executor)
         
@@ -4632,13 +4468,6 @@ async def callback_chat_task_back_to_executors(callback: CallbackQuery, state: F
 async def callback_chat_task_back_to_chat(callback: CallbackQuery, state: FSMContext):
     """Возврат к информации о чате"""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            from aiogram.dispatcher.event.bases import UNHANDLED
-
-            return UNHANDLED
-        
         data = await state.get_data()
         chat_db_id = data.get("chat_db_id")
         
@@ -4664,13 +4493,6 @@ async def callback_delete_chat(callback: CallbackQuery):
     chat_db_id = int(callback.data.split("_")[-1])
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.ADMIN:
-            from aiogram.dispatcher.event.bases import UNHANDLED
-
-            return UNHANDLED
-        
         chat = await ChatQueries.get_chat_by_db_id(session, chat_db_id)
         
         if not chat:
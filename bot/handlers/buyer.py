@@ -1,15 +1,19 @@
 """Обработчики для байера"""
-from aiogram import Router, F, Bot
+from aiogram import F, Bot
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List
+from typing import Dict, List, Optional
 import re
 from aiogram.filters import or_f
 from db.engine import AsyncSessionLocal
-from db.queries import UserQueries, TaskQueries, MessageQueries, FileQueries, LogQueries, ChatRequestQueries
-from db.models import UserRole, DirectionType, TaskStatus, TaskPriority, FileType
+from db.queries import (
+    UserQueries, TaskQueries, MessageQueries, FileQueries, LogQueries, ChatRequestQueries, TaskTransitions,
+    TaskVersionConflict
+)
+from db.models import UserRole, DirectionType, TaskStatus, TaskPriority, FileType, User
+from bot.filters import RoleFilter
 from bot.keyboards.buyer_kb import BuyerKeyboards
 from bot.keyboards.common_kb import CommonKeyboards
 from states.buyer_states import BuyerStates
@@ -24,6 +28,7 @@ from bot.utils.message_utils import (
     TELEGRAM_MAX_MESSAGE_LENGTH
 )
 from bot.services.executor_status_service import ExecutorStatusService
+from bot.utils.callback_router import TrieRouter
 from log import logger
 
 # Импортируем обработчики файлов
@@ -31,25 +36,59 @@ from . import buyer_files
 from . import buyer_profile
 from . import buyer_chats
 
-router = Router()
+router = TrieRouter()
+# Все обработчики роутера (и вложенных роутеров) — только для байера
+router.message.filter(RoleFilter(UserRole.BUYER))
+router.callback_query.filter(RoleFilter(UserRole.BUYER))
 
 router.include_router(buyer_files.router)
 router.include_router(buyer_profile.router)
 router.include_router(buyer_chats.router)
 
 
+# ============ КОМПАКТНЫЕ ДАННЫЕ FSM ============
+# В FSM храним только примитивы (id, строки, числа, ISO-даты): такие данные
+# сериализуются в JSON для внешнего хранилища и не держат ORM-объекты в памяти.
+
+def _pack_executors_by_direction(executors_by_direction: Dict[DirectionType, List]) -> Dict[str, List[int]]:
+    """Свернуть группировку исполнителей до {направление: [id исполнителей]}"""
+    return {
+        direction.value: [executor.id for executor in executors]
+        for direction, executors in executors_by_direction.items()
+    }
+
+
+def _unpack_executors_by_direction(packed: Dict[str, List[int]]) -> Dict[DirectionType, List[int]]:
+    """Восстановить ключи-направления для клавиатур (им нужно только количество)"""
+    return {DirectionType(direction): executor_ids for direction, executor_ids in packed.items()}
+
+
+def _fsm_direction(data: dict) -> Optional[DirectionType]:
+    """Направление задачи из данных FSM"""
+    value = data.get('direction')
+    return DirectionType(value) if value else None
+
+
+def _fsm_deadline(data: dict) -> Optional[datetime]:
+    """Дедлайн задачи из данных FSM"""
+    value = data.get('deadline')
+    return datetime.fromisoformat(value) if value else None
+
+
+def _fsm_deadline_str(data: dict) -> str:
+    """Дедлайн задачи из данных FSM для превью"""
+    deadline = _fsm_deadline(data)
+    return deadline.strftime("%d.%m.%Y %H:%M") if deadline else "Не указан"
+
+
 # ============ СОЗДАНИЕ ЗАДАЧИ ============
 
 @router.message(F.text == "➕ Создать задачу")
-async def buyer_create_task(message: Message, state: FSMContext):
+async def buyer_create_task(message: Message, state: FSMContext, current_user: Optional[User]):
     """Начало создания задачи"""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
+        user = current_user
         
-        if not user or user.role != UserRole.BUYER:
-            await message.answer("❌ У вас нет доступа к этой функции")
-            return
-
         assigned_executors = await UserQueries.get_executors_for_buyer(session, user.id)
         # Отдельно получаем вообще всех закреплённых (даже если сейчас недоступны)
         all_assigned_executors = await UserQueries.get_all_assigned_executors_for_buyer(session, user.id)
@@ -105,7 +144,7 @@ async def buyer_create_task(message: Message, state: FSMContext):
                 )
             return
 
-        await state.update_data(executors_by_direction=executors_by_direction)
+        await state.update_data(executors_by_direction=_pack_executors_by_direction(executors_by_direction))
         
         text = """
 🎯 <b>СОЗДАНИЕ ЗАДАЧИ</b>
@@ -126,19 +165,19 @@ async def buyer_create_task(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("buyer_direction_"), BuyerStates.waiting_direction)
-async def process_direction_selection(callback: CallbackQuery, state: FSMContext):
+async def process_direction_selection(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Обработка выбора направления"""
     direction_value = callback.data.replace("buyer_direction_", "")
     direction = DirectionType(direction_value)
     
     data = await state.get_data()
-    executors = data['executors_by_direction'].get(direction, [])
+    executors = data.get('executors_by_direction', {}).get(direction.value, [])
     
     if not executors:
         await callback.answer("❌ Нет исполнителей в этом направлении")
         return
     
-    await state.update_data(direction=direction)
+    await state.update_data(direction=direction.value)
     
     direction_names = {
         DirectionType.DESIGN: "🎨 Дизайн",
@@ -149,7 +188,7 @@ async def process_direction_selection(callback: CallbackQuery, state: FSMContext
     
     async with AsyncSessionLocal() as session:
         # Получаем назначенных исполнителей для баера
-        buyer = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
+        buyer = current_user
         if buyer and buyer.role == UserRole.BUYER:
             # Получаем только назначенных исполнителей по направлению
             executors = await UserQueries.get_executors_for_buyer(session, buyer.id, direction=direction)
@@ -192,14 +231,14 @@ async def process_direction_selection(callback: CallbackQuery, state: FSMContext
 
 
 @router.callback_query(F.data == "buyer_show_all_executors", BuyerStates.waiting_direction)
-async def show_all_executors(callback: CallbackQuery, state: FSMContext):
+async def show_all_executors(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Показать всех назначенных исполнителей (без группировки по направлениям)"""
     data = await state.get_data()
     task_id = data.get('edit_task_id')
     
     async with AsyncSessionLocal() as session:
         # Получаем только назначенных исполнителей для баера
-        buyer = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
+        buyer = current_user
         if buyer and buyer.role == UserRole.BUYER:
             active_executors = await UserQueries.get_executors_for_buyer(session, buyer.id)
         else:
@@ -249,7 +288,7 @@ async def show_all_executors(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("buyer_reassign_executor_"))
-async def reassign_executor_after_rejection(callback: CallbackQuery, state: FSMContext):
+async def reassign_executor_after_rejection(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Переназначение исполнителя после отказа"""
     task_id = int(callback.data.replace("buyer_reassign_executor_", ""))
 
@@ -268,7 +307,7 @@ async def reassign_executor_after_rejection(callback: CallbackQuery, state: FSMC
         direction = task.direction
         
         # Получаем только назначенных исполнителей для баера
-        buyer = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
+        buyer = current_user
         if buyer and buyer.role == UserRole.BUYER:
             executors = await UserQueries.get_executors_for_buyer(session, buyer.id, direction=direction)
         else:
@@ -307,18 +346,18 @@ async def reassign_executor_after_rejection(callback: CallbackQuery, state: FSMC
 
 
 @router.callback_query(F.data == "buyer_back_to_directions", BuyerStates.waiting_executor)
-async def back_to_directions(callback: CallbackQuery, state: FSMContext):
+async def back_to_directions(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Вернуться к выбору направления"""
     data = await state.get_data()
     task_id = data.get('edit_task_id')
     
     # Возвращаемся к выбору направления (для создания или редактирования)
     async with AsyncSessionLocal() as session:
-        executors_by_direction = data.get('executors_by_direction', {})
+        executors_by_direction = _unpack_executors_by_direction(data.get('executors_by_direction', {}))
         
         # Если данных нет в state, загружаем заново
         if not executors_by_direction:
-            buyer = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
+            buyer = current_user
             if buyer and buyer.role == UserRole.BUYER:
                 # Получаем назначенных исполнителей
                 assigned_executors = await UserQueries.get_executors_for_buyer(session, buyer.id)
@@ -331,7 +370,7 @@ async def back_to_directions(callback: CallbackQuery, state: FSMContext):
                         executors_by_direction[executor.direction].append(executor)
             else:
                 executors_by_direction = {}
-            await state.update_data(executors_by_direction=executors_by_direction)
+            await state.update_data(executors_by_direction=_pack_executors_by_direction(executors_by_direction))
         
         # Определяем текст и клавиатуру в зависимости от контекста
         if task_id:
@@ -366,7 +405,7 @@ async def back_to_directions(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("buyer_select_executor_"), BuyerStates.waiting_executor)
-async def process_executor_selection(callback: CallbackQuery, state: FSMContext):
+async def process_executor_selection(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Обработка выбора исполнителя (для создания или редактирования)"""
     executor_id = int(callback.data.replace("buyer_select_executor_", ""))
     
@@ -377,24 +416,32 @@ async def process_executor_selection(callback: CallbackQuery, state: FSMContext)
         # Редактирование существующей задачи
         async with AsyncSessionLocal() as session:
             executor = await UserQueries.get_user_by_id(session, executor_id)
-            task = await TaskQueries.get_task_by_id(session, task_id)
-            
-            if not executor or not task:
-                await callback.answer("❌ Ошибка: исполнитель или задача не найдены")
-                return
-            
-            # Обновляем исполнителя
-            await TaskQueries.assign_executor(session, task_id, executor_id)
-            
-            # Возвращаемся к просмотру задачи
-            await show_task_view_from_callback(callback, task_id)
+        
+        if not executor:
+            await callback.answer("❌ Ошибка: исполнитель или задача не найдены")
+            return
+        
+        # Обновляем исполнителя с проверкой версии (загрузка исполнителей — в той же транзакции)
+        try:
+            task = await _update_edited_task(task_id, data, executor_id=executor_id)
+        except TaskVersionConflict:
+            await callback.message.edit_text(TASK_CHANGED_WHILE_EDITING, parse_mode="HTML")
+            await state.clear()
+            await callback.answer()
+            return
+        if not task:
+            await callback.answer("❌ Ошибка: исполнитель или задача не найдены")
+            return
+        
+        # Возвращаемся к просмотру задачи
+        await show_task_view_from_callback(callback, task_id)
         
         await state.clear()
         await callback.answer("Исполнитель обновлен")
     else:
         # Создание новой задачи
         async with AsyncSessionLocal() as session:
-            buyer = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
+            buyer = current_user
             executor = await UserQueries.get_user_by_id(session, executor_id)
 
             if not executor or not buyer:
@@ -417,7 +464,7 @@ async def process_executor_selection(callback: CallbackQuery, state: FSMContext)
             # Сохраняем направление исполнителя, если оно еще не было сохранено
             # (это происходит когда выбирают из списка всех исполнителей)
             if not data.get('direction') and executor.direction:
-                await state.update_data(direction=executor.direction)
+                await state.update_data(direction=executor.direction.value)
             
             await state.update_data(executor_id=executor_id, executor_name=f"{executor.first_name} {executor.last_name or ''}")
             
@@ -453,14 +500,14 @@ async def show_task_preview(message: Message, state: FSMContext, is_edit: bool =
     
     priority_names = ["🟢 Низкий", "🟡 Средний", "🟠 Высокий", "🔴 Срочный"]
     
-    deadline_str = data['deadline'].strftime("%d.%m.%Y %H:%M") if data.get('deadline') else "Не указан"
+    deadline_str = _fsm_deadline_str(data)
     
     # Формируем шаблон текста с плейсхолдером для описания
     text_template = f"""
 📋 <b>ПРЕВЬЮ ЗАДАЧИ</b>
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-🎯 <b>Направление:</b> {direction_names.get(data['direction'], data['direction'].value)}
+🎯 <b>Направление:</b> {direction_names.get(_fsm_direction(data), data['direction'])}
 👤 <b>Исполнитель:</b> {data['executor_name']}
 
 📌 <b>Название:</b> {data['title']}
@@ -602,13 +649,13 @@ async def edit_field_description(callback: CallbackQuery, state: FSMContext):
         DirectionType.MARKETING: "📱 Маркетинг"
     }
     priority_names = ["🟢 Низкий", "🟡 Средний", "🟠 Высокий", "🔴 Срочный"]
-    deadline_str = data.get('deadline').strftime("%d.%m.%Y %H:%M") if data.get('deadline') else "Не указан"
+    deadline_str = _fsm_deadline_str(data)
     
     preview_template_for_check = f"""
 📋 <b>ПРЕВЬЮ ЗАДАЧИ</b>
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-🎯 <b>Направление:</b> {direction_names.get(data.get('direction'), '')}
+🎯 <b>Направление:</b> {direction_names.get(_fsm_direction(data), '')}
 👤 <b>Исполнитель:</b> {data.get('executor_name', '')}
 
 📌 <b>Название:</b> {data.get('title', '')}
@@ -685,7 +732,7 @@ async def edit_field_priority(callback: CallbackQuery, state: FSMContext):
 async def edit_field_executor(callback: CallbackQuery, state: FSMContext):
     """Редактирование исполнителя"""
     data = await state.get_data()
-    direction = data.get('direction')
+    direction = _fsm_direction(data)
     task_id = data.get('edit_task_id')
     
     if not direction:
@@ -727,12 +774,12 @@ async def edit_field_executor(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data == "buyer_confirm_create", BuyerStates.waiting_task_confirmation)
-async def confirm_create_task(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def confirm_create_task(callback: CallbackQuery, state: FSMContext, bot: Bot, current_user: Optional[User]):
     """Подтверждение создания задачи"""
     data = await state.get_data()
     
     async with AsyncSessionLocal() as session:
-        buyer = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
+        buyer = current_user
         executor = await UserQueries.get_user_by_id(session, data['executor_id'])
         
         # Создаем задачу
@@ -740,11 +787,11 @@ async def confirm_create_task(callback: CallbackQuery, state: FSMContext, bot: B
             session=session,
             title=data['title'],
             description=data['description'],
-            direction=data['direction'],
+            direction=_fsm_direction(data),
             priority=data['priority'],
             created_by_id=buyer.id,
             executor_id=executor.id,
-            deadline=data.get('deadline')
+            deadline=_fsm_deadline(data)
         )
         
         # Сохраняем файлы задачи в БД (если есть)
@@ -960,30 +1007,23 @@ async def send_new_task_notification(bot: Bot, task, buyer, executor):
 # ============ ПРОСМОТР ЗАДАЧ ============
 
 @router.callback_query(F.data == "buyer_my_tasks")
-async def callback_buyer_my_tasks(callback: CallbackQuery, state: FSMContext):
+async def callback_buyer_my_tasks(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Возврат к списку задач байера (оптимизировано)"""
     await state.clear()
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
+        user = current_user
         
-        if not user or user.role != UserRole.BUYER:
-            await callback.answer("❌ У вас нет доступа к этой функции")
-            return
-        
-        # Быстрый подсчет без загрузки данных
-        total_count = await TaskQueries.count_tasks_by_creator(session, user.id)
+        # Страница и общее число одним запросом
+        page = 1
+        per_page = 5
+        tasks, total_count = await TaskQueries.get_tasks_by_creator_page(session, user.id, page=page, per_page=per_page)
         
         if total_count == 0:
             await callback.message.edit_text("📋 У вас пока нет задач")
             await callback.answer()
             return
         
-        # Загружаем только первую страницу (5 задач)
-        page = 1
-        per_page = 5
-        tasks = await TaskQueries.get_tasks_by_creator(session, user.id, page=page, per_page=per_page)
-        
         text = f"📋 <b>МОИ ЗАДАЧИ</b>\n\n"
         
         await callback.message.edit_text(
@@ -996,19 +1036,19 @@ async def callback_buyer_my_tasks(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data == "buyer_tasks_on_review")
-async def callback_buyer_tasks_on_review(callback: CallbackQuery, state: FSMContext):
+async def callback_buyer_tasks_on_review(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Возврат к списку задач на проверке (оптимизировано)"""
     await state.clear()
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
+        user = current_user
         
-        if not user or user.role != UserRole.BUYER:
-            await callback.answer("❌ У вас нет доступа к этой функции")
-            return
-        
-        # Быстрый подсчет задач на проверке
-        completed_count = await TaskQueries.count_tasks_by_creator(session, user.id, status=TaskStatus.COMPLETED)
+        # Страница и общее число одним запросом
+        page = 1
+        per_page = 5
+        tasks_on_review, completed_count = await TaskQueries.get_tasks_by_creator_page(
+            session, user.id, status=TaskStatus.COMPLETED, page=page, per_page=per_page
+        )
         
         if completed_count == 0:
             await callback.message.edit_text(
@@ -1019,13 +1059,6 @@ async def callback_buyer_tasks_on_review(callback: CallbackQuery, state: FSMCont
             await callback.answer()
             return
         
-        # Загружаем только первую страницу задач на проверке (5 задач)
-        page = 1
-        per_page = 5
-        tasks_on_review = await TaskQueries.get_tasks_by_creator(
-            session, user.id, status=TaskStatus.COMPLETED, page=page, per_page=per_page
-        )
-        
         text = f"""
 📋 <b>ЗАДАЧИ НА ПРОВЕРКЕ</b>
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -1045,28 +1078,21 @@ async def callback_buyer_tasks_on_review(callback: CallbackQuery, state: FSMCont
 
 
 @router.callback_query(F.data.startswith("buyer_tasks_page_"))
-async def callback_tasks_page(callback: CallbackQuery, state: FSMContext):
+async def callback_tasks_page(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Пагинация списка задач байера (оптимизировано - загружает только нужную страницу)"""
     page = int(callback.data.replace("buyer_tasks_page_", ""))
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.BUYER:
-            await callback.answer("❌ У вас нет доступа к этой функции")
-            return
+        user = current_user
         
-        # Быстрый подсчет без загрузки данных
-        total_count = await TaskQueries.count_tasks_by_creator(session, user.id)
+        # Страница и общее число одним запросом
+        per_page = 5
+        tasks, total_count = await TaskQueries.get_tasks_by_creator_page(session, user.id, page=page, per_page=per_page)
         
         if total_count == 0:
             await callback.answer("❌ Нет задач")
             return
         
-        # Загружаем только запрошенную страницу (5 задач)
-        per_page = 5
-        tasks = await TaskQueries.get_tasks_by_creator(session, user.id, page=page, per_page=per_page)
-        
         if not tasks:
             await callback.answer("❌ Страница не найдена")
             return
@@ -1088,11 +1114,12 @@ async def callback_view_task(callback: CallbackQuery):
     task_id = int(callback.data.replace("buyer_view_task_", ""))
     
     async with AsyncSessionLocal() as session:
-        task = await TaskQueries.get_task_by_id(session, task_id)
+        details = await TaskQueries.get_cached_task_details(session, task_id)
         
-        if not task:
+        if not details:
             await callback.answer("❌ Задача не найдена")
             return
+        task = details.task
         
         from bot.utils.time_tracker import get_execution_time_display
         
@@ -1221,7 +1248,7 @@ async def callback_request_correction(callback: CallbackQuery, state: FSMContext
 
 
 @router.message(BuyerStates.waiting_correction_description)
-async def process_correction_description(message: Message, state: FSMContext, bot: Bot):
+async def process_correction_description(message: Message, state: FSMContext, bot: Bot, current_user: Optional[User]):
     """Обработка описания правок"""
     correction_text = message.text.strip()
     
@@ -1233,22 +1260,18 @@ async def process_correction_description(message: Message, state: FSMContext, bo
     task_id = data.get('correction_task_id')
     
     async with AsyncSessionLocal() as session:
-        buyer = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
-        task = await TaskQueries.get_task_by_id(session, task_id)
+        buyer = current_user
+        # Возвращаем задачу в работу, только если она всё ещё выполнена
+        result = await TaskTransitions.request_correction(session, task_id, buyer.id, correction_text)
         
-        if not task:
-            await message.answer("❌ Задача не найдена")
+        if not result.applied:
+            if result.previous_status is None:
+                await message.answer("❌ Задача не найдена")
+            else:
+                await message.answer("❌ Запросить правки можно только для завершенных задач")
             await state.clear()
             return
-        
-        # Возвращаем задачу в работу
-        await TaskQueries.update_task_status(
-            session, 
-            task_id, 
-            TaskStatus.IN_PROGRESS, 
-            buyer.id, 
-            f"Запрошены правки: {correction_text}"
-        )
+        task = result.task
         
         # Сохраняем сообщение с правками
         await MessageQueries.create_message(
@@ -1360,20 +1383,27 @@ async def callback_discuss_task(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("rating_"), BuyerStates.waiting_task_rating)
-async def process_rating(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def process_rating(callback: CallbackQuery, state: FSMContext, bot: Bot, current_user: Optional[User]):
     """Обработка оценки"""
     rating = int(callback.data.replace("rating_", ""))
     data = await state.get_data()
     task_id = data['task_id_for_rating']
     
     async with AsyncSessionLocal() as session:
-        buyer = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        task = await TaskQueries.get_task_by_id(session, task_id)
-        
-        # Обновляем задачу
-        task.rating = rating
-        # Загрузка исполнителя уменьшится автоматически в update_task_status при смене статуса на APPROVED
-        await TaskQueries.update_task_status(session, task_id, TaskStatus.APPROVED, buyer.id, f"Оценка: {rating}/5")
+        buyer = current_user
+        # Оценка и одобрение одним запросом; повторная оценка не пройдёт
+        result = await TaskTransitions.approve(session, task_id, buyer.id, rating)
+        
+        if not result.applied:
+            if result.previous_status == TaskStatus.APPROVED:
+                await callback.answer("ℹ️ Задача уже одобрена", show_alert=True)
+            elif result.previous_status is None:
+                await callback.answer("❌ Задача не найдена", show_alert=True)
+            else:
+                await callback.answer("❌ Одобрить можно только завершенную задачу", show_alert=True)
+            await state.clear()
+            return
+        task = result.task
         
         # Логируем в канал
         await LogChannel.log_task_approved(bot, task, buyer, rating)
@@ -1407,19 +1437,19 @@ async def process_rating(callback: CallbackQuery, state: FSMContext, bot: Bot):
 
 
 @router.message(F.text == "✅ На проверке")
-async def buyer_tasks_on_review(message: Message, state: FSMContext):
+async def buyer_tasks_on_review(message: Message, state: FSMContext, current_user: Optional[User]):
     """Просмотр задач на проверке (оптимизировано)"""
     await state.clear()
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
-        
-        if not user or user.role != UserRole.BUYER:
-            await message.answer("❌ У вас нет доступа к этой функции")
-            return
+        user = current_user
         
-        # Быстрый подсчет задач на проверке
-        completed_count = await TaskQueries.count_tasks_by_creator(session, user.id, status=TaskStatus.COMPLETED)
+        # Страница и общее число одним запросом
+        page = 1
+        per_page = 5
+        tasks_on_review, completed_count = await TaskQueries.get_tasks_by_creator_page(
+            session, user.id, status=TaskStatus.COMPLETED, page=page, per_page=per_page
+        )
         
         if completed_count == 0:
             await message.answer(
@@ -1429,13 +1459,6 @@ async def buyer_tasks_on_review(message: Message, state: FSMContext):
             )
             return
         
-        # Загружаем только первую страницу задач на проверке (5 задач)
-        page = 1
-        per_page = 5
-        tasks_on_review = await TaskQueries.get_tasks_by_creator(
-            session, user.id, status=TaskStatus.COMPLETED, page=page, per_page=per_page
-        )
-        
         text = f"""
 📋 <b>ЗАДАЧИ НА ПРОВЕРКЕ</b>
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -1482,14 +1505,10 @@ async def callback_buyer_stats_menu(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "buyer_stats_general")
-async def callback_buyer_stats_general(callback: CallbackQuery):
+async def callback_buyer_stats_general(callback: CallbackQuery, current_user: Optional[User]):
     """Общая статистика байера"""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.BUYER:
-            await callback.answer("❌ У вас нет доступа")
-            return
+        user = current_user
         
         tasks = await TaskQueries.get_tasks_by_creator(session, user.id)
         
@@ -1542,14 +1561,10 @@ async def callback_buyer_stats_general(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "buyer_stats_status")
-async def callback_buyer_stats_status(callback: CallbackQuery):
+async def callback_buyer_stats_status(callback: CallbackQuery, current_user: Optional[User]):
     """Статистика по статусам задач"""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.BUYER:
-            await callback.answer("❌ У вас нет доступа")
-            return
+        user = current_user
         
         tasks = await TaskQueries.get_tasks_by_creator(session, user.id)
         
@@ -1604,14 +1619,10 @@ async def callback_buyer_stats_status(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "buyer_stats_directions")
-async def callback_buyer_stats_directions(callback: CallbackQuery):
+async def callback_buyer_stats_directions(callback: CallbackQuery, current_user: Optional[User]):
     """Статистика по направлениям"""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.BUYER:
-            await callback.answer("❌ У вас нет доступа")
-            return
+        user = current_user
         
         tasks = await TaskQueries.get_tasks_by_creator(session, user.id)
         
@@ -1674,14 +1685,10 @@ async def callback_buyer_stats_directions(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "buyer_stats_executors")
-async def callback_buyer_stats_executors(callback: CallbackQuery):
+async def callback_buyer_stats_executors(callback: CallbackQuery, current_user: Optional[User]):
     """Статистика по исполнителям"""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.BUYER:
-            await callback.answer("❌ У вас нет доступа")
-            return
+        user = current_user
         
         tasks = await TaskQueries.get_tasks_by_creator(session, user.id)
         
@@ -1769,7 +1776,7 @@ async def callback_buyer_stats_period(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("buyer_period_"))
-async def callback_buyer_period_selected(callback: CallbackQuery):
+async def callback_buyer_period_selected(callback: CallbackQuery, current_user: Optional[User]):
     """Обработка выбора периода"""
     period = callback.data.replace("buyer_period_", "")
     
@@ -1787,11 +1794,7 @@ async def callback_buyer_period_selected(callback: CallbackQuery):
     period_name, start_date = period_names.get(period, ("Неизвестно", now))
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.BUYER:
-            await callback.answer("❌ У вас нет доступа")
-            return
+        user = current_user
         
         # Все задачи байера
         all_tasks = await TaskQueries.get_tasks_by_creator(session, user.id)
@@ -1912,7 +1915,7 @@ async def callback_buyer_message(callback: CallbackQuery, state: FSMContext):
 
 
 @router.message(BuyerStates.waiting_message_to_executor)
-async def process_message_to_executor(message: Message, state: FSMContext, bot: Bot):
+async def process_message_to_executor(message: Message, state: FSMContext, bot: Bot, current_user: Optional[User]):
     """Обработка сообщения исполнителю"""
     # Если это файл, переключаемся в режим загрузки файлов
     if message.document or message.photo:
@@ -1937,7 +1940,7 @@ async def process_message_to_executor(message: Message, state: FSMContext, bot:
     target_executor_id = data.get('message_executor_id')
     
     async with AsyncSessionLocal() as session:
-        buyer = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
+        buyer = current_user
         task = await TaskQueries.get_task_by_id(session, task_id)
         
         if not task:
@@ -2117,6 +2120,23 @@ async def show_task_view_from_message(message: Message, task_id: int):
 
 # ============ РЕДАКТИРОВАНИЕ ЗАДАЧИ ============
 
+TASK_CHANGED_WHILE_EDITING = (
+    "⚠️ <b>Задачу изменили, пока вы её редактировали</b>\n\n"
+    "Изменение не сохранено, чтобы не перезаписать чужие правки.\n"
+    "Откройте задачу заново и повторите редактирование."
+)
+
+
+async def _update_edited_task(task_id: int, data: dict, **fields):
+    """
+    Сохранить поля редактируемой задачи с проверкой версии из начала редактирования.
+
+    Возвращает задачу (None — задачи нет); TaskVersionConflict — задачу успели изменить.
+    """
+    async with AsyncSessionLocal() as session:
+        return await TaskQueries.update_task(session, task_id, data.get('edit_task_version'), **fields)
+
+
 @router.callback_query(F.data.startswith("buyer_edit_task_"))
 async def callback_edit_task(callback: CallbackQuery, state: FSMContext):
     """Редактирование существующей задачи"""
@@ -2134,8 +2154,8 @@ async def callback_edit_task(callback: CallbackQuery, state: FSMContext):
             await callback.answer("❌ Можно редактировать только задачи в статусе 'Ожидает'", show_alert=True)
             return
         
-        # Сохраняем ID задачи для редактирования
-        await state.update_data(edit_task_id=task_id)
+        # Сохраняем ID и версию задачи: если её изменят до сохранения, правка не перезапишет чужую
+        await state.update_data(edit_task_id=task_id, edit_task_version=task.version)
         
         await callback.message.edit_text(
             "✏️ <b>РЕДАКТИРОВАНИЕ ЗАДАЧИ</b>\n\n"
@@ -2250,8 +2270,8 @@ async def edit_existing_task_executor(callback: CallbackQuery, state: FSMContext
             await callback.answer("❌ Нет доступных исполнителей")
             return
         
-        # Сохраняем данные исполнителей в state
-        await state.update_data(executors_by_direction=executors_by_direction)
+        # Сохраняем в state только id исполнителей по направлениям
+        await state.update_data(executors_by_direction=_pack_executors_by_direction(executors_by_direction))
         
         text = """
 👤 <b>ИЗМЕНЕНИЕ ИСПОЛНИТЕЛЯ</b>
@@ -2290,20 +2310,21 @@ async def save_edited_task_title(message: Message, state: FSMContext):
     
     if task_id:
         # Редактирование существующей задачи
-        async with AsyncSessionLocal() as session:
-            task = await TaskQueries.get_task_by_id(session, task_id)
-            if task:
-                task.title = title
-                await session.commit()
-                
-                await message.answer(
-                    f"✅ <b>Название обновлено</b>\n\n"
-                    f"Новое название: {title}",
-                    parse_mode="HTML"
-                )
-                
-                # Возвращаемся к просмотру задачи
-                await show_task_view_from_message(message, task_id)
+        try:
+            task = await _update_edited_task(task_id, data, title=title)
+        except TaskVersionConflict:
+            await message.answer(TASK_CHANGED_WHILE_EDITING, parse_mode="HTML")
+            await state.clear()
+            return
+        if task:
+            await message.answer(
+                f"✅ <b>Название обновлено</b>\n\n"
+                f"Новое название: {title}",
+                parse_mode="HTML"
+            )
+            
+            # Возвращаемся к просмотру задачи
+            await show_task_view_from_message(message, task_id)
         
         await state.clear()
     else:
@@ -2318,13 +2339,13 @@ async def save_edited_task_title(message: Message, state: FSMContext):
             DirectionType.MARKETING: "📱 Маркетинг"
         }
         priority_names = ["🟢 Низкий", "🟡 Средний", "🟠 Высокий", "🔴 Срочный"]
-        deadline_str = data.get('deadline').strftime("%d.%m.%Y %H:%M") if data.get('deadline') else "Не указан"
+        deadline_str = _fsm_deadline_str(data)
         
         preview_template_for_check = f"""
 📋 <b>ПРЕВЬЮ ЗАДАЧИ</b>
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-🎯 <b>Направление:</b> {direction_names.get(data.get('direction'), '')}
+🎯 <b>Направление:</b> {direction_names.get(_fsm_direction(data), '')}
 👤 <b>Исполнитель:</b> {data.get('executor_name', '')}
 
 📌 <b>Название:</b> {data.get('title', '')}
@@ -2425,19 +2446,20 @@ Telegram не позволяет отправлять сообщения дли
             logger.warning(f"Попытка сохранить слишком длинное описание для задачи {task_id} (длина: {len(description)})")
             return
         
-        async with AsyncSessionLocal() as session:
-            task = await TaskQueries.get_task_by_id(session, task_id)
-            if task:
-                task.description = description
-                await session.commit()
-                
-                await message.answer(
-                    f"✅ <b>Описание обновлено</b>",
-                    parse_mode="HTML"
-                )
-                
-                # Возвращаемся к просмотру задачи
-                await show_task_view_from_message(message, task_id)
+        try:
+            task = await _update_edited_task(task_id, data, description=description)
+        except TaskVersionConflict:
+            await message.answer(TASK_CHANGED_WHILE_EDITING, parse_mode="HTML")
+            await state.clear()
+            return
+        if task:
+            await message.answer(
+                f"✅ <b>Описание обновлено</b>",
+                parse_mode="HTML"
+            )
+            
+            # Возвращаемся к просмотру задачи
+            await show_task_view_from_message(message, task_id)
         
         await state.clear()
     else:
@@ -2451,13 +2473,13 @@ Telegram не позволяет отправлять сообщения дли
         }
         priority_names = ["🟢 Низкий", "🟡 Средний", "🟠 Высокий", "🔴 Срочный"]
         
-        deadline_str = data.get('deadline').strftime("%d.%m.%Y %H:%M") if data.get('deadline') else "Не указан"
+        deadline_str = _fsm_deadline_str(data)
         
         preview_template = f"""
 📋 <b>ПРЕВЬЮ ЗАДАЧИ</b>
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-🎯 <b>Направление:</b> {direction_names.get(data.get('direction'), '')}
+🎯 <b>Направление:</b> {direction_names.get(_fsm_direction(data), '')}
 👤 <b>Исполнитель:</b> {data.get('executor_name', '')}
 
 📌 <b>Название:</b> {data.get('title', '')}
@@ -2536,14 +2558,16 @@ async def save_edited_task_priority(callback: CallbackQuery, state: FSMContext):
     
     if task_id:
         # Редактирование существующей задачи
-        async with AsyncSessionLocal() as session:
-            task = await TaskQueries.get_task_by_id(session, task_id)
-            if task:
-                task.priority = priority
-                await session.commit()
-                
-                # Возвращаемся к просмотру задачи
-                await show_task_view_from_callback(callback, task_id)
+        try:
+            task = await _update_edited_task(task_id, data, priority=priority)
+        except TaskVersionConflict:
+            await callback.message.edit_text(TASK_CHANGED_WHILE_EDITING, parse_mode="HTML")
+            await state.clear()
+            await callback.answer()
+            return
+        if task:
+            # Возвращаемся к просмотру задачи
+            await show_task_view_from_callback(callback, task_id)
         
         await state.clear()
         await callback.answer("Приоритет обновлен")
@@ -2649,14 +2673,16 @@ async def skip_edited_deadline(callback: CallbackQuery, state: FSMContext):
     
     if task_id:
         # Редактирование существующей задачи
-        async with AsyncSessionLocal() as session:
-            task = await TaskQueries.get_task_by_id(session, task_id)
-            if task:
-                task.deadline = None
-                await session.commit()
-                
-                # Возвращаемся к просмотру задачи
-                await show_task_view_from_callback(callback, task_id)
+        try:
+            task = await _update_edited_task(task_id, data, deadline=None)
+        except TaskVersionConflict:
+            await callback.message.edit_text(TASK_CHANGED_WHILE_EDITING, parse_mode="HTML")
+            await state.clear()
+            await callback.answer()
+            return
+        if task:
+            # Возвращаемся к просмотру задачи
+            await show_task_view_from_callback(callback, task_id)
         
         await state.clear()
         await callback.answer("Дедлайн удален")
@@ -2704,27 +2730,28 @@ async def save_edited_task_deadline(message: Message, state: FSMContext):
         
         if task_id:
             # Редактирование существующей задачи
-            async with AsyncSessionLocal() as session:
-                task = await TaskQueries.get_task_by_id(session, task_id)
-                if task:
-                    task.deadline = deadline
-                    await session.commit()
-                    
-                    deadline_str = deadline.strftime("%d.%m.%Y %H:%M")
-                    await message.answer(
-                        f"✅ <b>Дедлайн обновлен</b>\n\n"
-                        f"Новый дедлайн: {deadline_str}",
-                        parse_mode="HTML"
-                    )
-                    
-                    # Возвращаемся к просмотру задачи
-                    await show_task_view_from_message(message, task_id)
+            try:
+                task = await _update_edited_task(task_id, data, deadline=deadline)
+            except TaskVersionConflict:
+                await message.answer(TASK_CHANGED_WHILE_EDITING, parse_mode="HTML")
+                await state.clear()
+                return
+            if task:
+                deadline_str = deadline.strftime("%d.%m.%Y %H:%M")
+                await message.answer(
+                    f"✅ <b>Дедлайн обновлен</b>\n\n"
+                    f"Новый дедлайн: {deadline_str}",
+                    parse_mode="HTML"
+                )
+                
+                # Возвращаемся к просмотру задачи
+                await show_task_view_from_message(message, task_id)
             
             await state.clear()
         else:
             # Создание новой задачи (существующая логика)
             if deadline:
-                await state.update_data(deadline=deadline)
+                await state.update_data(deadline=deadline.isoformat())
                 await show_task_preview(message, state)
             else:
                 raise ValueError("Неверный формат")
@@ -2745,12 +2772,12 @@ async def save_edited_task_deadline(message: Message, state: FSMContext):
 # ============ ОТМЕНА ЗАДАЧИ ============
 
 @router.callback_query(F.data.startswith("buyer_cancel_task_"))
-async def callback_cancel_task(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def callback_cancel_task(callback: CallbackQuery, state: FSMContext, bot: Bot, current_user: Optional[User]):
     """Отмена задачи"""
     task_id = int(callback.data.replace("buyer_cancel_task_", ""))
     
     async with AsyncSessionLocal() as session:
-        buyer = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
+        buyer = current_user
         task = await TaskQueries.get_task_by_id(session, task_id)
         
         if not task:
@@ -10,23 +10,25 @@
 - Баер может отправлять в чат только задачи, созданные им.
 """
 
-from aiogram import Router, F, Bot
+from typing import Optional
+from aiogram import F, Bot
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 
 from db.engine import AsyncSessionLocal
-from db.queries import UserQueries, TaskQueries, LogQueries, ChatAccessQueries, ChatRequestQueries
+from db.queries import TaskQueries, LogQueries, ChatAccessQueries, ChatRequestQueries
 from db.queries.chat_queries import ChatQueries
-from db.models import UserRole, TaskStatus
+from db.models import TaskStatus, User
 
 from bot.keyboards.admin_kb import AdminKeyboards
 from bot.keyboards.common_kb import CommonKeyboards
 from states.buyer_states import BuyerStates
 from bot.utils.message_utils import truncate_description_in_preview, TELEGRAM_MAX_MESSAGE_LENGTH
+from bot.utils.callback_router import TrieRouter
 from log import logger
 
 
-router = Router()
+router = TrieRouter()
 
 
 async def _render_chat_info(callback: CallbackQuery, chat):
@@ -96,15 +98,14 @@ async def _get_open_tasks_for_buyer(session, buyer_id: int, page: int = 1, per_p
 
 
 @router.message(F.text == "💬 Чаты")
-async def buyer_chats_menu(message: Message):
+async def buyer_chats_menu(message: Message, current_user: Optional[User]):
     """Меню чатов для баера."""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
+        user = current_user
 
-        if not user or user.role != UserRole.BUYER:
-            return
-
-        total_count = await ChatAccessQueries.count_accessible_chats(session, user.id)
+        page = 1
+        per_page = 8
+        chats, total_count = await ChatAccessQueries.get_accessible_chats_page(session, user.id, page=page, per_page=per_page)
         if total_count == 0:
             await message.answer(
                 "💬 <b>ЧАТЫ</b>\n\n"
@@ -114,10 +115,6 @@ async def buyer_chats_menu(message: Message):
             )
             return
 
-        page = 1
-        per_page = 8
-        chats = await ChatAccessQueries.get_accessible_chats(session, user.id, page=page, per_page=per_page)
-
         text = "💬 <b>ЧАТЫ</b>\n\n📊 Выберите чат из списка:\n\n"
         await message.answer(
             text,
@@ -132,15 +129,13 @@ async def buyer_chats_menu(message: Message):
 
 
 @router.callback_query(F.data == "admin_chats_list")
-async def buyer_callback_chats_list(callback: CallbackQuery):
+async def buyer_callback_chats_list(callback: CallbackQuery, current_user: Optional[User]):
     """Список чатов (callback) для баера."""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        if not user or user.role != UserRole.BUYER:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-
-        total_count = await ChatAccessQueries.count_accessible_chats(session, user.id)
+        user = current_user
+        page = 1
+        per_page = 8
+        chats, total_count = await ChatAccessQueries.get_accessible_chats_page(session, user.id, page=page, per_page=per_page)
         if total_count == 0:
             await callback.message.edit_text(
                 "💬 <b>ЧАТЫ</b>\n\n"
@@ -151,10 +146,6 @@ async def buyer_callback_chats_list(callback: CallbackQuery):
             await callback.answer()
             return
 
-        page = 1
-        per_page = 8
-        chats = await ChatAccessQueries.get_accessible_chats(session, user.id, page=page, per_page=per_page)
-
         text = "💬 <b>ЧАТЫ</b>\n\n📊 Выберите чат из списка:\n\n"
         await callback.message.edit_text(
             text,
@@ -170,18 +161,14 @@ async def buyer_callback_chats_list(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("admin_chats_page_"))
-async def buyer_callback_chats_page(callback: CallbackQuery):
+async def buyer_callback_chats_page(callback: CallbackQuery, current_user: Optional[User]):
     """Навигация по страницам чатов (для баера)."""
     page = int(callback.data.replace("admin_chats_page_", ""))
     per_page = 8
 
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        if not user or user.role != UserRole.BUYER:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-
-        total_count = await ChatAccessQueries.count_accessible_chats(session, user.id)
+        user = current_user
+        chats, total_count = await ChatAccessQueries.get_accessible_chats_page(session, user.id, page=page, per_page=per_page)
         if total_count == 0:
             await callback.message.edit_text(
                 "💬 <b>ЧАТЫ</b>\n\n"
@@ -191,7 +178,6 @@ async def buyer_callback_chats_page(callback: CallbackQuery):
             await callback.answer()
             return
 
-        chats = await ChatAccessQueries.get_accessible_chats(session, user.id, page=page, per_page=per_page)
         text = "💬 <b>ЧАТЫ</b>\n\n📊 Выберите чат из списка:\n\n"
         await callback.message.edit_text(
             text,
@@ -207,15 +193,11 @@ async def buyer_callback_chats_page(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("admin_view_chat_"))
-async def buyer_callback_view_chat(callback: CallbackQuery, state: FSMContext):
+async def buyer_callback_view_chat(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Просмотр информации о чате (для баера)."""
     chat_db_id = int(callback.data.split("_")[-1])
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        if not user or user.role != UserRole.BUYER:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-
+        user = current_user
         if not await ChatAccessQueries.has_access(session, user.id, chat_db_id):
             await callback.answer("❌ У вас нет доступа к этому чату", show_alert=True)
             return
@@ -232,15 +214,11 @@ async def buyer_callback_view_chat(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("admin_send_message_chat_"))
-async def buyer_callback_send_message_chat(callback: CallbackQuery, state: FSMContext):
+async def buyer_callback_send_message_chat(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Начало отправки сообщения в чат (для баера)."""
     chat_db_id = int(callback.data.split("_")[-1])
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        if not user or user.role != UserRole.BUYER:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-
+        user = current_user
         if not await ChatAccessQueries.has_access(session, user.id, chat_db_id):
             await callback.answer("❌ У вас нет доступа к этому чату", show_alert=True)
             return
@@ -264,7 +242,7 @@ async def buyer_callback_send_message_chat(callback: CallbackQuery, state: FSMCo
 
 
 @router.message(BuyerStates.waiting_chat_message)
-async def buyer_process_chat_message(message: Message, state: FSMContext, bot: Bot):
+async def buyer_process_chat_message(message: Message, state: FSMContext, bot: Bot, current_user: Optional[User]):
     """Обработка сообщения для отправки в чат (для баера)."""
     data = await state.get_data()
     chat_telegram_id = data.get("chat_telegram_id")
@@ -275,12 +253,7 @@ async def buyer_process_chat_message(message: Message, state: FSMContext, bot: B
         return
 
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
-        if not user or user.role != UserRole.BUYER:
-            await message.answer("❌ У вас нет доступа", parse_mode="HTML")
-            await state.clear()
-            return
-
+        user = current_user
         if not chat_db_id:
             await message.answer("❌ Ошибка: не найден чат", parse_mode="HTML")
             await state.clear()
@@ -404,15 +377,11 @@ async def buyer_process_chat_message(message: Message, state: FSMContext, bot: B
 
 
 @router.callback_query(F.data.startswith("admin_send_task_chat_"))
-async def buyer_callback_send_task_chat(callback: CallbackQuery, state: FSMContext):
+async def buyer_callback_send_task_chat(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Начало процесса отправки задачи в чат (для баера)."""
     chat_db_id = int(callback.data.split("_")[-1])
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        if not user or user.role != UserRole.BUYER:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-
+        user = current_user
         if not await ChatAccessQueries.has_access(session, user.id, chat_db_id):
             await callback.answer("❌ У вас нет доступа к этому чату", show_alert=True)
             return
@@ -463,17 +432,13 @@ async def buyer_callback_send_task_chat(callback: CallbackQuery, state: FSMConte
     F.data.startswith("admin_chat_task_tasks_page_"),
     BuyerStates.waiting_chat_task_selection,
 )
-async def buyer_callback_chat_task_tasks_page(callback: CallbackQuery, state: FSMContext):
+async def buyer_callback_chat_task_tasks_page(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Пагинация списка задач для отправки в чат (для баера)."""
     page = int(callback.data.replace("admin_chat_task_tasks_page_", ""))
     per_page = 8
 
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        if not user or user.role != UserRole.BUYER:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-
+        user = current_user
         data = await state.get_data()
         chat_title = data.get("chat_title", "Чат")
         tasks, total_count = await _get_open_tasks_for_buyer(
@@ -514,15 +479,11 @@ async def buyer_callback_chat_task_tasks_page(callback: CallbackQuery, state: FS
     F.data.startswith("admin_chat_task_select_"),
     BuyerStates.waiting_chat_task_selection,
 )
-async def buyer_callback_chat_task_select(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def buyer_callback_chat_task_select(callback: CallbackQuery, state: FSMContext, bot: Bot, current_user: Optional[User]):
     """Отправка выбранной задачи баера в чат."""
     task_id = int(callback.data.replace("admin_chat_task_select_", ""))
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        if not user or user.role != UserRole.BUYER:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-
+        user = current_user
         data = await state.get_data()
         chat_db_id = data.get("chat_db_id")
         chat_telegram_id = data.get("chat_telegram_id")
@@ -605,6 +566,8 @@ async def buyer_callback_chat_task_select(callback: CallbackQuery, state: FSMCon
                     "chat_id": chat_telegram_id,
                     "task_number": task.task_number,
                 },
+                # По этой записи кнопка «Выполнено» в чате находит тимлида — пишем сразу
+                immediate=True,
             )
         except Exception as e:
             logger.error(f"Не удалось записать лог отправки задачи {task.task_number}: {e}")
@@ -623,11 +586,6 @@ async def buyer_callback_chat_task_select(callback: CallbackQuery, state: FSMCon
 async def buyer_callback_chat_task_back(callback: CallbackQuery, state: FSMContext):
     """Возврат из списка задач обратно к карточке чата (для баера)."""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        if not user or user.role != UserRole.BUYER:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-
         data = await state.get_data()
         chat_db_id = data.get("chat_db_id")
         if not chat_db_id:
@@ -649,11 +607,6 @@ async def buyer_callback_chat_task_back(callback: CallbackQuery, state: FSMConte
 async def buyer_callback_chat_task_back_to_chat(callback: CallbackQuery, state: FSMContext):
     """Совместимость: кнопка '◀️ Назад к чату' (в нашем сценарии уже чат)."""
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        if not user or user.role != UserRole.BUYER:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-
         data = await state.get_data()
         chat_db_id = data.get("chat_db_id")
         if not chat_db_id:
@@ -674,10 +627,4 @@ async def buyer_callback_chat_task_back_to_chat(callback: CallbackQuery, state:
 @router.callback_query(F.data.startswith("admin_delete_chat_"))
 async def buyer_callback_delete_chat(callback: CallbackQuery):
     """Запрещаем баеру удалять чат из БД (кнопка есть в админской клавиатуре)."""
-    async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        if not user or user.role != UserRole.BUYER:
-            await callback.answer("❌ У вас нет доступа", show_alert=True)
-            return
-
     await callback.answer("❌ У вас нет прав удалять чаты", show_alert=True)
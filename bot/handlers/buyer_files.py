@@ -1,20 +1,23 @@
 """Обработчики файлов для байера"""
-from aiogram import Router, F, Bot
+from typing import Optional
+from aiogram import F, Bot
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from datetime import datetime
 
 from db.engine import AsyncSessionLocal
 from db.queries import UserQueries, TaskQueries, MessageQueries, FileQueries
-from db.models import UserRole, TaskStatus, FileType
+from db.models import UserRole, TaskStatus, FileType, User
 from bot.keyboards.common_kb import CommonKeyboards
+from bot.keyboards.callbacks import FileViewCallback
 from bot.keyboards.buyer_kb import BuyerKeyboards
 from states.buyer_states import BuyerStates
 from bot.utils.file_handler import FileHandler
 from bot.utils.photo_handler import PhotoHandler
+from bot.utils.callback_router import TrieRouter
 from log import logger
 
-router = Router()
+router = TrieRouter()
 
 
 # ============ ПРОСМОТР И СКАЧИВАНИЕ ФАЙЛОВ (приоритетные обработчики) ============
@@ -191,7 +194,7 @@ async def edit_field_files(callback: CallbackQuery, state: FSMContext):
 
 Нажмите на файл чтобы просмотреть его или добавьте новые файлы.
 """,
-            reply_markup=CommonKeyboards.file_list_with_actions(files, "initial"),
+            reply_markup=CommonKeyboards.file_list_with_actions(files),
             parse_mode="HTML"
         )
     else:
@@ -213,10 +216,10 @@ async def edit_field_files(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("view_file_initial:"), BuyerStates.waiting_task_files)
-async def view_initial_file(callback: CallbackQuery, state: FSMContext, bot: Bot):
+@router.callback_query(FileViewCallback.filter(F.task_id.is_(None)), BuyerStates.waiting_task_files)
+async def view_initial_file(callback: CallbackQuery, callback_data: FileViewCallback, state: FSMContext, bot: Bot):
     """Просмотр файла при создании задачи"""
-    file_idx = int(callback.data.split(":")[1])
+    file_idx = callback_data.idx
     data = await state.get_data()
     files = data.get('initial_files', [])
     
@@ -349,7 +352,7 @@ async def process_initial_file(message: Message, state: FSMContext, bot: Bot):
 
 Нажмите на файл чтобы просмотреть его или добавьте новые файлы.
 """,
-        reply_markup=CommonKeyboards.file_list_with_actions(files, "initial"),
+        reply_markup=CommonKeyboards.file_list_with_actions(files),
         parse_mode="HTML"
     )
 
@@ -492,7 +495,7 @@ async def process_message_file(message: Message, state: FSMContext, bot: Bot):
 
 
 @router.message(BuyerStates.waiting_message_file)
-async def process_message_with_files(message: Message, state: FSMContext, bot: Bot):
+async def process_message_with_files(message: Message, state: FSMContext, bot: Bot, current_user: Optional[User]):
     """Обработка текста сообщения с файлами"""
     # Если это еще файл, обрабатываем его
     if message.document or message.photo or message.video:
@@ -515,7 +518,7 @@ async def process_message_with_files(message: Message, state: FSMContext, bot: B
         return
     
     async with AsyncSessionLocal() as session:
-        buyer = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
+        buyer = current_user
         task = await TaskQueries.get_task_by_id(session, task_id)
         
         if not task:
@@ -889,7 +892,7 @@ async def process_buyer_file_to_task(message: Message, state: FSMContext, bot: B
 
 
 @router.callback_query(F.data == "files_done", BuyerStates.waiting_file_to_task)
-async def buyer_files_to_task_done(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def buyer_files_to_task_done(callback: CallbackQuery, state: FSMContext, bot: Bot, current_user: Optional[User]):
     """Завершение загрузки файлов байером"""
     data = await state.get_data()
     task_id = data.get('file_task_id')
@@ -900,7 +903,7 @@ async def buyer_files_to_task_done(callback: CallbackQuery, state: FSMContext, b
         return
     
     async with AsyncSessionLocal() as session:
-        buyer = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
+        buyer = current_user
         task = await TaskQueries.get_task_by_id(session, task_id)
         
         if not task:
@@ -1,6 +1,6 @@
 """Обработчики профиля исполнителя для байера."""
 
-from aiogram import Router, F, Bot
+from aiogram import F, Bot
 from aiogram.types import CallbackQuery
 
 from db.engine import AsyncSessionLocal
@@ -8,10 +8,11 @@ from db.queries import UserQueries, TaskQueries
 from db.models import TaskStatus
 from bot.keyboards.buyer_profile_kb import BuyerProfileKeyboards
 from bot.keyboards.buyer_kb import BuyerKeyboards
+from bot.utils.callback_router import TrieRouter
 from log import logger
 
 
-router = Router()
+router = TrieRouter()
 
 
 @router.callback_query(F.data.startswith("buyer_exec_profile_"))
@@ -1,24 +1,27 @@
 """Общие обработчики для всех пользователей"""
+from typing import Optional
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, ChatMemberUpdated
 from aiogram.filters import Command
 from datetime import datetime
 from aiogram.fsm.context import FSMContext
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import func
 
 from db.engine import AsyncSessionLocal
-from db.queries import UserQueries, TaskQueries, LogQueries, ChatRequestQueries
+from db.queries import UserQueries, TaskQueries, LogQueries, ChatRequestQueries, TaskTransitions
 from db.queries.chat_queries import ChatQueries
 from db.queries.channel_queries import ChannelQueries
-from db.models import UserRole, DirectionType, TaskStatus, ActionLog
+from db.models import UserRole, DirectionType, TaskStatus, User
 from bot.keyboards.admin_kb import AdminKeyboards
 from bot.keyboards.buyer_kb import BuyerKeyboards
 from bot.keyboards.executor_kb import ExecutorKeyboards
+from bot.utils.callback_router import TrieRouter
 from log import logger
 
-router = Router()
+router = TrieRouter()
+# Подключается последним: ловит callback'и, которые не подошли ни одному роутеру роли
+fallback_router = Router()
 
 
 @router.message(Command("start"))
@@ -43,8 +46,8 @@ async def cmd_start(message: Message, state: FSMContext):
                 role = None
                 logger.info(f"Автоматическая регистрация пользователя: {message.from_user.id}")
             
-            # Создаем пользователя
-            user = await UserQueries.create_user(
+            # Создаем пользователя (повторный /start не упадёт на уникальности telegram_id)
+            user, created = await UserQueries.register_user(
                 session=session,
                 telegram_id=message.from_user.id,
                 role=role,
@@ -53,6 +56,13 @@ async def cmd_start(message: Message, state: FSMContext):
                 last_name=message.from_user.last_name
             )
             
+            if not created:
+                # Пользователь уже есть: его только что зарегистрировал параллельный /start
+                # (приветствие отправит он) или пользователь деактивирован
+                if not user.is_active:
+                    await message.answer("❌ Ваш аккаунт деактивирован. Обратитесь к администратору.")
+                return
+            
             # Если это админ
             if role == UserRole.ADMIN:
                 await message.answer(
@@ -117,6 +127,7 @@ async def cmd_start(message: Message, state: FSMContext):
             user.last_name = message.from_user.last_name
             user.username = message.from_user.username
             await session.commit()
+            UserQueries.invalidate_cached_user(user.telegram_id)
             logger.info(f"Обновлены данные пользователя {user.telegram_id}: {user.first_name} {user.last_name or ''}")
         
         # Если у пользователя нет роли - показываем сообщение ожидания
@@ -174,16 +185,15 @@ async def cmd_start(message: Message, state: FSMContext):
 
 
 @router.message(Command("help"))
-async def cmd_help(message: Message):
+async def cmd_help(message: Message, current_user: Optional[User]):
     """Обработка команды /help"""
-    async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
-        
-        if not user:
-            return
-        
-        help_texts = {
-            UserRole.ADMIN: """
+    user = current_user
+    
+    if not user:
+        return
+    
+    help_texts = {
+        UserRole.ADMIN: """
 <b>📚 Помощь администратору</b>
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
 
@@ -206,7 +216,7 @@ async def cmd_help(message: Message):
 /help - Эта справка
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
 """,
-            UserRole.BUYER: """
+        UserRole.BUYER: """
 <b>📚 Помощь байеру</b>
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
 
@@ -228,7 +238,7 @@ async def cmd_help(message: Message):
 /help - Эта справка
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
 """,
-            UserRole.EXECUTOR: """
+        UserRole.EXECUTOR: """
 <b>📚 Помощь исполнителю</b>
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
 
@@ -249,10 +259,10 @@ async def cmd_help(message: Message):
 /help - Эта справка
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
 """
-        }
-        
-        help_text = help_texts.get(user.role, "Помощь недоступна")
-        await message.answer(help_text, parse_mode="HTML")
+    }
+    
+    help_text = help_texts.get(user.role, "Помощь недоступна")
+    await message.answer(help_text, parse_mode="HTML")
 
 
 @router.callback_query(F.data == "cancel")
@@ -280,6 +290,12 @@ async def callback_page_info(callback: CallbackQuery):
     await callback.answer("Информация о текущей странице", show_alert=False)
 
 
+@router.callback_query(F.data == "noop")
+async def callback_noop(callback: CallbackQuery):
+    """Пустой callback для неактивных кнопок (клавиатура чатов общая у админа и баера)"""
+    await callback.answer()
+
+
 @router.callback_query(F.data.startswith("chat_task_complete_"))
 async def callback_chat_task_complete(callback: CallbackQuery):
     """Отметить задачу как выполненную из чата"""
@@ -291,63 +307,47 @@ async def callback_chat_task_complete(callback: CallbackQuery):
     task_id = int(task_id_str)
     
     async with AsyncSessionLocal() as session:
-        task = await TaskQueries.get_task_by_id(session, task_id)
-        
-        if not task:
-            await callback.answer("❌ Задача не найдена", show_alert=True)
-            return
-        
-        if task.status in {TaskStatus.COMPLETED, TaskStatus.APPROVED, TaskStatus.REJECTED, TaskStatus.CANCELLED}:
+        actor = await UserQueries.get_user_by_telegram_id(
+            session,
+            callback.from_user.id,
+            active_only=False
+        )
+
+        chat = callback.message.chat
+        chat_title = chat.title or chat.username or f"Chat {chat.id}"
+
+        # Закрываем задачу, только если она ещё открыта: двойное нажатие
+        # или несколько участников чата не отметят её повторно.
+        # Событие chat_complete с данными чата пишется тем же переходом
+        result = await TaskTransitions.complete_from_chat(
+            session,
+            task_id,
+            actor.id if actor else None,
+            details={
+                "chat_id": chat.id,
+                "chat_title": chat_title,
+                "telegram_user_id": callback.from_user.id,
+                "telegram_username": callback.from_user.username,
+                "telegram_full_name": callback.from_user.full_name,
+                "message_id": callback.message.message_id if callback.message else None
+            }
+        )
+        if not result.applied:
+            if result.previous_status is None:
+                await callback.answer("❌ Задача не найдена", show_alert=True)
+                return
             await callback.answer("❌ Задача уже закрыта", show_alert=True)
             try:
                 await callback.message.edit_reply_markup(reply_markup=None)
             except Exception:
                 pass
             return
-        
-        chat = callback.message.chat
-        chat_title = chat.title or chat.username or f"Chat {chat.id}"
+        task = result.task
         
         user_full_name = callback.from_user.full_name
         user_username = f"@{callback.from_user.username}" if callback.from_user.username else None
         user_display = f"{user_full_name} ({user_username})" if user_username else user_full_name
         
-        actor = await UserQueries.get_user_by_telegram_id(
-            session,
-            callback.from_user.id,
-            active_only=False
-        )
-
-        updated_task = await TaskQueries.update_task_status(
-            session=session,
-            task_id=task_id,
-            new_status=TaskStatus.COMPLETED,
-            user_id=actor.id if actor else None,
-            comment="Задача выполнена (чат)"
-        )
-        if not updated_task:
-            await callback.answer("❌ Не удалось обновить статус задачи", show_alert=True)
-            return
-        task = updated_task
-
-        try:
-            await LogQueries.create_task_log(
-                session=session,
-                task_id=task_id,
-                user_id=actor.id if actor else None,
-                action="chat_complete",
-                details={
-                    "chat_id": chat.id,
-                    "chat_title": chat_title,
-                    "telegram_user_id": callback.from_user.id,
-                    "telegram_username": callback.from_user.username,
-                    "telegram_full_name": callback.from_user.full_name,
-                    "message_id": callback.message.message_id if callback.message else None
-                }
-            )
-        except Exception as e:
-            logger.error(f"Не удалось записать лог по задаче {task_id}: {e}")
-        
         # Уведомляем баера
         if task.creator:
             notify_text = f"""
@@ -370,19 +370,9 @@ async def callback_chat_task_complete(callback: CallbackQuery):
 
         # Уведомляем тимлида (кто отправил задачу в чат)
         try:
-            result = await session.execute(
-                select(ActionLog)
-                .where(
-                    ActionLog.action_type == "chat_task_sent",
-                    ActionLog.entity_type == "task",
-                    ActionLog.entity_id == task.id
-                )
-                .order_by(ActionLog.created_at.desc())
-                .limit(1)
-            )
-            action_log = result.scalar_one_or_none()
-            if action_log and action_log.user_id:
-                teamlead = await UserQueries.get_user_by_id(session, action_log.user_id)
+            sent_event = await LogQueries.get_last_task_event(session, task.id, "chat_task_sent")
+            if sent_event and sent_event.user_id:
+                teamlead = await UserQueries.get_user_by_id(session, sent_event.user_id)
                 if teamlead:
                     if not task.creator or teamlead.telegram_id != task.creator.telegram_id:
                         teamlead_text = f"""
@@ -494,12 +484,12 @@ async def callback_chat_request_complete(callback: CallbackQuery):
 
 
 @router.message(F.text == "📋 Мои задачи")
-async def my_tasks(message: Message, state: FSMContext):
+async def my_tasks(message: Message, state: FSMContext, current_user: Optional[User]):
     """Универсальный обработчик для моих задач"""
     await state.clear()
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
+        user = current_user
         
         if not user:
             await message.answer("❌ Пользователь не найден")
@@ -648,30 +638,29 @@ async def my_profile(message: Message):
 
 
 @router.message(F.text == "📊 Статистика")
-async def statistics_menu(message: Message):
+async def statistics_menu(message: Message, current_user: Optional[User]):
     """Универсальный обработчик статистики - роутинг по ролям"""
-    async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
-        
-        if not user:
-            await message.answer("❌ Пользователь не найден")
-            return
-        
-        # Роутинг в зависимости от роли
-        if user.role == UserRole.ADMIN:
-            await message.answer(
-                "📊 <b>СТАТИСТИКА</b>\n\nВыберите раздел:",
-                reply_markup=AdminKeyboards.statistics_menu(),
-                parse_mode="HTML"
-            )
-        elif user.role == UserRole.BUYER:
-            await message.answer(
-                "📊 <b>СТАТИСТИКА</b>\n\nВыберите раздел:",
-                reply_markup=BuyerKeyboards.statistics_menu(),
-                parse_mode="HTML"
-            )
-        else:
-            await message.answer("❌ У вас нет доступа к этой функции")
+    user = current_user
+    
+    if not user:
+        await message.answer("❌ Пользователь не найден")
+        return
+    
+    # Роутинг в зависимости от роли
+    if user.role == UserRole.ADMIN:
+        await message.answer(
+            "📊 <b>СТАТИСТИКА</b>\n\nВыберите раздел:",
+            reply_markup=AdminKeyboards.statistics_menu(),
+            parse_mode="HTML"
+        )
+    elif user.role == UserRole.BUYER:
+        await message.answer(
+            "📊 <b>СТАТИСТИКА</b>\n\nВыберите раздел:",
+            reply_markup=BuyerKeyboards.statistics_menu(),
+            parse_mode="HTML"
+        )
+    else:
+        await message.answer("❌ У вас нет доступа к этой функции")
 
 
 @router.my_chat_member()
@@ -835,3 +824,9 @@ async def handle_my_chat_member(event: ChatMemberUpdated):
     
     except Exception as e:
         logger.error(f"Ошибка при обработке my_chat_member: {e}")
+
+
+@fallback_router.callback_query()
+async def callback_unhandled(callback: CallbackQuery):
+    """Кнопка чужой роли или устаревшей клавиатуры — убираем «часики»"""
+    await callback.answer("❌ У вас нет доступа к этой функции")
@@ -1,28 +1,34 @@
 """Обработчики для исполнителя"""
-from aiogram import Router, F, Bot
+from typing import Optional
+from aiogram import F, Bot
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from datetime import datetime, timedelta, timezone
 
 from db.engine import AsyncSessionLocal
-from db.queries import UserQueries, TaskQueries, MessageQueries, FileQueries, LogQueries
-from db.models import UserRole, TaskStatus, RejectionReason, FileType
+from db.queries import UserQueries, TaskQueries, MessageQueries, FileQueries, TaskTransitions, TransitionOutcome
+from db.models import UserRole, TaskStatus, RejectionReason, FileType, User
+from bot.filters import RoleFilter
 from bot.keyboards.executor_kb import ExecutorKeyboards
 from bot.keyboards.common_kb import CommonKeyboards
+from bot.keyboards.callbacks import FileViewCallback, ConfirmCallback
 from states.executor_states import ExecutorStates
 from bot.utils.file_handler import FileHandler
 from bot.utils.photo_handler import PhotoHandler
 from bot.utils.log_channel import LogChannel
 from bot.services.executor_status_service import ExecutorStatusService
+from bot.utils.callback_router import TrieRouter
 from log import logger
 
-router = Router()
+router = TrieRouter()
+# Все обработчики роутера — только для исполнителя
+router.message.filter(RoleFilter(UserRole.EXECUTOR))
+router.callback_query.filter(RoleFilter(UserRole.EXECUTOR))
 
 
 
-async def _can_executor_reject_task(session, task_id: int, executor_telegram_id: int) -> bool:
+async def _can_executor_reject_task(session, task_id: int, executor: Optional[User]) -> bool:
     """Проверить, может ли текущий исполнитель ещё раз отказаться от задачи"""
-    executor = await UserQueries.get_user_by_telegram_id(session, executor_telegram_id)
     if not executor:
         return False
     return not await TaskQueries.has_executor_rejected(session, task_id, executor.id)
@@ -85,19 +91,19 @@ def format_task_management_text(task, messages=None):
 # ============ ГЛАВНОЕ МЕНЮ ============
 
 @router.message(F.text == "🆕 Новые задачи")
-async def executor_new_tasks(message: Message, state: FSMContext):
+async def executor_new_tasks(message: Message, state: FSMContext, current_user: Optional[User]):
     """Новые задачи для исполнителя"""
     await state.clear()
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
-        
-        if not user or user.role != UserRole.EXECUTOR:
-            await message.answer("❌ У вас нет доступа к этой функции")
-            return
+        user = current_user
         
-        # Быстрый подсчет новых задач (PENDING)
-        pending_count = await TaskQueries.count_available_tasks_for_executor(session, user.id, status=TaskStatus.PENDING)
+        # Первая страница новых задач (PENDING) и их число одним запросом
+        page = 1
+        per_page = 5
+        tasks, pending_count = await TaskQueries.get_available_tasks_page(
+            session, user.id, status=TaskStatus.PENDING, page=page, per_page=per_page
+        )
         
         if pending_count == 0:
             await message.answer(
@@ -107,13 +113,6 @@ async def executor_new_tasks(message: Message, state: FSMContext):
             )
             return
         
-        # Загружаем только первую страницу новых задач
-        page = 1
-        per_page = 5
-        tasks = await TaskQueries.get_available_tasks_for_executor(
-            session, user.id, status=TaskStatus.PENDING, page=page, per_page=per_page
-        )
-        
         text = f"""
 🆕 <b>НОВЫЕ ЗАДАЧИ</b>
 ━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -137,14 +136,11 @@ async def toggle_executor_availability(callback: CallbackQuery):
         # Берем пользователя без фильтрации по is_active, чтобы не сломать переключение
         user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id, active_only=False)
 
-        if not user or user.role != UserRole.EXECUTOR:
-            await callback.answer("❌ Доступно только для исполнителей", show_alert=True)
-            return
-
         # Переключаем флаг
         current = getattr(user, "is_available", True)
         user.is_available = not current
         await session.commit()
+        UserQueries.invalidate_cached_user(user.telegram_id)
 
         # Обновляем только клавиатуру под сообщением профиля
         from bot.keyboards.executor_kb import ExecutorKeyboards
@@ -158,21 +154,18 @@ async def toggle_executor_availability(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "executor_my_tasks")
-async def callback_executor_my_tasks(callback: CallbackQuery, state: FSMContext):
+async def callback_executor_my_tasks(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Возврат к списку задач исполнителя (оптимизировано)"""
     await state.clear()
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.EXECUTOR:
-            await callback.answer("❌ У вас нет доступа к этой функции")
-            return
+        user = current_user
         
-        # Быстрый подсчет без загрузки данных
-        total_count = await TaskQueries.count_available_tasks_for_executor(session, user.id)
-        in_progress_count = await TaskQueries.count_available_tasks_for_executor(session, user.id, status=TaskStatus.IN_PROGRESS)
-        pending_count = await TaskQueries.count_available_tasks_for_executor(session, user.id, status=TaskStatus.PENDING)
+        # Быстрый подсчет по статусам одним запросом, без загрузки данных
+        counts = await TaskQueries.count_available_tasks_by_status(session, user.id)
+        total_count = sum(counts.values())
+        in_progress_count = counts.get(TaskStatus.IN_PROGRESS, 0)
+        pending_count = counts.get(TaskStatus.PENDING, 0)
         
         if total_count == 0:
             await callback.message.edit_text("📋 У вас пока нет задач")
@@ -216,7 +209,7 @@ async def callback_executor_my_tasks(callback: CallbackQuery, state: FSMContext)
 
 
 @router.callback_query(F.data.startswith("executor_new_tasks_page_"))
-async def callback_executor_new_tasks_page(callback: CallbackQuery, state: FSMContext):
+async def callback_executor_new_tasks_page(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Перелистывание страниц новых задач исполнителя"""
     await state.clear()
     
@@ -227,14 +220,14 @@ async def callback_executor_new_tasks_page(callback: CallbackQuery, state: FSMCo
         return
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.EXECUTOR:
-            await callback.answer("❌ У вас нет доступа к этой функции")
-            return
+        user = current_user
         
-        # Быстрый подсчет новых задач (PENDING)
-        pending_count = await TaskQueries.count_available_tasks_for_executor(session, user.id, status=TaskStatus.PENDING)
+        # Запрошенная страница новых задач (PENDING) и их число одним запросом
+        per_page = 5
+        page = max(page, 1)
+        tasks, pending_count = await TaskQueries.get_available_tasks_page(
+            session, user.id, status=TaskStatus.PENDING, page=page, per_page=per_page
+        )
         
         if pending_count == 0:
             await callback.message.edit_text(
@@ -245,20 +238,12 @@ async def callback_executor_new_tasks_page(callback: CallbackQuery, state: FSMCo
             await callback.answer()
             return
         
-        # Загружаем только запрошенную страницу
-        per_page = 5
-        
-        # Проверяем валидность страницы
-        total_pages = (pending_count + per_page - 1) // per_page
-        if page < 1:
-            page = 1
-        elif page > total_pages:
-            page = total_pages
-        
-        # Загружаем задачи для текущей страницы
-        tasks = await TaskQueries.get_available_tasks_for_executor(
-            session, user.id, status=TaskStatus.PENDING, page=page, per_page=per_page
-        )
+        # Страница за пределами списка (задачи разобрали) — показываем последнюю
+        if not tasks:
+            page = (pending_count + per_page - 1) // per_page
+            tasks, pending_count = await TaskQueries.get_available_tasks_page(
+                session, user.id, status=TaskStatus.PENDING, page=page, per_page=per_page
+            )
         
         text = f"""
 🆕 <b>НОВЫЕ ЗАДАЧИ</b>
@@ -279,7 +264,7 @@ async def callback_executor_new_tasks_page(callback: CallbackQuery, state: FSMCo
 
 
 @router.callback_query(F.data.startswith("executor_tasks_page_"))
-async def callback_executor_tasks_page(callback: CallbackQuery, state: FSMContext):
+async def callback_executor_tasks_page(callback: CallbackQuery, state: FSMContext, current_user: Optional[User]):
     """Перелистывание страниц задач исполнителя (оптимизировано)"""
     await state.clear()
     
@@ -290,16 +275,13 @@ async def callback_executor_tasks_page(callback: CallbackQuery, state: FSMContex
         return
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
+        user = current_user
         
-        if not user or user.role != UserRole.EXECUTOR:
-            await callback.answer("❌ У вас нет доступа к этой функции")
-            return
-        
-        # Быстрый подсчет без загрузки данных
-        total_count = await TaskQueries.count_available_tasks_for_executor(session, user.id)
-        in_progress_count = await TaskQueries.count_available_tasks_for_executor(session, user.id, status=TaskStatus.IN_PROGRESS)
-        pending_count = await TaskQueries.count_available_tasks_for_executor(session, user.id, status=TaskStatus.PENDING)
+        # Быстрый подсчет по статусам одним запросом, без загрузки данных
+        counts = await TaskQueries.count_available_tasks_by_status(session, user.id)
+        total_count = sum(counts.values())
+        in_progress_count = counts.get(TaskStatus.IN_PROGRESS, 0)
+        pending_count = counts.get(TaskStatus.PENDING, 0)
         
         if total_count == 0:
             await callback.message.edit_text("📋 У вас пока нет задач")
@@ -352,7 +334,7 @@ async def callback_executor_tasks_page(callback: CallbackQuery, state: FSMContex
 
 
 @router.callback_query(F.data.startswith("executor_history_"))
-async def callback_task_history(callback: CallbackQuery):
+async def callback_task_history(callback: CallbackQuery, current_user: Optional[User]):
     """История сообщений по задаче"""
     task_id = int(callback.data.replace("executor_history_", ""))
     
@@ -393,7 +375,7 @@ async def callback_task_history(callback: CallbackQuery):
         
         text += "━━━━━━━━━━━━━━━━━━━━━━━━━━"
 
-        can_reject = await _can_executor_reject_task(session, task_id, callback.from_user.id)
+        can_reject = await _can_executor_reject_task(session, task_id, current_user)
 
         await callback.message.edit_text(
             text,
@@ -404,26 +386,25 @@ async def callback_task_history(callback: CallbackQuery):
     await callback.answer()
 
 
-async def _show_task_view(callback: CallbackQuery, task_id: int):
+async def _show_task_view(callback: CallbackQuery, task_id: int, current_user: Optional[User]):
     """Вспомогательная функция для отображения задачи"""
     async with AsyncSessionLocal() as session:
-        task = await TaskQueries.get_task_by_id(session, task_id)
+        # Задача, байер и последние сообщения — из кэша карточек или без загрузки всей истории
+        details = await TaskQueries.get_cached_task_details(session, task_id)
         
-        if not task:
+        if not details:
             await callback.answer("❌ Задача не найдена или была удалена", show_alert=True)
             return
         
+        task = details.task
         # Проверяем, что задача не отменена
         if task.status == TaskStatus.CANCELLED:
             await callback.answer("❌ Эта задача была отменена и удалена", show_alert=True)
             return
-        
-        # Получаем историю сообщений
-        messages = await MessageQueries.get_task_messages(session, task_id)
 
-        text = format_task_management_text(task, messages)
+        text = format_task_management_text(task, details.messages)
 
-        can_reject = await _can_executor_reject_task(session, task_id, callback.from_user.id)
+        can_reject = await _can_executor_reject_task(session, task_id, current_user)
 
         await callback.message.edit_text(
             text,
@@ -435,44 +416,41 @@ async def _show_task_view(callback: CallbackQuery, task_id: int):
 
 
 @router.callback_query(F.data.startswith("executor_view_task_"))
-async def callback_view_task(callback: CallbackQuery):
+async def callback_view_task(callback: CallbackQuery, current_user: Optional[User]):
     """Просмотр задачи"""
     task_id = int(callback.data.replace("executor_view_task_", ""))
-    await _show_task_view(callback, task_id)
+    await _show_task_view(callback, task_id, current_user)
 
 
 # ============ ПРИНЯТИЕ ЗАДАЧИ ============
 
 @router.callback_query(F.data.startswith("executor_take_"))
-async def callback_take_task(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def callback_take_task(callback: CallbackQuery, state: FSMContext, bot: Bot, current_user: Optional[User]):
     """Взять задачу в работу"""
     task_id = int(callback.data.replace("executor_take_", ""))
     
     async with AsyncSessionLocal() as session:
-        executor = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        task = await TaskQueries.get_task_by_id(session, task_id)
+        executor = current_user
+        # Статус проверяется и меняется одним запросом — повторное нажатие или
+        # другой исполнитель задачу уже не возьмут
+        result = await TaskTransitions.take(session, task_id, executor.id)
         
-        if not task:
+        if result.outcome == TransitionOutcome.NOT_FOUND:
             await callback.answer("❌ Задача не найдена или была отменена", show_alert=True)
             return
-        
-        # Проверяем, что задача не отменена
-        if task.status == TaskStatus.CANCELLED:
-            await callback.answer("❌ Эта задача была отменена", show_alert=True)
+        if result.outcome == TransitionOutcome.NOT_ALLOWED:
+            await callback.answer("❌ Задача назначена другому исполнителю", show_alert=True)
             return
-        
-        # Обновляем статус задачи
-        await TaskQueries.update_task_status(session, task_id, TaskStatus.IN_PROGRESS, executor.id, "Задача взята в работу")
-        
-        # Логируем действие
-        await LogQueries.create_action_log(
-            session=session,
-            user_id=executor.id,
-            action_type="task_taken",
-            entity_type="task",
-            entity_id=task_id,
-            details={"task_number": task.task_number}
-        )
+        if not result.applied:
+            if result.previous_status == TaskStatus.IN_PROGRESS:
+                await callback.answer("ℹ️ Задача уже в работе", show_alert=True)
+            elif result.previous_status == TaskStatus.CANCELLED:
+                await callback.answer("❌ Эта задача была отменена", show_alert=True)
+            else:
+                await callback.answer("❌ Задачу уже нельзя взять: статус изменился", show_alert=True)
+            return
+        task = result.task
+        # Событие task_taken записано в журнал тем же переходом
         
         # Логируем в канал
         await LogChannel.log_task_status_change(bot, task, TaskStatus.PENDING, TaskStatus.IN_PROGRESS, executor)
@@ -521,12 +499,12 @@ async def callback_take_task(callback: CallbackQuery, state: FSMContext, bot: Bo
 
 
 @router.callback_query(F.data.startswith("executor_open_"))
-async def callback_open_task(callback: CallbackQuery):
+async def callback_open_task(callback: CallbackQuery, current_user: Optional[User]):
     """Открыть задачу"""
     task_id = int(callback.data.replace("executor_open_", ""))
     
     # Перенаправляем на просмотр задачи
-    await _show_task_view(callback, task_id)
+    await _show_task_view(callback, task_id, current_user)
 
 
 # ============ ОТКАЗ ОТ ЗАДАЧИ ============
@@ -579,7 +557,7 @@ async def callback_reject_task(callback: CallbackQuery, state: FSMContext):
     ]), 
     ExecutorStates.waiting_reject_reason
 )
-async def process_reject_reason(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def process_reject_reason(callback: CallbackQuery, state: FSMContext, bot: Bot, current_user: Optional[User]):
     """Обработка причины отказа"""
     reason_map = {
         "reject_lack_info": ("Не хватает информации в ТЗ", RejectionReason.LACK_INFO),
@@ -597,7 +575,7 @@ async def process_reject_reason(callback: CallbackQuery, state: FSMContext, bot:
             "Пожалуйста, опишите причину отказа:",
             parse_mode="HTML"
         )
-        await state.update_data(reason_enum=reason_enum)
+        await state.update_data(reject_reason=reason_enum.value)
         await state.set_state(ExecutorStates.waiting_reject_custom)
         await callback.answer()
         return
@@ -606,82 +584,43 @@ async def process_reject_reason(callback: CallbackQuery, state: FSMContext, bot:
     data = await state.get_data()
     task_id = data['reject_task_id']
     
-    await process_task_rejection(callback.message, task_id, reason_enum, reason_text, callback.from_user.id, state, bot)
+    await process_task_rejection(callback.message, task_id, reason_enum, reason_text, current_user, state, bot)
     await callback.answer("Отказ оформлен")
 
 
 @router.message(ExecutorStates.waiting_reject_custom)
-async def process_custom_reject_reason(message: Message, state: FSMContext, bot: Bot):
+async def process_custom_reject_reason(message: Message, state: FSMContext, bot: Bot, current_user: Optional[User]):
     """Обработка своей причины отказа"""
     custom_reason = message.text.strip()
     data = await state.get_data()
     task_id = data['reject_task_id']
-    reason_enum = data['reason_enum']
+    reason_enum = RejectionReason(data.get('reject_reason', RejectionReason.OTHER.value))
     
-    await process_task_rejection(message, task_id, reason_enum, custom_reason, message.from_user.id, state, bot)
+    await process_task_rejection(message, task_id, reason_enum, custom_reason, current_user, state, bot)
 
 
-async def process_task_rejection(message, task_id: int, reason_enum, reason_text: str, user_telegram_id: int, state: FSMContext, bot: Bot):
+async def process_task_rejection(message, task_id: int, reason_enum, reason_text: str, executor: User, state: FSMContext, bot: Bot):
     """Обработать отказ от задачи"""
     async with AsyncSessionLocal() as session:
-        executor = await UserQueries.get_user_by_telegram_id(session, user_telegram_id)
-        task = await TaskQueries.get_task_by_id(session, task_id)
+        # Отказ, снятие исполнителя, загрузка и событие журнала — одной транзакцией
+        result = await TaskTransitions.reject(session, task_id, executor.id, reason_enum, reason_text)
         
-        if not task:
+        if result.outcome == TransitionOutcome.NOT_FOUND:
             await message.answer("❌ Задача не найдена или была удалена")
             await state.clear()
             return
-        
-        # Проверяем, что задача не отменена
-        if task.status == TaskStatus.CANCELLED:
-            await message.answer("❌ Эта задача была отменена и удалена")
+        if not result.applied:
+            if result.outcome == TransitionOutcome.NOT_ALLOWED:
+                await message.answer("❌ Задача уже не назначена на вас")
+            elif result.previous_status == TaskStatus.CANCELLED:
+                await message.answer("❌ Эта задача была отменена и удалена")
+            else:
+                await message.answer("❌ Нельзя отказаться от задачи, которая уже выполнена")
             await state.clear()
             return
-        
-        # Сохраняем причину отказа
-        from db.models import TaskRejection, TaskLog
-        rejection = TaskRejection(
-            task_id=task_id,
-            executor_id=executor.id,
-            reason=reason_enum,
-            custom_reason=reason_text if reason_enum == RejectionReason.OTHER else None
-        )
-        session.add(rejection)
-        
-        # Сохраняем старый статус для логирования
-        old_status = task.status
-        
-        # Если задача была в работе, уменьшаем загрузку и обнуляем время начала
-        if task.status == TaskStatus.IN_PROGRESS:
-            await UserQueries.update_user_load(session, executor.id, -1)
-            task.started_at = None  # Обнуляем время начала для следующего исполнителя
-        
-        # Обновляем статус задачи
-        task.executor_id = None
-        task.status = TaskStatus.PENDING
-        
-        # Создаем запись в TaskLog для логирования изменения статуса
-        task_log = TaskLog(
-            task_id=task_id,
-            user_id=executor.id,
-            action="status_change",
-            old_status=old_status,
-            new_status=TaskStatus.PENDING,
-            details={"comment": f"Отказ от задачи. Причина: {reason_text}"}
-        )
-        session.add(task_log)
-        
-        await session.commit()
-        
-        # Логируем действие
-        await LogQueries.create_action_log(
-            session=session,
-            user_id=executor.id,
-            action_type="task_rejected",
-            entity_type="task",
-            entity_id=task_id,
-            details={"reason": reason_text}
-        )
+        task = result.task
+        old_status = result.previous_status
+        # Событие task_rejected с причиной записано в журнал тем же переходом
         
         # Логируем изменение статуса в канал
         await LogChannel.log_task_status_change(bot, task, old_status, TaskStatus.PENDING, executor)
@@ -907,37 +846,31 @@ async def files_upload_done(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("confirm_send_completion:"), ExecutorStates.waiting_completion_confirm)
-async def confirm_send_completion(callback: CallbackQuery, state: FSMContext, bot: Bot):
+@router.callback_query(ConfirmCallback.filter(F.action == "send_completion"), ExecutorStates.waiting_completion_confirm)
+async def confirm_send_completion(callback: CallbackQuery, callback_data: ConfirmCallback, state: FSMContext, bot: Bot, current_user: Optional[User]):
     """Подтверждение отправки результата"""
-    task_id = int(callback.data.split(":")[1])
+    task_id = int(callback_data.value)
     data = await state.get_data()
     
     async with AsyncSessionLocal() as session:
-        executor = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        task = await TaskQueries.get_task_by_id(session, task_id)
+        executor = current_user
+        # Повторное подтверждение не сдаст задачу второй раз
+        result = await TaskTransitions.complete(session, task_id, executor.id, data.get('completion_comment'))
         
-        if not task:
+        if result.outcome == TransitionOutcome.NOT_FOUND:
             await callback.answer("❌ Задача не найдена или была удалена", show_alert=True)
             await state.clear()
             return
-        
-        # Проверяем, что задача не отменена
-        if task.status == TaskStatus.CANCELLED:
-            await callback.answer("❌ Эта задача была отменена и удалена", show_alert=True)
+        if not result.applied:
+            if result.previous_status == TaskStatus.CANCELLED:
+                await callback.answer("❌ Эта задача была отменена и удалена", show_alert=True)
+            elif result.previous_status in (TaskStatus.COMPLETED, TaskStatus.APPROVED):
+                await callback.answer("ℹ️ Результат по задаче уже отправлен", show_alert=True)
+            else:
+                await callback.answer("❌ Задача не в работе у вас — отправить результат нельзя", show_alert=True)
             await state.clear()
             return
-        
-        # Обновляем задачу
-        task.completion_comment = data.get('completion_comment')
-        old_status = task.status
-        await TaskQueries.update_task_status(
-            session,
-            task_id,
-            TaskStatus.COMPLETED,
-            executor.id,
-            "Задача выполнена",
-        )
+        task = result.task
 
         # Если после завершения задачи у исполнителя не осталось задач в работе,
         # уведомляем всех баеров, которым он назначен
@@ -1220,14 +1153,14 @@ async def callback_send_message(callback: CallbackQuery, state: FSMContext):
 
 
 @router.message(ExecutorStates.waiting_message_to_buyer)
-async def process_message_to_buyer(message: Message, state: FSMContext, bot: Bot):
+async def process_message_to_buyer(message: Message, state: FSMContext, bot: Bot, current_user: Optional[User]):
     """Обработка сообщения байеру"""
     content = message.text.strip()
     data = await state.get_data()
     task_id = data['message_task_id']
     
     async with AsyncSessionLocal() as session:
-        executor = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
+        executor = current_user
         task = await TaskQueries.get_task_by_id(session, task_id)
         
         if not task:
@@ -1285,7 +1218,7 @@ async def process_message_to_buyer(message: Message, state: FSMContext, bot: Bot
         )
         
         # Возвращаем исполнителя к экрану управления задачей
-        messages = await MessageQueries.get_task_messages(session, task_id)
+        messages = await MessageQueries.get_last_messages(session, task_id)
         task_view_text = format_task_management_text(task, messages)
         await message.answer(
             task_view_text,
@@ -1393,7 +1326,7 @@ async def callback_add_file_to_task(callback: CallbackQuery, state: FSMContext,
 
 Нажмите на файл чтобы просмотреть его.
 """,
-                reply_markup=CommonKeyboards.file_list_view_only(files_list, f"task_{task_id}"),
+                reply_markup=CommonKeyboards.file_list_view_only(files_list, task_id=task_id),
                 parse_mode="HTML"
             )
             
@@ -1439,13 +1372,11 @@ async def callback_add_file_to_task(callback: CallbackQuery, state: FSMContext,
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("view_file_task_"))
-async def view_task_file(callback: CallbackQuery, bot: Bot):
+@router.callback_query(FileViewCallback.filter(F.task_id.is_not(None)))
+async def view_task_file(callback: CallbackQuery, callback_data: FileViewCallback, bot: Bot):
     """Просмотр файла задачи"""
-    # Формат: view_file_task_{task_id}:{file_idx}
-    parts = callback.data.replace("view_file_task_", "").split(":")
-    task_id = int(parts[0])
-    file_idx = int(parts[1])
+    task_id = callback_data.task_id
+    file_idx = callback_data.idx
     
     async with AsyncSessionLocal() as session:
         # Получаем все файлы задачи
@@ -1528,16 +1459,12 @@ async def view_task_file(callback: CallbackQuery, bot: Bot):
 
 
 @router.callback_query(F.data.startswith("executor_view_files_"))
-async def callback_executor_view_files(callback: CallbackQuery):
+async def callback_executor_view_files(callback: CallbackQuery, current_user: Optional[User]):
     """Просмотр файлов задачи исполнителем"""
     task_id = int(callback.data.replace("executor_view_files_", ""))
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.EXECUTOR:
-            await callback.answer("❌ У вас нет доступа")
-            return
+        user = current_user
         
         task = await TaskQueries.get_task_by_id(session, task_id)
         
@@ -1603,16 +1530,12 @@ async def callback_executor_view_files(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("executor_download_file_"))
-async def callback_executor_download_file(callback: CallbackQuery, bot: Bot):
+async def callback_executor_download_file(callback: CallbackQuery, bot: Bot, current_user: Optional[User]):
     """Скачивание файла исполнителем"""
     file_id = int(callback.data.replace("executor_download_file_", ""))
     
     async with AsyncSessionLocal() as session:
-        user = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
-        
-        if not user or user.role != UserRole.EXECUTOR:
-            await callback.answer("❌ У вас нет доступа")
-            return
+        user = current_user
         
         file_record = await FileQueries.get_file_by_id(session, file_id)
         
@@ -1781,7 +1704,7 @@ async def process_file_to_task(message: Message, state: FSMContext, bot: Bot):
 
 
 @router.callback_query(F.data == "files_done", ExecutorStates.waiting_file_to_task)
-async def files_to_task_done(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def files_to_task_done(callback: CallbackQuery, state: FSMContext, bot: Bot, current_user: Optional[User]):
     """Завершение загрузки файлов к задаче"""
     data = await state.get_data()
     task_id = data.get('file_task_id')
@@ -1792,7 +1715,7 @@ async def files_to_task_done(callback: CallbackQuery, state: FSMContext, bot: Bo
         return
     
     async with AsyncSessionLocal() as session:
-        executor = await UserQueries.get_user_by_telegram_id(session, callback.from_user.id)
+        executor = current_user
         task = await TaskQueries.get_task_by_id(session, task_id)
         
         if not task:
@@ -2006,10 +1929,10 @@ async def files_to_task_done(callback: CallbackQuery, state: FSMContext, bot: Bo
         )
         
         # Возвращаем исполнителя к экрану управления задачей
-        messages = await MessageQueries.get_task_messages(session, task_id)
+        messages = await MessageQueries.get_last_messages(session, task_id)
         task_view_text = format_task_management_text(task, messages)
         
-        can_reject = await _can_executor_reject_task(session, task_id, callback.from_user.id)
+        can_reject = await _can_executor_reject_task(session, task_id, current_user)
         
         await callback.message.answer(
             task_view_text,
@@ -2029,14 +1952,11 @@ async def executor_statistics(message: Message):
     async with AsyncSessionLocal() as session:
         user = await UserQueries.get_user_by_telegram_id(session, message.from_user.id)
         
-        if not user or user.role != UserRole.EXECUTOR:
-            return
-        
-        tasks = await TaskQueries.get_available_tasks_for_executor(session, user.id)
+        counts = await TaskQueries.count_available_tasks_by_status(session, user.id)
         
-        total = len(tasks)
-        in_progress = len([t for t in tasks if t.status == TaskStatus.IN_PROGRESS])
-        completed = len([t for t in tasks if t.status == TaskStatus.APPROVED])
+        total = sum(counts.values())
+        in_progress = counts.get(TaskStatus.IN_PROGRESS, 0)
+        completed = counts.get(TaskStatus.APPROVED, 0)
         
         text = f"""
 📊 <b>МОЯ СТАТИСТИКА</b>
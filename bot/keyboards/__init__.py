@@ -4,6 +4,8 @@ from .admin_kb import AdminKeyboards
 from .buyer_kb import BuyerKeyboards
 from .executor_kb import ExecutorKeyboards
 from .common_kb import CommonKeyboards
+from .callbacks import FileViewCallback, ConfirmCallback
 
-__all__ = ["AdminKeyboards", "BuyerKeyboards", "ExecutorKeyboards", "CommonKeyboards"]
+__all__ = ["AdminKeyboards", "BuyerKeyboards", "ExecutorKeyboards", "CommonKeyboards",
+           "FileViewCallback", "ConfirmCallback"]
 
@@ -130,6 +130,8 @@ class AdminKeyboards:
         builder.button(text="📋 Статистика по задачам", callback_data="stats_tasks")
         builder.button(text="📈 По направлениям", callback_data="stats_directions")
         builder.button(text="📅 За период", callback_data="stats_period")
+        builder.button(text="🗄 Запросы к БД", callback_data="stats_db")
+        builder.button(text="⏱ Производительность", callback_data="stats_perf")
         builder.button(text="◀️ Назад", callback_data="admin_main")
         builder.adjust(1)
         return builder.as_markup()
@@ -22,7 +22,7 @@ class BuyerKeyboards:
         return builder.as_markup(resize_keyboard=True)
     
     @staticmethod
-    def direction_with_executors(executors_by_direction: Dict[DirectionType, List[User]]) -> InlineKeyboardMarkup:
+    def direction_with_executors(executors_by_direction: Dict[DirectionType, List]) -> InlineKeyboardMarkup:
         """Выбор направления с отображением исполнителей"""
         builder = InlineKeyboardBuilder()
         
@@ -55,7 +55,7 @@ class BuyerKeyboards:
         return builder.as_markup()
     
     @staticmethod
-    def direction_with_executors_with_back(executors_by_direction: Dict[DirectionType, List[User]], task_id: int) -> InlineKeyboardMarkup:
+    def direction_with_executors_with_back(executors_by_direction: Dict[DirectionType, List], task_id: int) -> InlineKeyboardMarkup:
         """Выбор направления с отображением исполнителей (при редактировании задачи)"""
         builder = InlineKeyboardBuilder()
         
@@ -0,0 +1,16 @@
+"""Типизированные callback_data (aiogram CallbackData)"""
+from typing import Optional
+
+from aiogram.filters.callback_data import CallbackData
+
+
+class FileViewCallback(CallbackData, prefix="vf"):
+    """Просмотр файла из списка; task_id=None — файлы ещё не созданной задачи"""
+    idx: int
+    task_id: Optional[int] = None
+
+
+class ConfirmCallback(CallbackData, prefix="cf"):
+    """Подтверждение действия action с параметром value"""
+    action: str
+    value: str = ""
@@ -1,7 +1,9 @@
 """Общие клавиатуры для всех ролей"""
 from aiogram.types import InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from typing import List
+from typing import List, Optional
+
+from bot.keyboards.callbacks import FileViewCallback, ConfirmCallback
 
 
 class CommonKeyboards:
@@ -27,7 +29,7 @@ class CommonKeyboards:
     def confirm_action(action: str, data: str = "") -> InlineKeyboardMarkup:
         """Подтверждение действия"""
         builder = InlineKeyboardBuilder()
-        builder.button(text="✅ Подтвердить", callback_data=f"confirm_{action}:{data}")
+        builder.button(text="✅ Подтвердить", callback_data=ConfirmCallback(action=action, value=data))
         builder.button(text="❌ Отменить", callback_data="cancel")
         builder.adjust(1)
         return builder.as_markup()
@@ -85,7 +87,7 @@ class CommonKeyboards:
         return builder.as_markup()
     
     @staticmethod
-    def file_list_with_actions(files: List[dict], context: str = "initial") -> InlineKeyboardMarkup:
+    def file_list_with_actions(files: List[dict], task_id: Optional[int] = None) -> InlineKeyboardMarkup:
         """Список файлов с кнопками для просмотра"""
         builder = InlineKeyboardBuilder()
         
@@ -99,10 +101,11 @@ class CommonKeyboards:
             
             builder.button(
                 text=f"{file_icon} {file_name}",
-                callback_data=f"view_file_{context}:{idx}"
+                callback_data=FileViewCallback(idx=idx, task_id=task_id)
             )
         
         # Кнопка добавления файлов
+        context = "initial" if task_id is None else f"task_{task_id}"
         builder.button(text="➕ Добавить еще файлы", callback_data=f"add_more_files_{context}")
         builder.button(text="✅ Завершить", callback_data="files_done")
         builder.button(text="❌ Отменить", callback_data="cancel")
@@ -111,7 +114,7 @@ class CommonKeyboards:
         return builder.as_markup()
     
     @staticmethod
-    def file_list_view_only(files: List[dict], context: str = "initial") -> InlineKeyboardMarkup:
+    def file_list_view_only(files: List[dict], task_id: Optional[int] = None) -> InlineKeyboardMarkup:
         """Список файлов только для просмотра (без дополнительных кнопок)"""
         builder = InlineKeyboardBuilder()
         
@@ -125,7 +128,7 @@ class CommonKeyboards:
             
             builder.button(
                 text=f"{file_icon} {file_name}",
-                callback_data=f"view_file_{context}:{idx}"
+                callback_data=FileViewCallback(idx=idx, task_id=task_id)
             )
         
         builder.adjust(1) 
@@ -0,0 +1,17 @@
+"""Middleware для Task Manager Bot"""
+
+from .update_scheduler import UpdateSchedulerMiddleware
+from .current_user import CurrentUserMiddleware
+from .query_stats import QueryStatsMiddleware
+from .perf import PerfMiddleware
+from .handler_tag import HandlerTagMiddleware
+from .log_context import LogContextMiddleware
+
+__all__ = [
+    "UpdateSchedulerMiddleware",
+    "CurrentUserMiddleware",
+    "QueryStatsMiddleware",
+    "PerfMiddleware",
+    "HandlerTagMiddleware",
+    "LogContextMiddleware",
+]
@@ -0,0 +1,37 @@
+"""Middleware, которое один раз на обновление определяет пользователя бота"""
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from db.engine import AsyncSessionLocal
+from db.cache import user_cache
+from db.queries import UserQueries
+
+
+class CurrentUserMiddleware(BaseMiddleware):
+    """
+    Outer-middleware уровня Update.
+
+    Передаёт в обработчики current_user — активного пользователя (User) по
+    telegram_id отправителя или None. Пользователь берётся из TTL-кэша,
+    поэтому при попадании в кэш запрос к БД не выполняется.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        current_user = None
+
+        if from_user:
+            current_user = user_cache.get(from_user.id)
+            if current_user is None:
+                async with AsyncSessionLocal() as session:
+                    current_user = await UserQueries.get_cached_user(session, from_user.id)
+
+        data["current_user"] = current_user
+        return await handler(event, data)
@@ -0,0 +1,42 @@
+"""Имя выбранного обработчика для статистики обновления"""
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from db.instrumentation import current_query_stats
+from bot.utils.metrics import current_update_perf
+
+
+def handler_name(data: Dict[str, Any]) -> str:
+    """Имя обработчика вида «admin.callback_stats_users»"""
+    handler = data.get("handler")
+    callback = getattr(handler, "callback", None)
+    if callback is None:
+        return "—"
+    module = getattr(callback, "__module__", "") or ""
+    return f"{module.rsplit('.', 1)[-1]}.{getattr(callback, '__name__', repr(callback))}"
+
+
+class HandlerTagMiddleware(BaseMiddleware):
+    """
+    Inner-middleware (message / callback_query): записывает имя обработчика,
+    выбранного роутером, в статистику запросов и метрики задержек обновления.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        name = handler_name(data)
+
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.handler = name
+        perf = current_update_perf.get()
+        if perf is not None:
+            perf.handler = name
+
+        return await handler(event, data)
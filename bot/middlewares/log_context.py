@@ -0,0 +1,31 @@
+"""update_id и user_id обновления в записях лога"""
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from log import current_log_context
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """
+    Outer-middleware уровня Update, самый внешний.
+
+    Кладёт update_id и Telegram id пользователя в current_log_context —
+    их получают все записи лога, сделанные при обработке обновления,
+    включая записи из задач, созданных в обработчике.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        update_id = event.update_id if isinstance(event, Update) else None
+        token = current_log_context.set((update_id, user.id if user else None))
+        try:
+            return await handler(event, data)
+        finally:
+            current_log_context.reset(token)
@@ -0,0 +1,51 @@
+"""Время обработки обновлений по обработчикам"""
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from db.instrumentation import current_query_stats
+from bot.utils.metrics import PerfRegistry, UpdatePerf, current_update_perf, perf_registry
+
+
+class PerfMiddleware(BaseMiddleware):
+    """
+    Outer-middleware уровня Update.
+
+    Для каждого обновления записывает в гистограммы обработчика полное время,
+    время в БД (из QueryStats, если учёт запросов включён) и время запросов
+    к Telegram API (ApiTimingMiddleware сессии бота); исключения считаются ошибками.
+    Обновления, не дошедшие ни до одного обработчика, не учитываются.
+    """
+
+    def __init__(self, registry: PerfRegistry = perf_registry) -> None:
+        self.registry = registry
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        perf = UpdatePerf()
+        token = current_update_perf.set(perf)
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await handler(event, data)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            wall = time.perf_counter() - started
+            current_update_perf.reset(token)
+            if perf.handler:
+                stats = current_query_stats.get()
+                self.registry.record(
+                    perf.handler,
+                    wall=wall,
+                    db=stats.db_time if stats else 0.0,
+                    api=perf.api_time,
+                    failed=failed,
+                )
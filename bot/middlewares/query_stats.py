@@ -0,0 +1,55 @@
+"""Учёт SQL-запросов, выполненных при обработке обновления"""
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from db.instrumentation import QueryStats, current_query_stats, query_report
+from log import logger
+
+
+class QueryStatsMiddleware(BaseMiddleware):
+    """
+    Outer-middleware уровня Update.
+
+    Открывает для обновления QueryStats (в него пишут события движка),
+    после обработки пишет структурированную строку в лог и добавляет
+    результат в сводку query_report. Повторы одного и того же запроса
+    не меньше n_plus_one_threshold раз отмечаются как вероятный N+1.
+    """
+
+    def __init__(self, n_plus_one_threshold: int = 5, log_all: bool = False) -> None:
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.log_all = log_all
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        try:
+            return await handler(event, data)
+        finally:
+            current_query_stats.reset(token)
+            self._report(stats)
+
+    def _report(self, stats: QueryStats) -> None:
+        if not stats.statements:
+            return
+
+        suspects = stats.n_plus_one(self.n_plus_one_threshold)
+        query_report.record(stats, suspects)
+
+        line = (
+            f"db_stats handler={stats.handler or '—'} statements={stats.statements} "
+            f"db_ms={stats.db_time * 1000:.1f} rows={stats.rows}"
+        )
+        if suspects:
+            shape, count = suspects[0]
+            logger.warning(f"{line} n_plus_one={count} shape=\"{shape[:200]}\"")
+        elif self.log_all:
+            logger.info(line)
+
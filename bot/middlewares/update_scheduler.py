@@ -0,0 +1,128 @@
+"""Планировщик обработки обновлений: порядок по пользователю и общий лимит параллельности"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from log import logger
+
+
+class UpdateSchedulerMiddleware(BaseMiddleware):
+    """
+    Outer-middleware уровня Update.
+
+    - обновления одного пользователя (или чата, если пользователя нет)
+      обрабатываются строго по очереди — двойное нажатие не гоняется само с собой;
+    - одновременно выполняется не больше max_concurrency обработчиков,
+      чтобы не исчерпать пул соединений к БД;
+    - если очередь ожидающих больше max_backlog, новые обновления отбрасываются
+      (на callback отвечаем «бот перегружен», чтобы у пользователя не висели часики).
+    """
+
+    def __init__(self, max_concurrency: int = 20, max_backlog: int = 500) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_backlog = max_backlog
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._lock_users: Dict[int, int] = {}
+        self._shedding = False
+
+        # Метрики
+        self.in_flight = 0
+        self.backlog = 0
+        self.max_backlog_seen = 0
+        self.processed = 0
+        self.shed = 0
+
+    @staticmethod
+    def _get_key(data: Dict[str, Any]) -> Optional[int]:
+        """Ключ очереди: пользователь, иначе чат"""
+        user = data.get("event_from_user")
+        if user:
+            return user.id
+        chat = data.get("event_chat")
+        return chat.id if chat else None
+
+    @asynccontextmanager
+    async def _key_lock(self, key: Optional[int]):
+        """Блокировка на ключ; запись удаляется, когда очередь ключа пуста"""
+        if key is None:
+            yield
+            return
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._lock_users[key] -= 1
+            if not self._lock_users[key]:
+                del self._lock_users[key]
+                del self._locks[key]
+
+    async def _shed_update(self, event: Update) -> None:
+        """Отбросить обновление при перегрузке"""
+        self.shed += 1
+        if not self._shedding:
+            self._shedding = True
+            logger.warning(
+                f"⚠️ Перегрузка: в очереди {self.backlog} обновлений "
+                f"(лимит {self.max_backlog}), новые обновления отбрасываются"
+            )
+
+        if event.callback_query:
+            try:
+                await event.callback_query.answer("⏳ Бот перегружен, попробуйте через несколько секунд")
+            except Exception as e:
+                logger.error(f"Ошибка ответа на callback при перегрузке: {e}")
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if self.backlog >= self.max_backlog:
+            await self._shed_update(event)
+            return None
+
+        if self._shedding and self.backlog < self.max_backlog // 2:
+            self._shedding = False
+            logger.info(f"✅ Очередь обновлений разгружена: {self.backlog}")
+
+        self.backlog += 1
+        self.max_backlog_seen = max(self.max_backlog_seen, self.backlog)
+        started = False
+        try:
+            async with self._key_lock(self._get_key(data)):
+                async with self._semaphore:
+                    self.backlog -= 1
+                    started = True
+                    self.in_flight += 1
+                    try:
+                        return await handler(event, data)
+                    finally:
+                        self.in_flight -= 1
+                        self.processed += 1
+        finally:
+            if not started:
+                self.backlog -= 1
+
+    def stats(self) -> Dict[str, int]:
+        """Текущие метрики очереди"""
+        return {
+            "in_flight": self.in_flight,
+            "backlog": self.backlog,
+            "max_backlog_seen": self.max_backlog_seen,
+            "active_keys": len(self._locks),
+            "processed": self.processed,
+            "shed": self.shed,
+            "max_concurrency": self.max_concurrency,
+            "max_backlog": self.max_backlog,
+        }
@@ -0,0 +1,170 @@
+"""Маршрутизация callback'ов по префиксному дереву"""
+import operator
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from aiogram import Router
+from aiogram.dispatcher.event.bases import UNHANDLED, SkipHandler
+from aiogram.dispatcher.event.handler import FilterObject, HandlerObject
+from aiogram.dispatcher.event.telegram import TelegramEventObserver
+from aiogram.filters.callback_data import CallbackQueryFilter
+from aiogram.types import TelegramObject
+from magic_filter.operations import CallOperation, ComparatorOperation, GetAttributeOperation
+
+# Ключ индекса: ("eq", строка) — точное совпадение, ("prefix", строка) — префикс
+IndexKey = Tuple[str, str]
+
+
+def extract_index_key(filter_obj: FilterObject) -> Optional[IndexKey]:
+    """
+    Достать из фильтра условие на callback_data, пригодное для индекса.
+
+    Понимает F.data == "...", F.data.startswith("...") и CallbackData.filter();
+    для остальных фильтров возвращает None.
+    """
+    if isinstance(filter_obj.callback, CallbackQueryFilter):
+        factory = filter_obj.callback.callback_data
+        return "prefix", f"{factory.__prefix__}{factory.__separator__}"
+
+    magic = filter_obj.magic
+    if magic is None:
+        return None
+
+    ops = magic._operations
+    if not ops or not isinstance(ops[0], GetAttributeOperation) or ops[0].name != "data":
+        return None
+
+    if (
+        len(ops) == 2
+        and isinstance(ops[1], ComparatorOperation)
+        and ops[1].comparator is operator.eq
+        and isinstance(ops[1].right, str)
+    ):
+        return "eq", ops[1].right
+
+    if (
+        len(ops) == 3
+        and isinstance(ops[1], GetAttributeOperation)
+        and ops[1].name == "startswith"
+        and isinstance(ops[2], CallOperation)
+        and len(ops[2].args) == 1
+        and not ops[2].kwargs
+        and isinstance(ops[2].args[0], str)
+    ):
+        return "prefix", ops[2].args[0]
+
+    return None
+
+
+class _TrieNode:
+    __slots__ = ("children", "handlers")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.handlers: List[int] = []
+
+
+class CallbackTrie:
+    """
+    Индекс обработчиков по callback_data.
+
+    Хранит номера обработчиков (порядок регистрации): точные значения — в словаре,
+    префиксы — в дереве. candidates() проходит дерево по символам строки, поэтому
+    стоимость поиска зависит от длины callback_data, а не от числа обработчиков.
+    """
+
+    def __init__(self) -> None:
+        self._root = _TrieNode()
+        self._exact: Dict[str, List[int]] = {}
+        self._unindexed: List[int] = []
+
+    def add(self, index: int, key: Optional[IndexKey]) -> None:
+        """Добавить обработчик с номером index"""
+        if key is None:
+            self._unindexed.append(index)
+            return
+
+        kind, value = key
+        if kind == "eq":
+            self._exact.setdefault(value, []).append(index)
+            return
+
+        node = self._root
+        for char in value:
+            node = node.children.setdefault(char, _TrieNode())
+        node.handlers.append(index)
+
+    def candidates(self, data: Optional[str]) -> List[int]:
+        """Номера обработчиков, которые могут подойти к data, в порядке регистрации"""
+        found: List[int] = list(self._unindexed)
+        if data is not None:
+            found.extend(self._exact.get(data, ()))
+            node = self._root
+            found.extend(node.handlers)
+            for char in data:
+                node = node.children.get(char)
+                if node is None:
+                    break
+                found.extend(node.handlers)
+        found.sort()
+        return found
+
+
+class CallbackTrieObserver(TelegramEventObserver):
+    """
+    Observer callback_query, который проверяет только обработчики,
+    подходящие по префиксу/значению callback_data.
+
+    Семантика та же, что у TelegramEventObserver: кандидаты проверяются
+    в порядке регистрации, срабатывает первый, чьи фильтры прошли.
+    """
+
+    def __init__(self, router: Router, event_name: str = "callback_query") -> None:
+        super().__init__(router=router, event_name=event_name)
+        self.trie = CallbackTrie()
+
+    def register(self, callback, *filters, flags=None, **kwargs):
+        result = super().register(callback, *filters, flags=flags, **kwargs)
+        handler = self.handlers[-1]
+        self.trie.add(len(self.handlers) - 1, self._index_key(handler))
+        return result
+
+    @staticmethod
+    def _index_key(handler: HandlerObject) -> Optional[IndexKey]:
+        # Все фильтры обработчика объединены по «И», поэтому для индекса
+        # достаточно любого одного условия на callback_data
+        for filter_obj in handler.filters or ():
+            key = extract_index_key(filter_obj)
+            if key is not None:
+                return key
+        return None
+
+    def iter_candidates(self, event: TelegramObject) -> Iterable[HandlerObject]:
+        """Обработчики-кандидаты для события"""
+        for index in self.trie.candidates(getattr(event, "data", None)):
+            yield self.handlers[index]
+
+    async def trigger(self, event: TelegramObject, **kwargs: Any) -> Any:
+        for handler in self.iter_candidates(event):
+            kwargs["handler"] = handler
+            result, data = await handler.check(event, **kwargs)
+            if result:
+                kwargs.update(data)
+                try:
+                    wrapped_inner = self.outer_middleware.wrap_middlewares(
+                        self._resolve_middlewares(),
+                        handler.call,
+                    )
+                    return await wrapped_inner(event, kwargs)
+                except SkipHandler:
+                    continue
+
+        return UNHANDLED
+
+
+class TrieRouter(Router):
+    """Router, у которого callback_query маршрутизируется через CallbackTrieObserver"""
+
+    def __init__(self, *, name: Optional[str] = None) -> None:
+        super().__init__(name=name)
+        self.callback_query = CallbackTrieObserver(router=self, event_name="callback_query")
+        self.observers["callback_query"] = self.callback_query
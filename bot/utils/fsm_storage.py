@@ -0,0 +1,146 @@
+"""Хранилище FSM в PostgreSQL с TTL-вытеснением устаревших состояний"""
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from sqlalchemy import select, delete, and_, case
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import func
+
+from db.engine import AsyncSessionLocal
+from db.models import FsmState
+from log import logger
+
+
+def dumps_compact(data: Mapping[str, Any]) -> str:
+    """Сериализовать данные FSM в компактный JSON (без пробелов, UTF-8 как есть)"""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+class PostgresStorage(BaseStorage):
+    """
+    FSM-хранилище поверх таблицы fsm_states.
+
+    - состояние переживает перезапуск и разделяется между несколькими экземплярами бота;
+    - записи старше state_ttl считаются пустыми и периодически удаляются;
+    - пустые записи (нет состояния и данных) сразу удаляются, чтобы таблица не росла.
+    """
+
+    def __init__(
+        self,
+        state_ttl: int = 86400,
+        cleanup_interval: int = 3600,
+        key_builder: Optional[KeyBuilder] = None,
+    ) -> None:
+        self.state_ttl = state_ttl
+        self.cleanup_interval = cleanup_interval
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        self._cleanup_task: Optional[asyncio.Task] = None
+
+    def _expired_before(self) -> datetime:
+        return datetime.now(timezone.utc) - timedelta(seconds=self.state_ttl)
+
+    async def _get_row(self, key: StorageKey) -> Optional[FsmState]:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(FsmState).where(
+                    and_(
+                        FsmState.key == self.key_builder.build(key),
+                        FsmState.updated_at >= self._expired_before(),
+                    )
+                )
+            )
+            return result.scalar_one_or_none()
+
+    async def _upsert(self, key: StorageKey, **values: Any) -> None:
+        """
+        Записать отдельное поле (state или data) и продлить TTL.
+
+        Второе поле устаревшей записи сбрасывается: иначе продление TTL вернуло бы
+        данные прошлого сценария (например, edit_task_id) в новый.
+        """
+        storage_key = self.key_builder.build(key)
+        expired = FsmState.updated_at < self._expired_before()
+        other_values = {
+            column: case((expired, None), else_=getattr(FsmState, column))
+            for column in ("state", "data")
+            if column not in values
+        }
+        async with AsyncSessionLocal() as session:
+            stmt = insert(FsmState).values(key=storage_key, updated_at=func.now(), **values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[FsmState.key],
+                set_={**values, **other_values, "updated_at": func.now()},
+            )
+            await session.execute(stmt)
+            # Удаляем полностью пустую запись — состояние сброшено
+            await session.execute(
+                delete(FsmState).where(
+                    and_(
+                        FsmState.key == storage_key,
+                        FsmState.state.is_(None),
+                        FsmState.data.is_(None),
+                    )
+                )
+            )
+            await session.commit()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        """Установить состояние"""
+        value = state.state if isinstance(state, State) else state
+        await self._upsert(key, state=value)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        """Получить состояние (None, если запись устарела)"""
+        row = await self._get_row(key)
+        return row.state if row else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        """Сохранить данные"""
+        if not isinstance(data, dict):
+            raise ValueError(f"Data must be a dict, got {type(data).__name__}")
+        await self._upsert(key, data=dumps_compact(data) if data else None)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        """Получить данные (пустой словарь, если запись устарела)"""
+        row = await self._get_row(key)
+        if not row or not row.data:
+            return {}
+        return json.loads(row.data)
+
+    async def cleanup_expired(self) -> int:
+        """Удалить устаревшие состояния, вернуть количество удалённых записей"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                delete(FsmState).where(FsmState.updated_at < self._expired_before())
+            )
+            await session.commit()
+            return result.rowcount or 0
+
+    async def _cleanup_loop(self) -> None:
+        while True:
+            try:
+                removed = await self.cleanup_expired()
+                if removed:
+                    logger.info(f"FSM: удалено устаревших состояний: {removed}")
+            except Exception as e:
+                logger.error(f"FSM: ошибка очистки устаревших состояний: {e}")
+            await asyncio.sleep(self.cleanup_interval)
+
+    def start_cleanup(self) -> None:
+        """Запустить фоновую очистку устаревших состояний"""
+        if self._cleanup_task is None or self._cleanup_task.done():
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+
+    async def close(self) -> None:
+        """Остановить фоновую очистку"""
+        if self._cleanup_task:
+            self._cleanup_task.cancel()
+            try:
+                await self._cleanup_task
+            except asyncio.CancelledError:
+                pass
+            self._cleanup_task = None
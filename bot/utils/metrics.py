@@ -0,0 +1,174 @@
+"""Гистограммы задержек обработчиков и экспорт в формате Prometheus"""
+import math
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram:
+    """
+    Гистограмма в стиле HDR: значения в микросекундах раскладываются по
+    лог-линейным корзинам (2**SUB_BITS корзин на каждую степень двойки),
+    относительная погрешность квантилей — не больше ~3%, память — O(число корзин).
+    """
+
+    SUB_BITS = 5
+    SUB = 1 << SUB_BITS
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @classmethod
+    def _index(cls, value_us: int) -> int:
+        if value_us < 2 * cls.SUB:
+            return value_us
+        shift = value_us.bit_length() - (cls.SUB_BITS + 1)
+        return (shift + 1) * cls.SUB + ((value_us >> shift) - cls.SUB)
+
+    @classmethod
+    def _upper_bound(cls, index: int) -> int:
+        if index < 2 * cls.SUB:
+            return index
+        shift = index // cls.SUB - 1
+        mantissa = index % cls.SUB + cls.SUB
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, seconds: float) -> None:
+        """Добавить значение (в секундах)"""
+        index = self._index(max(int(seconds * 1_000_000), 0))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Квантиль в секундах (0, если значений нет)"""
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._upper_bound(index) / 1_000_000, self.max)
+        return self.max
+
+
+class HandlerMetrics:
+    """Время обработчика: полное, в БД и в Telegram API"""
+
+    __slots__ = ("wall", "db", "api", "errors")
+
+    def __init__(self) -> None:
+        self.wall = LatencyHistogram()
+        self.db = LatencyHistogram()
+        self.api = LatencyHistogram()
+        self.errors = 0
+
+
+class UpdatePerf:
+    """Показатели текущего обновления"""
+
+    __slots__ = ("handler", "api_time", "api_calls")
+
+    def __init__(self) -> None:
+        self.handler: Optional[str] = None
+        self.api_time = 0.0
+        self.api_calls = 0
+
+
+current_update_perf: ContextVar[Optional[UpdatePerf]] = ContextVar("current_update_perf", default=None)
+
+
+class PerfRegistry:
+    """Метрики всех обработчиков с момента запуска"""
+
+    def __init__(self) -> None:
+        self.handlers: Dict[str, HandlerMetrics] = {}
+        self.started_at = time.time()
+
+    def record(self, handler: str, wall: float, db: float, api: float, failed: bool) -> None:
+        metrics = self.handlers.get(handler)
+        if metrics is None:
+            metrics = self.handlers[handler] = HandlerMetrics()
+        metrics.wall.record(wall)
+        metrics.db.record(db)
+        metrics.api.record(api)
+        if failed:
+            metrics.errors += 1
+
+    def top(self, limit: int = 10) -> List[Tuple[str, HandlerMetrics]]:
+        """Обработчики с наибольшим p95 полного времени"""
+        return sorted(
+            self.handlers.items(),
+            key=lambda item: item[1].wall.quantile(0.95),
+            reverse=True,
+        )[:limit]
+
+    def render_prometheus(self, gauges: Iterable[Tuple[str, str, float]] = ()) -> str:
+        """
+        Текст в формате Prometheus exposition.
+
+        gauges — дополнительные метрики (имя, тип, значение), например очередь обновлений.
+        """
+        lines: List[str] = []
+
+        for kind in ("wall", "db", "api"):
+            name = f"bot_handler_{kind}_seconds"
+            lines.append(f"# TYPE {name} summary")
+            for handler, metrics in sorted(self.handlers.items()):
+                histogram: LatencyHistogram = getattr(metrics, kind)
+                label = _escape_label(handler)
+                for q in QUANTILES:
+                    lines.append(f'{name}{{handler="{label}",quantile="{q}"}} {histogram.quantile(q):.6f}')
+                lines.append(f'{name}_sum{{handler="{label}"}} {histogram.total:.6f}')
+                lines.append(f'{name}_count{{handler="{label}"}} {histogram.count}')
+
+        lines.append("# TYPE bot_handler_errors_total counter")
+        for handler, metrics in sorted(self.handlers.items()):
+            lines.append(f'bot_handler_errors_total{{handler="{_escape_label(handler)}"}} {metrics.errors}')
+
+        for name, metric_type, value in gauges:
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class ApiTimingMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время запросов к Telegram API в рамках обновления"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot,
+        method: TelegramMethod[TelegramType],
+    ):
+        perf = current_update_perf.get()
+        if perf is None:
+            return await make_request(bot, method)
+
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            perf.api_time += time.perf_counter() - started
+            perf.api_calls += 1
+
+
+perf_registry = PerfRegistry()
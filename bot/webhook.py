@@ -0,0 +1,102 @@
+"""Режим webhook: приём обновлений через aiohttp-сервер"""
+import asyncio
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from Data.config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, METRICS_PATH
+from db.cache import task_card_cache, user_cache
+from db.log_writer import log_writer
+from bot.utils.metrics import perf_registry
+from log import log_handler, logger
+
+
+def _metrics_handler(dp: Dispatcher):
+    """GET METRICS_PATH: метрики обработчиков, очереди обновлений, кэшей и буфера журнала"""
+    async def handle(request: web.Request) -> web.Response:
+        gauges = []
+        scheduler = dp.get("update_scheduler")
+        if scheduler:
+            queue = scheduler.stats()
+            gauges += [
+                ("bot_updates_in_flight", "gauge", queue["in_flight"]),
+                ("bot_updates_backlog", "gauge", queue["backlog"]),
+                ("bot_updates_processed_total", "counter", queue["processed"]),
+                ("bot_updates_shed_total", "counter", queue["shed"]),
+            ]
+        cache = user_cache.stats()
+        gauges += [
+            ("bot_user_cache_hits_total", "counter", cache["hits"]),
+            ("bot_user_cache_misses_total", "counter", cache["misses"]),
+        ]
+        cache = task_card_cache.stats()
+        gauges += [
+            ("bot_task_cache_hits_total", "counter", cache["hits"]),
+            ("bot_task_cache_misses_total", "counter", cache["misses"]),
+        ]
+        audit = log_writer.stats()
+        gauges += [
+            ("bot_audit_log_backlog", "gauge", audit["backlog"]),
+            ("bot_audit_log_written_total", "counter", audit["written"]),
+            ("bot_audit_log_failed_total", "counter", audit["failed"]),
+            ("bot_audit_log_blocked_total", "counter", audit["blocked"]),
+            ("bot_log_records_dropped_total", "counter", log_handler.dropped),
+        ]
+        return web.Response(
+            text=perf_registry.render_prometheus(gauges),
+            content_type="text/plain",
+            charset="utf-8",
+        )
+
+    return handle
+
+
+def create_webhook_app(bot: Bot, dp: Dispatcher) -> web.Application:
+    """
+    Создает aiohttp-приложение для приёма обновлений.
+
+    Telegram сразу получает 200 OK, а обработка обновления идёт в фоне,
+    поэтому медленные обработчики не вызывают повторной доставки.
+    Запросы без правильного X-Telegram-Bot-Api-Secret-Token отклоняются.
+    На METRICS_PATH отдаются метрики в формате Prometheus.
+    """
+    app = web.Application()
+
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET or None,
+        handle_in_background=True,
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    if METRICS_PATH:
+        app.router.add_get(METRICS_PATH, _metrics_handler(dp))
+
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    """Зарегистрировать webhook в Telegram и обслуживать входящие обновления"""
+    app = create_webhook_app(bot, dp)
+    runner = web.AppRunner(app)
+    await runner.setup()
+
+    try:
+        site = web.TCPSite(runner, host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+        await site.start()
+        logger.info(f"🌐 Webhook-сервер слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+        # Несколько реплик могут выставлять один и тот же URL — вызов идемпотентен
+        await bot.set_webhook(
+            url=f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info("✅ Webhook зарегистрирован в Telegram")
+
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        logger.info("🔌 Webhook-сервер остановлен")
@@ -0,0 +1,108 @@
+"""Кэши в памяти процесса для часто читаемых данных"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from Data.config import TASK_CACHE_SIZE, TASK_CACHE_TTL, USER_CACHE_SIZE, USER_CACHE_TTL
+
+
+class TTLCache:
+    """
+    LRU-кэш с ограничением по размеру и времени жизни записей.
+
+    Однопоточный (asyncio), поэтому блокировки не нужны.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Получить значение (None, если нет или истекло)"""
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Сохранить значение, вытеснив самое давнее при переполнении"""
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Удалить значение"""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Очистить кэш"""
+        self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Статистика попаданий"""
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class VersionedTTLCache(TTLCache):
+    """
+    TTL-кэш значений с версией (например, Task.version).
+
+    invalidate(key, version) запоминает версию записи: значения старше
+    неё больше не сохраняются. Читатель, начавший чтение до записи и
+    закончивший после сброса, не положит в кэш устаревшую копию.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0) -> None:
+        super().__init__(maxsize, ttl)
+        self._min_versions: "OrderedDict[Hashable, int]" = OrderedDict()
+
+    def set(self, key: Hashable, value: Any, version: Optional[int] = None) -> None:
+        """Сохранить значение, если его версия не старше последней записанной"""
+        min_version = self._min_versions.get(key)
+        if min_version is not None and version is not None and version < min_version:
+            return
+        super().set(key, value)
+
+    def invalidate(self, key: Hashable, version: Optional[int] = None) -> None:
+        """Удалить значение; version — версия после записи"""
+        super().invalidate(key)
+        if version is None:
+            return
+        self._min_versions[key] = max(version, self._min_versions.get(key, version))
+        self._min_versions.move_to_end(key)
+        while len(self._min_versions) > self.maxsize:
+            self._min_versions.popitem(last=False)
+
+    def clear(self) -> None:
+        super().clear()
+        self._min_versions.clear()
+
+
+# Пользователи по telegram_id (detached-объекты User, только для чтения).
+# Сбрасывается в UserQueries при изменении роли, направления, активности и имени.
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Карточки задач по id (TaskDetails с detached-объектами, только для чтения).
+# Сбрасывается при любом изменении задачи, её сообщений, файлов, правок и отказов
+# (события сессии в db/queries/task_queries.py); карточки старше Task.version
+# последней записи не сохраняются.
+task_card_cache = VersionedTTLCache(maxsize=TASK_CACHE_SIZE, ttl=TASK_CACHE_TTL)
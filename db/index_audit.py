@@ -0,0 +1,322 @@
+"""
+Аудит индексов PostgreSQL: лишние индексы и цена записи.
+
+По pg_stat_user_tables / pg_stat_user_indexes и каталогу pg_index отчёт
+показывает:
+- цену записи по таблицам: число и размер индексов, доля HOT-обновлений
+  (обновление, не затрагивающее индексированные колонки, не трогает индексы),
+  мёртвые строки;
+- неиспользуемые индексы — idx_scan = 0 с момента сброса статистики
+  (уникальные и обслуживающие ограничения не предлагаются);
+- избыточные индексы — дубликаты и индексы, ключ которых является префиксом
+  другого индекса той же таблицы с тем же условием;
+- оценку раздутия btree-индексов по pg_stats (без расширения pgstattuple).
+
+Запуск:
+    python -m db.index_audit
+    python -m db.index_audit --table tasks users --sql    # DROP INDEX для миграции
+    python -m db.index_audit --json audit.json
+"""
+import argparse
+import asyncio
+import json
+import math
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from db.engine import engine as default_engine
+
+# Ниже этого размера раздутие не показываем — маленькие индексы дёшевы
+BLOAT_MIN_BYTES = 1024 * 1024
+# Btree, растущий вставками в случайном порядке, и так заполнен на ~70%
+BLOAT_MIN_RATIO = 0.4
+
+_INDEXES_SQL = """
+SELECT
+    t.relname AS table_name,
+    c.relname AS index_name,
+    am.amname AS method,
+    i.indkey::int2[] AS keys,
+    i.indoption::int2[] AS options,
+    i.indexprs IS NOT NULL AS has_expressions,
+    pg_get_expr(i.indpred, i.indrelid) AS predicate,
+    i.indisunique AS is_unique,
+    i.indisprimary AS is_primary,
+    EXISTS (SELECT 1 FROM pg_constraint con WHERE con.conindid = i.indexrelid) AS backs_constraint,
+    pg_relation_size(c.oid) AS size_bytes,
+    c.relpages AS pages,
+    c.reltuples AS tuples,
+    coalesce(s.idx_scan, 0) AS scans,
+    pg_get_indexdef(c.oid) AS definition,
+    coalesce((
+        SELECT split_part(option, '=', 2)::int
+        FROM unnest(c.reloptions) option
+        WHERE option LIKE 'fillfactor=%'
+    ), 90) AS fillfactor,
+    (
+        SELECT sum(coalesce(st.avg_width, 8))
+        FROM unnest(i.indkey::int2[]) key
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = key
+        LEFT JOIN pg_stats st ON st.schemaname = n.nspname AND st.tablename = t.relname AND st.attname = a.attname
+    ) AS key_width
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indexrelid
+JOIN pg_class t ON t.oid = i.indrelid
+JOIN pg_namespace n ON n.oid = t.relnamespace
+JOIN pg_am am ON am.oid = c.relam
+LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = i.indexrelid
+WHERE n.nspname = 'public'
+ORDER BY t.relname, c.relname
+"""
+
+_TABLES_SQL = """
+SELECT
+    s.relname AS table_name,
+    s.n_live_tup AS live_rows,
+    s.n_dead_tup AS dead_rows,
+    s.n_tup_ins AS inserts,
+    s.n_tup_upd AS updates,
+    s.n_tup_hot_upd AS hot_updates,
+    s.n_tup_del AS deletes,
+    pg_relation_size(s.relid) AS table_bytes,
+    pg_indexes_size(s.relid) AS index_bytes,
+    (SELECT count(*) FROM pg_index i WHERE i.indrelid = s.relid) AS index_count
+FROM pg_stat_user_tables s
+WHERE s.schemaname = 'public'
+ORDER BY pg_indexes_size(s.relid) DESC
+"""
+
+
+@dataclass
+class IndexInfo:
+    table_name: str
+    index_name: str
+    method: str
+    keys: List[int]
+    options: List[int]
+    has_expressions: bool
+    predicate: Optional[str]
+    is_unique: bool
+    is_primary: bool
+    backs_constraint: bool
+    size_bytes: int
+    pages: int
+    tuples: float
+    scans: int
+    definition: str
+    fillfactor: int
+    key_width: Optional[int]
+
+    @property
+    def required(self) -> bool:
+        """Индекс нельзя просто удалить: он обеспечивает уникальность или ограничение"""
+        return self.is_unique or self.is_primary or self.backs_constraint
+
+
+@dataclass
+class TableInfo:
+    table_name: str
+    live_rows: int
+    dead_rows: int
+    inserts: int
+    updates: int
+    hot_updates: int
+    deletes: int
+    table_bytes: int
+    index_bytes: int
+    index_count: int
+
+    @property
+    def hot_ratio(self) -> Optional[float]:
+        return self.hot_updates / self.updates if self.updates else None
+
+    @property
+    def dead_ratio(self) -> float:
+        total = self.live_rows + self.dead_rows
+        return self.dead_rows / total if total else 0.0
+
+
+@dataclass
+class Finding:
+    index_name: str
+    table_name: str
+    size_bytes: int
+    reason: str
+    covered_by: Optional[str] = None
+
+
+@dataclass
+class AuditReport:
+    stats_reset: Optional[str]
+    tables: List[TableInfo] = field(default_factory=list)
+    unused: List[Finding] = field(default_factory=list)
+    redundant: List[Finding] = field(default_factory=list)
+    bloated: List[Finding] = field(default_factory=list)
+
+
+def _covers(index: IndexInfo, other: IndexInfo) -> Optional[str]:
+    """Почему index избыточен при наличии other (None — не избыточен)"""
+    if index.table_name != other.table_name or index.index_name == other.index_name:
+        return None
+    if index.method != "btree" or other.method != "btree" or index.has_expressions or other.has_expressions:
+        return None
+    if index.predicate != other.predicate or index.is_primary:
+        return None
+
+    width = len(index.keys)
+    if other.keys[:width] != index.keys:
+        return None
+    # Одноколоночный btree читается в обе стороны; для составного важен порядок сортировки
+    if width > 1 and other.options[:width] != index.options:
+        return None
+
+    if width == len(other.keys):
+        if index.required and not other.required:
+            return None
+        if index.required == other.required and index.index_name < other.index_name:
+            # Из двух равноценных дубликатов предлагаем удалить один
+            return None
+        return "дубликат"
+    if index.required:
+        return None
+    return "префикс"
+
+
+def find_redundant(indexes: List[IndexInfo]) -> List[Finding]:
+    # Покрывающим называем самый широкий индекс — он останется после чистки
+    widest_first = sorted(indexes, key=lambda index: (-len(index.keys), not index.required))
+    findings = []
+    for index in indexes:
+        for other in widest_first:
+            reason = _covers(index, other)
+            if reason:
+                findings.append(Finding(index.index_name, index.table_name, index.size_bytes, reason, other.index_name))
+                break
+    return findings
+
+
+def find_unused(indexes: List[IndexInfo]) -> List[Finding]:
+    return [
+        Finding(index.index_name, index.table_name, index.size_bytes, "idx_scan = 0")
+        for index in indexes
+        if index.scans == 0 and not index.required
+    ]
+
+
+def estimate_bloat(index: IndexInfo, block_size: int) -> Tuple[int, float]:
+    """
+    Оценка лишних байт и доли раздутия btree-индекса.
+
+    Ожидаемый размер: строки × (заголовок 8 + ключ с выравниванием + указатель 4)
+    на страницу с учётом fillfactor, плюс метастраница.
+    """
+    if index.method != "btree" or index.has_expressions or index.pages <= 1 or index.key_width is None:
+        return 0, 0.0
+    tuple_bytes = 8 + int(math.ceil(index.key_width / 8.0)) * 8 + 4
+    usable = block_size * index.fillfactor / 100 - 24 - 16
+    expected_pages = int(math.ceil(max(index.tuples, 0) * tuple_bytes / usable)) + 1
+    extra_pages = max(index.pages - expected_pages, 0)
+    return extra_pages * block_size, extra_pages / index.pages
+
+
+async def run_audit(engine: AsyncEngine = default_engine, tables: Optional[List[str]] = None) -> AuditReport:
+    async with engine.connect() as conn:
+        stats_reset = (await conn.execute(text(
+            "SELECT stats_reset FROM pg_stat_database WHERE datname = current_database()"
+        ))).scalar()
+        block_size = int((await conn.execute(text("SELECT current_setting('block_size')"))).scalar())
+        index_rows = (await conn.execute(text(_INDEXES_SQL))).mappings().all()
+        table_rows = (await conn.execute(text(_TABLES_SQL))).mappings().all()
+
+    indexes = [IndexInfo(**{**row, "keys": list(row["keys"]), "options": list(row["options"])}) for row in index_rows]
+    if tables:
+        indexes = [index for index in indexes if index.table_name in tables]
+
+    report = AuditReport(stats_reset=stats_reset.isoformat() if stats_reset else None)
+    report.tables = [TableInfo(**row) for row in table_rows if not tables or row["table_name"] in tables]
+    report.redundant = find_redundant(indexes)
+    redundant_names = {finding.index_name for finding in report.redundant}
+    report.unused = [finding for finding in find_unused(indexes) if finding.index_name not in redundant_names]
+
+    for index in indexes:
+        extra_bytes, ratio = estimate_bloat(index, block_size)
+        if extra_bytes >= BLOAT_MIN_BYTES and ratio >= BLOAT_MIN_RATIO:
+            report.bloated.append(Finding(
+                index.index_name, index.table_name, index.size_bytes,
+                f"≈{ratio:.0%} ({_size(extra_bytes)} лишних)",
+            ))
+    return report
+
+
+def _size(value: int) -> str:
+    for unit in ("B", "kB", "MB", "GB"):
+        if abs(value) < 1024 or unit == "GB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return str(value)
+
+
+def print_report(report: AuditReport) -> None:
+    print(f"Статистика с: {report.stats_reset or 'создания кластера'}\n")
+
+    print(f"{'таблица':<28} {'строк':>11} {'индексов':>8} {'размер инд.':>11} {'обновлений':>11} {'HOT':>5} {'мёртвых':>8}")
+    for table in report.tables:
+        hot = f"{table.hot_ratio:.0%}" if table.hot_ratio is not None else "—"
+        print(
+            f"{table.table_name:<28} {table.live_rows:>11,} {table.index_count:>8} {_size(table.index_bytes):>11} "
+            f"{table.updates:>11,} {hot:>5} {table.dead_ratio:>8.1%}"
+        )
+
+    sections = (
+        ("🔁 Избыточные индексы", report.redundant),
+        ("💤 Неиспользуемые индексы", report.unused),
+        ("🎈 Раздутые индексы (оценка)", report.bloated),
+    )
+    for title, findings in sections:
+        print(f"\n{title}: {len(findings)}")
+        for finding in findings:
+            name = f"{finding.table_name}.{finding.index_name}"
+            covered = f" → {finding.covered_by}" if finding.covered_by else ""
+            print(f"  {name:<56} {_size(finding.size_bytes):>10}  {finding.reason}{covered}")
+
+
+def print_sql(report: AuditReport) -> None:
+    """Операторы для миграции: избыточные удаляются, неиспользуемые — на проверку"""
+    print("\n-- Избыточные индексы")
+    for finding in report.redundant:
+        print(f"DROP INDEX CONCURRENTLY IF EXISTS {finding.index_name};  -- {finding.reason} {finding.covered_by}")
+    if report.unused:
+        print("\n-- Неиспользуемые с момента сброса статистики: проверьте перед удалением")
+        for finding in report.unused:
+            print(f"-- DROP INDEX CONCURRENTLY IF EXISTS {finding.index_name};")
+    if report.bloated:
+        print("\n-- Раздутые индексы")
+        for finding in report.bloated:
+            print(f"-- REINDEX INDEX CONCURRENTLY {finding.index_name};")
+
+
+async def _main(args: argparse.Namespace) -> None:
+    try:
+        report = await run_audit(default_engine, args.table or None)
+    finally:
+        await default_engine.dispose()
+
+    print_report(report)
+    if args.sql:
+        print_sql(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            data: Dict = asdict(report)
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f"\nОтчёт сохранён: {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", nargs="*", help="только указанные таблицы")
+    parser.add_argument("--sql", action="store_true", help="вывести DROP/REINDEX для миграции")
+    parser.add_argument("--json", help="сохранить отчёт в JSON")
+    asyncio.run(_main(parser.parse_args()))
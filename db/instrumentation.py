@@ -0,0 +1,138 @@
+"""Учёт SQL-запросов по обновлениям и поиск N+1"""
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Запросы внутри одного обновления с одинаковой формой, начиная с этого количества,
+# считаются вероятным N+1
+DEFAULT_N_PLUS_ONE_THRESHOLD = 5
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_IN_LIST_RE = re.compile(r"IN \((?:\$\d+|%\(\w+\)s|\?)(?:, (?:\$\d+|%\(\w+\)s|\?))*\)")
+_BIND_RE = re.compile(r"\$\d+|%\(\w+\)s|\?")
+
+
+def statement_shape(statement: str) -> str:
+    """
+    Форма запроса: текст без параметров и лишних пробелов.
+
+    SQLAlchemy и так передаёт параметры отдельно, но IN-списки разной длины
+    дают разный текст — их сворачиваем в IN (?).
+    """
+    shape = _WHITESPACE_RE.sub(" ", statement).strip()
+    shape = _IN_LIST_RE.sub("IN (?)", shape)
+    return _BIND_RE.sub("?", shape)
+
+
+class QueryStats:
+    """Запросы одного обновления"""
+
+    __slots__ = ("handler", "statements", "db_time", "rows", "shapes")
+
+    def __init__(self) -> None:
+        self.handler: Optional[str] = None
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.shapes: Counter = Counter()
+
+    def add(self, statement: str, elapsed: float, rows: int) -> None:
+        self.statements += 1
+        self.db_time += elapsed
+        self.rows += max(rows, 0)
+        self.shapes[statement_shape(statement)] += 1
+
+    def n_plus_one(self, threshold: int = DEFAULT_N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        """Формы запросов, повторившиеся не меньше threshold раз"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+class HandlerQueryTotals:
+    """Накопленные показатели запросов одного обработчика"""
+
+    __slots__ = ("updates", "statements", "db_time", "rows", "max_statements", "n_plus_one")
+
+    def __init__(self) -> None:
+        self.updates = 0
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.max_statements = 0
+        self.n_plus_one: Dict[str, int] = {}
+
+
+class QueryReport:
+    """Сводка по обработчикам с момента запуска (для админского экрана)"""
+
+    def __init__(self) -> None:
+        self.handlers: Dict[str, HandlerQueryTotals] = {}
+
+    def record(self, stats: QueryStats, n_plus_one: List[Tuple[str, int]]) -> None:
+        name = stats.handler or "—"
+        totals = self.handlers.get(name)
+        if totals is None:
+            totals = self.handlers[name] = HandlerQueryTotals()
+
+        totals.updates += 1
+        totals.statements += stats.statements
+        totals.db_time += stats.db_time
+        totals.rows += stats.rows
+        totals.max_statements = max(totals.max_statements, stats.statements)
+        for shape, count in n_plus_one:
+            totals.n_plus_one[shape] = max(totals.n_plus_one.get(shape, 0), count)
+
+    def top(self, limit: int = 10) -> List[Tuple[str, HandlerQueryTotals]]:
+        """Обработчики с наибольшим числом запросов на обновление"""
+        return sorted(
+            self.handlers.items(),
+            key=lambda item: item[1].statements / item[1].updates,
+            reverse=True,
+        )[:limit]
+
+    def suspects(self) -> List[Tuple[str, str, int]]:
+        """Все найденные N+1: (обработчик, форма запроса, повторов за обновление)"""
+        found = [
+            (name, shape, count)
+            for name, totals in self.handlers.items()
+            for shape, count in totals.n_plus_one.items()
+        ]
+        return sorted(found, key=lambda item: item[2], reverse=True)
+
+    def clear(self) -> None:
+        self.handlers.clear()
+
+
+# Статистика текущего обновления; None — запрос вне обработки обновления
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+query_report = QueryReport()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_query_stats.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_query_stats.get()
+    if stats is None:
+        return
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats.add(statement, elapsed, getattr(cursor, "rowcount", 0) or 0)
+
+
+def install_query_instrumentation(engine: AsyncEngine) -> None:
+    """Подписаться на события движка (вызывается один раз при старте)"""
+    sync_engine = engine.sync_engine
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
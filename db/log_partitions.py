@@ -0,0 +1,369 @@
+"""
+Секции журналов action_logs и task_logs.
+
+Таблицы секционированы по месяцам created_at (RANGE, границы — месяцы по UTC),
+секция месяца называется <таблица>_ГГГГ_ММ; записи вне созданных месяцев
+попадают в <таблица>_default. Запросы с условием по created_at читают только
+нужные секции.
+
+Обслуживание (фоновая задача бота или CLI):
+- строки из <таблица>_default переносятся в секции своих месяцев (секция
+  создаётся отдельной таблицей, заполняется и подключается — ATTACH PARTITION):
+  пока строки месяца лежат в DEFAULT, секцию этого месяца создать нельзя,
+  и срок хранения к ним не применяется;
+- секции создаются заранее, на AUDIT_PARTITIONS_AHEAD месяцев вперёд;
+- секции старше AUDIT_RETENTION_MONTHS месяцев отключаются от таблицы
+  (DETACH PARTITION), выгружаются в AUDIT_ARCHIVE_DIR/<секция>.csv.gz
+  и удаляются. Удаление месяца — DROP TABLE, а не DELETE: без долгих
+  транзакций, блокировок строк и раздувания таблицы.
+
+Обслуживание выполняет одна реплика за раз (pg_try_advisory_lock).
+Отключённая, но не выгруженная секция (прерванный запуск) выгружается
+при следующем запуске.
+
+Запуск вручную:
+    python -m db.log_partitions status
+    python -m db.log_partitions maintain
+"""
+import asyncio
+import gzip
+import os
+import re
+import shutil
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from Data.config import (
+    AUDIT_RETENTION_MONTHS, AUDIT_ARCHIVE_DIR, AUDIT_PARTITIONS_AHEAD, AUDIT_MAINTENANCE_INTERVAL,
+    MIGRATION_LOCK_TIMEOUT
+)
+from db.engine import engine as default_engine
+from log import logger
+
+PARTITIONED_LOG_TABLES = ("action_logs", "task_logs")
+
+# Ключ pg_advisory_lock: обслуживание секций выполняет один экземпляр бота
+PARTITION_LOCK_KEY = 0x41554454
+
+_PARTITION_RE = re.compile(r"^(\w+)_(\d{4})_(\d{2})$")
+
+
+class LogPartition(NamedTuple):
+    table: str
+    name: str
+    month: datetime
+    # False — секция уже отключена от таблицы, но ещё не выгружена
+    attached: bool
+    rows: int
+
+
+def month_start(moment: datetime) -> datetime:
+    """Начало месяца по UTC"""
+    moment = moment.astimezone(timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_{month:%Y_%m}"
+
+
+async def list_partitions(conn: AsyncConnection) -> List[LogPartition]:
+    """
+    Месячные секции журналов: подключённые и отключённые, но не выгруженные.
+
+    rows — оценка по статистике (reltuples), без чтения таблиц.
+    """
+    result = await conn.execute(text(
+        "SELECT c.relname, c.relispartition, greatest(c.reltuples, 0)::bigint AS rows "
+        "FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = current_schema() AND c.relkind = 'r' "
+        "AND c.relname ~ '^(action_logs|task_logs)_[0-9]{4}_[0-9]{2}$' "
+        "ORDER BY c.relname"
+    ))
+    partitions = []
+    for relname, attached, rows in result:
+        match = _PARTITION_RE.match(relname)
+        if not match or match.group(1) not in PARTITIONED_LOG_TABLES:
+            continue
+        month = datetime(int(match.group(2)), int(match.group(3)), 1, tzinfo=timezone.utc)
+        partitions.append(LogPartition(match.group(1), relname, month, attached, rows))
+    return partitions
+
+
+async def ensure_partitions(
+    engine: AsyncEngine = default_engine,
+    months_ahead: int = AUDIT_PARTITIONS_AHEAD,
+    since: Optional[datetime] = None
+) -> int:
+    """
+    Создать секции с текущего месяца на months_ahead месяцев вперёд; вернуть число созданных.
+
+    since — создать и секции прошлых месяцев, начиная с месяца since
+    (перед загрузкой истории, чтобы она не попала в DEFAULT).
+    """
+    last = add_months(month_start(datetime.now(timezone.utc)), max(months_ahead, 0))
+    first = min(month_start(since), last) if since else add_months(last, -max(months_ahead, 0))
+    created = 0
+    async with engine.connect() as conn:
+        existing = {partition.name for partition in await list_partitions(conn)}
+        await conn.commit()
+        for table in PARTITIONED_LOG_TABLES:
+            month = first
+            while month <= last:
+                name = partition_name(table, month)
+                next_month = add_months(month, 1)
+                if name in existing:
+                    month = next_month
+                    continue
+                try:
+                    async with conn.begin():
+                        await conn.exec_driver_sql(f"SET LOCAL lock_timeout = '{MIGRATION_LOCK_TIMEOUT}s'")
+                        await conn.exec_driver_sql(
+                            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+                        )
+                    created += 1
+                    logger.info(f"🗂 Создана секция журнала {name}")
+                except Exception as e:
+                    # Например, в секции DEFAULT уже есть строки этого месяца — их перенесёт drain_default_partitions
+                    logger.error(f"❌ Секция журнала {name} не создана: {type(e).__name__}: {e}")
+                month = next_month
+    return created
+
+
+async def drain_default_partitions(engine: AsyncEngine = default_engine) -> int:
+    """
+    Перенести строки из <таблица>_default в секции их месяцев; вернуть число перенесённых строк.
+
+    Каждый месяц — отдельная транзакция: новая таблица заполняется строками
+    месяца (DELETE ... RETURNING из DEFAULT) и подключается к журналу.
+    CHECK по границам месяца избавляет ATTACH PARTITION от повторной проверки строк.
+    """
+    moved_total = 0
+    async with engine.connect() as conn:
+        existing = {partition.name for partition in await list_partitions(conn)}
+        months = {}
+        for table in PARTITIONED_LOG_TABLES:
+            result = await conn.execute(text(
+                f"SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC') FROM {table}_default"
+            ))
+            months[table] = sorted(month.replace(tzinfo=timezone.utc) for month in result.scalars())
+        await conn.commit()
+
+        for table in PARTITIONED_LOG_TABLES:
+            for month in months[table]:
+                name = partition_name(table, month)
+                if name in existing:
+                    # Отключённая, но не выгруженная секция этого месяца: перенос — после её выгрузки
+                    logger.warning(f"⚠️ Строки {table}_default за {month:%Y-%m} не перенесены: есть таблица {name}")
+                    continue
+                lower, upper = month.isoformat(), add_months(month, 1).isoformat()
+                try:
+                    async with conn.begin():
+                        await conn.exec_driver_sql(f"SET LOCAL lock_timeout = '{MIGRATION_LOCK_TIMEOUT}s'")
+                        await conn.exec_driver_sql(
+                            f"CREATE TABLE {name} (LIKE {table}, CONSTRAINT {name}_bounds "
+                            f"CHECK (created_at >= '{lower}' AND created_at < '{upper}'))"
+                        )
+                        moved = (await conn.exec_driver_sql(
+                            f"WITH moved AS (DELETE FROM {table}_default "
+                            f"WHERE created_at >= '{lower}' AND created_at < '{upper}' RETURNING *) "
+                            f"INSERT INTO {name} SELECT * FROM moved"
+                        )).rowcount
+                        await conn.exec_driver_sql(
+                            f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{lower}') TO ('{upper}')"
+                        )
+                        await conn.exec_driver_sql(f"ALTER TABLE {name} DROP CONSTRAINT {name}_bounds")
+                except Exception as e:
+                    logger.error(f"❌ Строки {table}_default за {month:%Y-%m} не перенесены: {type(e).__name__}: {e}")
+                    continue
+                moved_total += moved
+                logger.info(f"🗂 Создана секция журнала {name}, перенесено строк из DEFAULT: {moved}")
+    return moved_total
+
+
+async def _archive_partition(conn: AsyncConnection, partition: LogPartition, archive_dir: str) -> str:
+    """Отключить секцию, выгрузить в <archive_dir>/<секция>.csv.gz и удалить; вернуть путь архива"""
+    if partition.attached:
+        # Короткая блокировка родительской таблицы; не ждём дольше lock_timeout
+        async with conn.begin():
+            await conn.exec_driver_sql(f"SET LOCAL lock_timeout = '{MIGRATION_LOCK_TIMEOUT}s'")
+            await conn.exec_driver_sql(f"ALTER TABLE {partition.table} DETACH PARTITION {partition.name}")
+
+    os.makedirs(archive_dir, exist_ok=True)
+    csv_path = os.path.join(archive_dir, f"{partition.name}.csv")
+    archive_path = csv_path + ".gz"
+
+    # COPY в файл через asyncpg (запись файла — в потоке executor), сжатие — в отдельном потоке
+    raw_connection = await conn.get_raw_connection()
+    await raw_connection.driver_connection.copy_from_table(
+        partition.name, output=csv_path, format="csv", header=True
+    )
+    await asyncio.to_thread(_gzip_file, csv_path, archive_path)
+
+    async with conn.begin():
+        await conn.exec_driver_sql(f"DROP TABLE {partition.name}")
+    return archive_path
+
+
+def _gzip_file(source: str, dest: str) -> None:
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+async def archive_old_partitions(
+    engine: AsyncEngine = default_engine,
+    retention_months: int = AUDIT_RETENTION_MONTHS,
+    archive_dir: str = AUDIT_ARCHIVE_DIR
+) -> List[str]:
+    """
+    Выгрузить и удалить секции месяцев старше retention_months (текущий месяц не считается).
+
+    Возвращает пути архивов. retention_months <= 0 — журналы хранятся без ограничения.
+    """
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(month_start(datetime.now(timezone.utc)), -retention_months)
+
+    archived = []
+    async with engine.connect() as conn:
+        partitions = await list_partitions(conn)
+        await conn.commit()
+        for partition in partitions:
+            # Отключённая секция уже была выбрана к выгрузке прошлым запуском
+            if partition.attached and partition.month >= cutoff:
+                continue
+            try:
+                path = await _archive_partition(conn, partition, archive_dir)
+            except Exception as e:
+                logger.error(f"❌ Секция журнала {partition.name} не выгружена: {type(e).__name__}: {e}")
+                continue
+            archived.append(path)
+            logger.info(f"📦 Секция журнала {partition.name} выгружена в {path} и удалена")
+    return archived
+
+
+async def maintain(
+    engine: AsyncEngine = default_engine,
+    months_ahead: int = AUDIT_PARTITIONS_AHEAD,
+    retention_months: int = AUDIT_RETENTION_MONTHS,
+    archive_dir: str = AUDIT_ARCHIVE_DIR
+) -> Optional[Dict[str, int]]:
+    """
+    Перенести строки из DEFAULT в секции, создать будущие секции и выгрузить старые.
+
+    Перенос идёт первым: после него срок хранения применяется и к этим строкам.
+    Возвращает {"drained": ..., "created": ..., "archived": ...} или None,
+    если обслуживание сейчас выполняет другой экземпляр.
+    """
+    async with engine.connect() as lock_conn:
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        locked = (await lock_conn.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": PARTITION_LOCK_KEY}
+        )).scalar()
+        if not locked:
+            return None
+        try:
+            drained = await drain_default_partitions(engine)
+            created = await ensure_partitions(engine, months_ahead)
+            archived = await archive_old_partitions(engine, retention_months, archive_dir)
+        finally:
+            await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": PARTITION_LOCK_KEY})
+    return {"drained": drained, "created": created, "archived": len(archived)}
+
+
+class LogPartitionMaintenance:
+    """Фоновое обслуживание секций журналов раз в interval секунд (0 — отключено)"""
+
+    def __init__(self, interval: int = 21600) -> None:
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                result = await maintain()
+                if result and (result["drained"] or result["created"] or result["archived"]):
+                    logger.info(
+                        f"🗂 Секции журналов: перенесено из DEFAULT {result['drained']} строк, "
+                        f"создано {result['created']}, выгружено {result['archived']}"
+                    )
+            except Exception as e:
+                logger.error(f"❌ Ошибка обслуживания секций журналов: {type(e).__name__}: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """Запустить фоновое обслуживание (первый проход — сразу)"""
+        if self.interval <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        """Остановить фоновое обслуживание"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+partition_maintenance = LogPartitionMaintenance(interval=AUDIT_MAINTENANCE_INTERVAL)
+
+
+async def _status(engine: AsyncEngine) -> None:
+    cutoff = None
+    if AUDIT_RETENTION_MONTHS > 0:
+        cutoff = add_months(month_start(datetime.now(timezone.utc)), -AUDIT_RETENTION_MONTHS)
+    async with engine.connect() as conn:
+        partitions = await list_partitions(conn)
+        defaults = {
+            table: (await conn.execute(text(f"SELECT count(*) FROM {table}_default"))).scalar()
+            for table in PARTITIONED_LOG_TABLES
+        }
+    for partition in partitions:
+        if not partition.attached:
+            mark = "⏳ отключена, ждёт выгрузки"
+        elif cutoff and partition.month < cutoff:
+            mark = "📦 будет выгружена"
+        else:
+            mark = "✅"
+        print(f"{partition.name:<24} ~{partition.rows:>10} строк  {mark}")
+    for table, count in defaults.items():
+        warning = "  ⚠️ будут перенесены в секции своих месяцев" if count else ""
+        print(f"{table + '_default':<24} {count:>11} строк{warning}")
+
+
+async def _main(command: str) -> None:
+    try:
+        if command == "maintain":
+            result = await maintain()
+            if result is None:
+                print("Обслуживание выполняет другой экземпляр")
+            else:
+                print(
+                    f"Перенесено из DEFAULT строк: {result['drained']}, "
+                    f"создано секций: {result['created']}, выгружено: {result['archived']}"
+                )
+        else:
+            await _status(default_engine)
+    finally:
+        await default_engine.dispose()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 or (len(sys.argv) == 2 and sys.argv[1] not in ("status", "maintain")):
+        sys.exit("Использование: python -m db.log_partitions [status|maintain]")
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) == 2 else "status"))
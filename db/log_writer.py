@@ -0,0 +1,155 @@
+"""Буферизованная запись журналов действий (ActionLog, TaskLog) пачками"""
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from Data.config import AUDIT_LOG_BATCH_SIZE, AUDIT_LOG_FLUSH_INTERVAL, AUDIT_LOG_QUEUE_SIZE
+from db.engine import AsyncSessionLocal
+from log import logger
+
+
+class BufferedLogWriter:
+    """
+    Очередь записей журнала с фоновой записью в БД.
+
+    Обработчик только кладёт запись в очередь, а фоновая задача пишет накопленное
+    одним многострочным INSERT — когда набралось batch_size записей или прошло
+    flush_interval секунд с первой записи пачки. Очередь ограничена queue_size:
+    если БД не успевает, submit ждёт свободного места (обратное давление),
+    а не копит записи в памяти без предела.
+
+    created_at фиксируется в момент submit, поэтому порядок и время записей
+    не зависят от задержки записи. close() дописывает всё, что осталось в очереди.
+    Пока writer не запущен (скрипты, миграции), журнал пишется сразу — см. LogQueries.
+    """
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 1.0, queue_size: int = 5000) -> None:
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = flush_interval
+        self.queue_size = max(queue_size, self.batch_size)
+        self._queue: Optional[asyncio.Queue] = None
+        # Пачка, которую фоновая задача собирает прямо сейчас
+        self._pending: List[Tuple[type, dict]] = []
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.blocked = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Буферизация включена в настройках (AUDIT_LOG_FLUSH_INTERVAL > 0)"""
+        return self.flush_interval > 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Запустить фоновую запись (в работающем event loop)"""
+        if not self.enabled or self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"📝 Буфер журнала запущен: пачка {self.batch_size}, "
+            f"интервал {self.flush_interval} сек, очередь {self.queue_size}"
+        )
+
+    async def submit(self, model: type, values: dict) -> None:
+        """Поставить запись в очередь (ждёт, если очередь заполнена)"""
+        values.setdefault("created_at", datetime.now(timezone.utc))
+        if self._queue.full():
+            self.blocked += 1
+        await self._queue.put((model, values))
+
+    async def flush(self) -> None:
+        """Записать всё накопленное сейчас (для чтения журнала сразу после записи)"""
+        if self._lock is None:
+            return
+        async with self._lock:
+            batch, self._pending = self._pending, []
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if batch:
+                await self._write(batch)
+
+    async def close(self) -> None:
+        """Остановить фоновую задачу и дописать очередь"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        logger.info(f"📝 Буфер журнала остановлен, записано {self.written}, потеряно {self.failed}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "backlog": (self._queue.qsize() if self._queue else 0) + len(self._pending),
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "blocked": self.blocked,
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._pending.append(await self._queue.get())
+            deadline = loop.time() + self.flush_interval
+            while len(self._pending) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._pending.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                # shield: остановка во время записи не должна терять уже взятую пачку
+                await asyncio.shield(self.flush())
+            except Exception as e:
+                logger.error(f"❌ Ошибка записи журнала: {type(e).__name__}: {e}")
+
+    async def _write(self, batch: List[Tuple[type, dict]]) -> None:
+        """Одна транзакция, по одному многострочному INSERT на таблицу"""
+        try:
+            rows_by_model: Dict[type, List[dict]] = {}
+            for model, values in batch:
+                rows_by_model.setdefault(model, []).append(values)
+            async with AsyncSessionLocal() as session:
+                for model, rows in rows_by_model.items():
+                    await session.execute(insert(model), rows)
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Пачка журнала ({len(batch)} записей) не записана: {e}. Пишем по одной")
+            await self._write_one_by_one(batch)
+        else:
+            self.written += len(batch)
+            self.batches += 1
+
+    async def _write_one_by_one(self, batch: List[Tuple[type, dict]]) -> None:
+        """Запасной путь: одна плохая запись (например, задача уже удалена) не теряет остальные"""
+        for model, values in batch:
+            try:
+                async with AsyncSessionLocal() as session:
+                    await session.execute(insert(model), [values])
+                    await session.commit()
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"❌ Запись журнала {model.__tablename__} потеряна: {values}. Ошибка: {e}")
+
+
+log_writer = BufferedLogWriter(
+    batch_size=AUDIT_LOG_BATCH_SIZE,
+    flush_interval=AUDIT_LOG_FLUSH_INTERVAL,
+    queue_size=AUDIT_LOG_QUEUE_SIZE,
+)
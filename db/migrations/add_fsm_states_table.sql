@@ -0,0 +1,11 @@
+-- Создание таблицы для хранения состояний FSM (FSM_STORAGE=postgres)
+CREATE TABLE IF NOT EXISTS fsm_states (
+    key VARCHAR(255) PRIMARY KEY,
+    state VARCHAR(255),
+    -- Компактный JSON с данными сценария
+    data TEXT,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+-- Индекс для TTL-очистки устаревших состояний
+CREATE INDEX IF NOT EXISTS ix_fsm_states_updated_at ON fsm_states (updated_at);
@@ -0,0 +1,34 @@
+-- Базовая версия схемы: правки, которые раньше выполнял migrate_database() при каждом запуске.
+-- На новой базе таблицы уже созданы по models.py, и все шаги ничего не меняют.
+
+-- Роль назначается после одобрения заявки
+ALTER TABLE users ALTER COLUMN role DROP NOT NULL;
+
+-- Удаление задачи каскадно удаляет сообщения, файлы, историю, правки и отказы
+DO $$
+DECLARE
+    table_name TEXT;
+BEGIN
+    FOREACH table_name IN ARRAY ARRAY['messages', 'task_files', 'task_logs', 'task_corrections', 'task_rejections'] LOOP
+        IF EXISTS (
+            SELECT 1
+            FROM pg_constraint
+            WHERE conname = table_name || '_task_id_fkey'
+              AND confdeltype <> 'c'
+        ) THEN
+            EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', table_name, table_name || '_task_id_fkey');
+            EXECUTE format(
+                'ALTER TABLE %I ADD CONSTRAINT %I FOREIGN KEY (task_id) REFERENCES tasks(id) ON DELETE CASCADE',
+                table_name, table_name || '_task_id_fkey'
+            );
+        END IF;
+    END LOOP;
+END $$;
+
+-- Лимит задач исполнителя больше не используется
+ALTER TABLE users DROP COLUMN IF EXISTS max_tasks;
+
+-- Флаг доступности исполнителя для получения новых задач
+ALTER TABLE users ADD COLUMN IF NOT EXISTS is_available BOOLEAN NOT NULL DEFAULT TRUE;
+
+CREATE INDEX IF NOT EXISTS idx_users_role_available ON users (role, is_available);
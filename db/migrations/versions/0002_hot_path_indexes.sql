@@ -0,0 +1,47 @@
+-- Составные и частичные индексы для частых запросов, которым не хватало индекса.
+-- Строятся CONCURRENTLY — без блокировки записи в таблицы.
+-- Эффект: python benchmarks/index_bench.py
+
+-- MessageQueries.get_task_messages: сообщения задачи по времени
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_task_created
+    ON messages (task_id, created_at);
+
+-- MessageQueries.get_unread_messages / mark_messages_as_read
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_task_unread
+    ON messages (task_id, created_at)
+    WHERE is_read = FALSE;
+
+-- TaskQueries.has_executor_rejected
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_rejections_task_executor
+    ON task_rejections (task_id, executor_id);
+
+-- ChatRequestQueries.count_by_sender (с фильтром по дате)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_requests_sender_completed_created
+    ON chat_requests (sender_id, is_completed, created_at);
+
+-- Поиск тимлида, отправившего задачу в чат (callback_chat_task_complete)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_action_logs_type_entity_created
+    ON action_logs (action_type, entity_type, entity_id, created_at DESC);
+
+-- LogQueries.get_task_logs: история задачи по времени
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_logs_task_created
+    ON task_logs (task_id, created_at);
+
+-- FileQueries.get_task_files: неудалённые файлы задачи
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_files_task_active
+    ON task_files (task_id, created_at)
+    WHERE is_deleted = FALSE;
+
+-- Открытые задачи байера и исполнителя (PENDING/IN_PROGRESS) с сортировкой по дате
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_open_creator_created
+    ON tasks (created_by_id, created_at DESC)
+    WHERE status IN ('PENDING', 'IN_PROGRESS');
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_open_executor_created
+    ON tasks (executor_id, created_at DESC)
+    WHERE status IN ('PENDING', 'IN_PROGRESS');
+
+-- Свободные задачи назначенных баеров (TaskQueries.get_available_tasks_for_executor)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_unassigned_creator_created
+    ON tasks (created_by_id, created_at DESC)
+    WHERE status = 'PENDING' AND executor_id IS NULL;
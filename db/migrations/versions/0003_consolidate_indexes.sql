@@ -0,0 +1,41 @@
+-- Удаление лишних индексов tasks, users и messages: каждый индекс замедляет
+-- INSERT/UPDATE, а индекс на часто обновляемой колонке отключает HOT-обновления.
+-- Список — по отчёту python -m db.index_audit --table tasks users messages.
+-- Удаляются CONCURRENTLY — без блокировки записи в таблицы.
+
+-- tasks: дубликат первичного ключа
+DROP INDEX CONCURRENTLY IF EXISTS ix_tasks_id;
+
+-- tasks: префиксы составных индексов
+-- (idx_tasks_status_creator_date, idx_tasks_creator_date, idx_tasks_executor_status_date)
+DROP INDEX CONCURRENTLY IF EXISTS ix_tasks_status;
+DROP INDEX CONCURRENTLY IF EXISTS ix_tasks_created_by_id;
+DROP INDEX CONCURRENTLY IF EXISTS ix_tasks_executor_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_tasks_executor_active;
+
+-- tasks: приоритет (4 значения) и дедлайн отдельно не ищутся
+DROP INDEX CONCURRENTLY IF EXISTS ix_tasks_priority;
+DROP INDEX CONCURRENTLY IF EXISTS ix_tasks_deadline;
+
+-- users: дубликат первичного ключа и уникального telegram_id
+DROP INDEX CONCURRENTLY IF EXISTS ix_users_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_users_telegram_active;
+
+-- users: префиксы idx_users_role_available и idx_users_direction_load
+DROP INDEX CONCURRENTLY IF EXISTS ix_users_role;
+DROP INDEX CONCURRENTLY IF EXISTS ix_users_direction;
+
+-- users: флаги с двумя-тремя значениями — планировщик их не выбирает
+DROP INDEX CONCURRENTLY IF EXISTS ix_users_is_active;
+DROP INDEX CONCURRENTLY IF EXISTS ix_users_is_available;
+DROP INDEX CONCURRENTLY IF EXISTS ix_users_load_level;
+
+-- users: last_activity обновляется при каждом действии пользователя,
+-- а по ней ничего не ищется — индекс только мешал HOT-обновлениям
+DROP INDEX CONCURRENTLY IF EXISTS ix_users_last_activity;
+
+-- messages: дубликат первичного ключа, префикс idx_messages_task_created
+-- и флаг, заменённый частичным idx_messages_task_unread
+DROP INDEX CONCURRENTLY IF EXISTS ix_messages_id;
+DROP INDEX CONCURRENTLY IF EXISTS ix_messages_task_id;
+DROP INDEX CONCURRENTLY IF EXISTS ix_messages_is_read;
@@ -0,0 +1,4 @@
+-- Версия строки задачи для оптимистичной блокировки (version_id_col в db/models.py):
+-- каждое изменение задачи увеличивает version, запись с устаревшей версией
+-- отклоняется. Константный DEFAULT не переписывает таблицу (PostgreSQL 11+).
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
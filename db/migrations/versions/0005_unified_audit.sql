@@ -0,0 +1,44 @@
+-- Единый журнал: событие задачи — одна строка в task_logs, а не пара
+-- task_logs + action_logs. Записи action_logs по существующим задачам
+-- переносятся в task_logs (action_type -> action); записи по уже удалённым
+-- задачам и действия над пользователями остаются в action_logs.
+WITH moved AS (
+    DELETE FROM action_logs AS a
+    USING tasks AS t
+    WHERE a.entity_type = 'task'
+      AND a.entity_id = t.id
+    RETURNING a.entity_id, a.user_id, a.action_type, a.details, a.created_at
+)
+INSERT INTO task_logs (task_id, user_id, action, details, created_at)
+SELECT entity_id, user_id, action_type, details, created_at
+FROM moved;
+
+-- Обе таблицы одной лентой в формате action_logs (модель AuditEvent).
+-- Условия по user_id, action_type, entity_id и created_at доходят до индексов
+-- обеих таблиц.
+CREATE OR REPLACE VIEW audit_events AS
+SELECT
+    'action'::varchar(10) AS source,
+    id,
+    user_id,
+    action_type,
+    entity_type,
+    entity_id,
+    NULL::taskstatus AS old_status,
+    NULL::taskstatus AS new_status,
+    details,
+    created_at
+FROM action_logs
+UNION ALL
+SELECT
+    'task'::varchar(10) AS source,
+    id,
+    user_id,
+    action AS action_type,
+    'task'::varchar(30) AS entity_type,
+    task_id AS entity_id,
+    old_status,
+    new_status,
+    details,
+    created_at
+FROM task_logs;
@@ -0,0 +1,161 @@
+-- action_logs и task_logs секционируются по месяцам created_at: запросы
+-- за период читают только свои секции, индексы и VACUUM работают с
+-- небольшими таблицами, старые месяцы отключаются и архивируются целиком
+-- (db/log_partitions.py) вместо DELETE.
+--
+-- Существующие таблицы переименовываются, строки копируются в новые
+-- секционированные таблицы, старые удаляются. Ключ секционирования входит
+-- в первичный ключ: (id, created_at). Последовательности id сохраняются.
+-- На новой базе create_all уже создал секционированные таблицы — создаются
+-- только секции.
+--
+-- Копирование держит ACCESS EXCLUSIVE на журналах всё время переноса, поэтому
+-- при старте бота (migrator.startup = 'on') миграция не выполняется, если в
+-- несекционированных журналах есть строки: её запускают вручную в окно
+-- обслуживания — python -m db.migrator upgrade. Пустые и новые базы
+-- мигрируют при старте как обычно.
+
+DO $$
+BEGIN
+    IF current_setting('migrator.startup', true) = 'on' AND (
+        (NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'action_logs'::regclass)
+            AND EXISTS (SELECT 1 FROM action_logs))
+        OR (NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'task_logs'::regclass)
+            AND EXISTS (SELECT 1 FROM task_logs))
+    ) THEN
+        RAISE EXCEPTION 'Миграция 0006_partition_logs переносит все строки action_logs и task_logs под эксклюзивной блокировкой и не выполняется при старте бота: выполните python -m db.migrator upgrade в окно обслуживания';
+    END IF;
+END $$;
+
+-- Границы секций — месяцы по UTC
+SET LOCAL TimeZone = 'UTC';
+
+DROP VIEW IF EXISTS audit_events;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'action_logs'::regclass) THEN
+        ALTER TABLE action_logs RENAME TO action_logs_unpartitioned;
+        ALTER INDEX action_logs_pkey RENAME TO action_logs_unpartitioned_pkey;
+        DROP INDEX IF EXISTS ix_action_logs_id, ix_action_logs_user_id, ix_action_logs_action_type,
+            ix_action_logs_entity_id, ix_action_logs_created_at, idx_action_logs_time,
+            idx_action_logs_type_entity_created;
+
+        CREATE TABLE action_logs (
+            id INTEGER NOT NULL DEFAULT nextval('action_logs_id_seq'),
+            user_id INTEGER REFERENCES users (id) ON DELETE SET NULL,
+            action_type VARCHAR(50) NOT NULL,
+            entity_type VARCHAR(30) NOT NULL,
+            entity_id INTEGER,
+            details JSON,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            CONSTRAINT action_logs_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at);
+        ALTER SEQUENCE action_logs_id_seq OWNED BY action_logs.id;
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'task_logs'::regclass) THEN
+        ALTER TABLE task_logs RENAME TO task_logs_unpartitioned;
+        ALTER INDEX task_logs_pkey RENAME TO task_logs_unpartitioned_pkey;
+        DROP INDEX IF EXISTS ix_task_logs_id, ix_task_logs_task_id, ix_task_logs_user_id,
+            ix_task_logs_action, ix_task_logs_created_at, idx_task_logs_task_created;
+
+        CREATE TABLE task_logs (
+            id INTEGER NOT NULL DEFAULT nextval('task_logs_id_seq'),
+            task_id INTEGER NOT NULL REFERENCES tasks (id) ON DELETE CASCADE,
+            user_id INTEGER REFERENCES users (id),
+            action VARCHAR(50) NOT NULL,
+            old_status taskstatus,
+            new_status taskstatus,
+            details JSON,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            CONSTRAINT task_logs_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at);
+        ALTER SEQUENCE task_logs_id_seq OWNED BY task_logs.id;
+    END IF;
+END $$;
+
+-- Секции по месяцам: от самой старой записи до трёх месяцев вперёд,
+-- и секция DEFAULT на случай записи вне созданных месяцев.
+-- Дальше секции заранее создаёт db/log_partitions.py.
+DO $$
+DECLARE
+    tbl TEXT;
+    legacy TEXT;
+    columns TEXT;
+    first_month TIMESTAMP WITH TIME ZONE;
+    month TIMESTAMP WITH TIME ZONE;
+BEGIN
+    FOREACH tbl IN ARRAY ARRAY['action_logs', 'task_logs'] LOOP
+        legacy := tbl || '_unpartitioned';
+        first_month := date_trunc('month', now());
+        IF to_regclass(legacy) IS NOT NULL THEN
+            EXECUTE format('UPDATE %I SET created_at = now() WHERE created_at IS NULL', legacy);
+            EXECUTE format('SELECT date_trunc(''month'', least(min(created_at), $1)) FROM %I', legacy)
+                INTO first_month USING first_month;
+        END IF;
+
+        month := first_month;
+        WHILE month <= now() + interval '3 months' LOOP
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                tbl || '_' || to_char(month, 'YYYY_MM'), tbl,
+                month, month + interval '1 month'
+            );
+            month := month + interval '1 month';
+        END LOOP;
+        EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF %I DEFAULT', tbl || '_default', tbl);
+
+        IF to_regclass(legacy) IS NOT NULL THEN
+            columns := CASE tbl
+                WHEN 'action_logs' THEN 'id, user_id, action_type, entity_type, entity_id, details, created_at'
+                ELSE 'id, task_id, user_id, action, old_status, new_status, details, created_at'
+            END;
+            EXECUTE format('INSERT INTO %I (%s) SELECT %s FROM %I', tbl, columns, columns, legacy);
+            EXECUTE format('DROP TABLE %I', legacy);
+        END IF;
+    END LOOP;
+END $$;
+
+-- Индексы на секционированных таблицах создаются в каждой секции, поэтому
+-- дубликаты не переносятся: id — первый столбец первичного ключа (id, created_at),
+-- task_id — префикс idx_task_logs_task_created, по created_at — один индекс.
+CREATE INDEX IF NOT EXISTS ix_action_logs_user_id ON action_logs (user_id);
+CREATE INDEX IF NOT EXISTS ix_action_logs_action_type ON action_logs (action_type);
+CREATE INDEX IF NOT EXISTS ix_action_logs_entity_id ON action_logs (entity_id);
+CREATE INDEX IF NOT EXISTS idx_action_logs_time ON action_logs (created_at);
+CREATE INDEX IF NOT EXISTS idx_action_logs_type_entity_created
+    ON action_logs (action_type, entity_type, entity_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS ix_task_logs_user_id ON task_logs (user_id);
+CREATE INDEX IF NOT EXISTS ix_task_logs_action ON task_logs (action);
+CREATE INDEX IF NOT EXISTS ix_task_logs_created_at ON task_logs (created_at);
+CREATE INDEX IF NOT EXISTS idx_task_logs_task_created ON task_logs (task_id, created_at);
+
+-- Представление из 0005 заново — на секционированных таблицах
+CREATE OR REPLACE VIEW audit_events AS
+SELECT
+    'action'::varchar(10) AS source,
+    id,
+    user_id,
+    action_type,
+    entity_type,
+    entity_id,
+    NULL::taskstatus AS old_status,
+    NULL::taskstatus AS new_status,
+    details,
+    created_at
+FROM action_logs
+UNION ALL
+SELECT
+    'task'::varchar(10) AS source,
+    id,
+    user_id,
+    action AS action_type,
+    'task'::varchar(30) AS entity_type,
+    task_id AS entity_id,
+    old_status,
+    new_status,
+    details,
+    created_at
+FROM task_logs;
@@ -0,0 +1,17 @@
+-- Номер задачи выдаёт последовательность (TaskQueries.create_task), а не
+-- max(task_number) + 1 с повторами при конфликте: одновременные создания
+-- задач больше не получают один и тот же номер.
+-- Последовательность продолжает с наибольшего номера T-x / TASK-x.
+CREATE SEQUENCE IF NOT EXISTS task_number_seq;
+
+DO $$
+DECLARE
+    max_number BIGINT;
+BEGIN
+    SELECT max(substring(task_number FROM '^(?:T|TASK)-([0-9]+)$')::bigint)
+        INTO max_number
+        FROM tasks;
+    IF max_number IS NOT NULL AND max_number >= (SELECT last_value FROM task_number_seq) THEN
+        PERFORM setval('task_number_seq', max_number);
+    END IF;
+END $$;
@@ -0,0 +1,299 @@
+"""
+Версионные миграции схемы БД.
+
+Миграции — SQL-файлы db/migrations/versions/NNNN_название.sql, применяются
+по возрастанию номера, каждая один раз; применённые версии записываются в
+таблицу schema_version. Номера только растут: новая миграция получает номер
+больше последнего.
+
+Скрипты должны быть идемпотентными (IF NOT EXISTS, проверки в DO-блоках):
+базовая версия применяется и к новой базе, и к базе, созданной до появления
+schema_version.
+
+Обычный скрипт выполняется в одной транзакции вместе с записью версии,
+с lock_timeout, чтобы ALTER TABLE не вставал в очередь за долгими
+транзакциями и не блокировал бота. Скрипт с CREATE INDEX CONCURRENTLY
+выполняется вне транзакции, по одному оператору; недостроенный индекс от
+прерванной попытки удаляется перед повтором.
+
+При старте бота выполняется один запрос — номер последней применённой
+версии. Остальное (create_all для недостающих таблиц, блокировка от
+параллельного запуска нескольких экземпляров, сами миграции) — только если
+есть неприменённые миграции.
+
+При старте бота в транзакции миграции установлен параметр
+migrator.startup = 'on'. Миграция, которой нужна долгая блокировка
+(например, перенос всех строк таблицы), проверяет его и отказывается
+выполняться при старте: её запускают вручную, в окно обслуживания.
+
+Запуск отдельно от бота (например, при деплое):
+    python -m db.migrator status
+    python -m db.migrator upgrade
+"""
+import asyncio
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from Data.config import MIGRATION_LOCK_TIMEOUT
+from db.engine import engine as default_engine
+from db.models import Base
+from log import logger
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations" / "versions"
+
+# Ключ pg_advisory_lock: одновременно миграции выполняет только один экземпляр бота
+MIGRATION_LOCK_KEY = 0x5441534B
+
+_FILE_RE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+_DOLLAR_TAG_RE = re.compile(r"\$(?:[A-Za-z_]\w*)?\$")
+_CONCURRENTLY_RE = re.compile(r"\bCONCURRENTLY\b", re.IGNORECASE)
+_CREATE_INDEX_CONCURRENTLY_RE = re.compile(
+    r"^\s*CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+\"?(\w+)\"?",
+    re.IGNORECASE,
+)
+
+_UNDEFINED_TABLE = "42P01"
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    statements: List[str]
+
+    @property
+    def concurrent(self) -> bool:
+        """Скрипт нельзя выполнять в транзакции (CREATE/DROP INDEX CONCURRENTLY)"""
+        return any(_CONCURRENTLY_RE.search(statement) for statement in self.statements)
+
+
+def split_statements(sql: str) -> List[str]:
+    """
+    Разбить SQL-скрипт на операторы по «;».
+
+    Учитывает строки в кавычках, $$-блоки и комментарии; комментарии отбрасываются.
+    """
+    statements: List[str] = []
+    buffer: List[str] = []
+    i, length = 0, len(sql)
+
+    while i < length:
+        if sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = length if end == -1 else end
+            continue
+        if sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = length if end == -1 else end + 2
+            continue
+
+        char = sql[i]
+        if char in ("'", '"'):
+            end = i + 1
+            while True:
+                end = sql.find(char, end)
+                if end == -1:
+                    end = length
+                    break
+                if sql.startswith(char * 2, end):
+                    end += 2
+                    continue
+                end += 1
+                break
+            buffer.append(sql[i:end])
+            i = end
+            continue
+        if char == "$":
+            match = _DOLLAR_TAG_RE.match(sql, i)
+            if match:
+                end = sql.find(match.group(0), match.end())
+                end = length if end == -1 else end + len(match.group(0))
+                buffer.append(sql[i:end])
+                i = end
+                continue
+        if char == ";":
+            statement = "".join(buffer).strip()
+            if statement:
+                statements.append(statement)
+            buffer = []
+            i += 1
+            continue
+
+        buffer.append(char)
+        i += 1
+
+    statement = "".join(buffer).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def load_migrations(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """Миграции из каталога по возрастанию версии"""
+    migrations = {}
+    for path in sorted(directory.glob("*.sql")):
+        match = _FILE_RE.match(path.name)
+        if not match:
+            raise ValueError(f"Имя миграции {path.name} не соответствует шаблону NNNN_название.sql")
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Две миграции с версией {version}: {migrations[version].name} и {match.group(2)}")
+        migrations[version] = Migration(version, match.group(2), split_statements(path.read_text(encoding="utf-8")))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+async def current_version(engine: AsyncEngine = default_engine) -> int:
+    """Последняя применённая версия (0 — миграции ещё не применялись)"""
+    async with engine.connect() as conn:
+        try:
+            return (await conn.execute(text("SELECT max(version) FROM schema_version"))).scalar() or 0
+        except DBAPIError as e:
+            if getattr(e.orig, "sqlstate", None) == _UNDEFINED_TABLE:
+                return 0
+            raise
+
+
+async def _applied_versions(conn: AsyncConnection) -> Set[int]:
+    return set((await conn.execute(text("SELECT version FROM schema_version"))).scalars())
+
+
+async def _record(conn: AsyncConnection, migration: Migration, started: float) -> None:
+    await conn.execute(
+        text(
+            "INSERT INTO schema_version (version, name, duration_ms) VALUES (:version, :name, :duration_ms) "
+            "ON CONFLICT (version) DO NOTHING"
+        ),
+        {"version": migration.version, "name": migration.name,
+         "duration_ms": int((time.perf_counter() - started) * 1000)},
+    )
+
+
+async def _apply_in_transaction(engine: AsyncEngine, migration: Migration, startup: bool = False) -> None:
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql(f"SET LOCAL lock_timeout = '{MIGRATION_LOCK_TIMEOUT}s'")
+        if startup:
+            await conn.exec_driver_sql("SET LOCAL migrator.startup = 'on'")
+        for statement in migration.statements:
+            await conn.exec_driver_sql(statement)
+        await _record(conn, migration, started)
+
+
+async def _apply_concurrently(conn: AsyncConnection, migration: Migration) -> None:
+    """conn — в режиме AUTOCOMMIT: каждый оператор выполняется отдельно"""
+    started = time.perf_counter()
+    for statement in migration.statements:
+        match = _CREATE_INDEX_CONCURRENTLY_RE.match(statement)
+        if match:
+            valid = (await conn.execute(text(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name"
+            ), {"name": match.group(1)})).scalar()
+            if valid:
+                # Индекс уже создан по моделям (create_all); на секционированной
+                # таблице CONCURRENTLY не выполнится даже с IF NOT EXISTS
+                continue
+            if valid is not None:
+                # Прерванный CREATE INDEX CONCURRENTLY оставляет невалидный индекс,
+                # который IF NOT EXISTS молча пропустил бы
+                logger.warning(f"⚠️ Миграция {migration.version}: удаляю недостроенный индекс {match.group(1)}")
+                await conn.exec_driver_sql(f'DROP INDEX CONCURRENTLY IF EXISTS "{match.group(1)}"')
+        await conn.exec_driver_sql(statement)
+    await _record(conn, migration, started)
+
+
+async def upgrade_schema(engine: AsyncEngine = default_engine, startup: bool = False) -> int:
+    """
+    Применить неприменённые миграции; возвращает их количество.
+
+    Если база уже на последней версии — один запрос и выход.
+    startup=True — вызов при старте бота: миграции с долгой блокировкой
+    отказываются выполняться (см. migrator.startup).
+    """
+    migrations = load_migrations()
+    latest = migrations[-1].version if migrations else 0
+    if await current_version(engine) >= latest:
+        logger.info(f"ℹ️ Схема БД актуальна (версия {latest})")
+        return 0
+
+    applied_count = 0
+    async with engine.connect() as lock_conn:
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        await lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            await lock_conn.exec_driver_sql(
+                "CREATE TABLE IF NOT EXISTS schema_version ("
+                "version INTEGER PRIMARY KEY, "
+                "name VARCHAR(255) NOT NULL, "
+                "applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(), "
+                "duration_ms INTEGER)"
+            )
+            # Другой экземпляр мог применить миграции, пока мы ждали блокировку
+            applied = await _applied_versions(lock_conn)
+            pending = [migration for migration in migrations if migration.version not in applied]
+            if not pending:
+                return 0
+
+            # Недостающие таблицы создаются по моделям; существующие не трогаются
+            async with engine.begin() as conn:
+                await conn.exec_driver_sql(f"SET LOCAL lock_timeout = '{MIGRATION_LOCK_TIMEOUT}s'")
+                await conn.run_sync(Base.metadata.create_all)
+
+            for migration in pending:
+                logger.info(f"🔄 Миграция {migration.version:04d}_{migration.name}...")
+                if migration.concurrent:
+                    await _apply_concurrently(lock_conn, migration)
+                else:
+                    await _apply_in_transaction(engine, migration, startup)
+                applied_count += 1
+                logger.info(f"✅ Миграция {migration.version:04d}_{migration.name} применена")
+                print(f"✅ Миграция {migration.version:04d}_{migration.name} применена")
+        finally:
+            await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+    return applied_count
+
+
+async def check_schema(engine: AsyncEngine = default_engine) -> None:
+    """Проверить, что миграции применены (когда бот сам их не выполняет)"""
+    migrations = load_migrations()
+    latest = migrations[-1].version if migrations else 0
+    version = await current_version(engine)
+    if version < latest:
+        raise RuntimeError(
+            f"Схема БД устарела: версия {version}, нужна {latest}. Выполните: python -m db.migrator upgrade"
+        )
+
+
+async def _status(engine: AsyncEngine) -> None:
+    applied: Set[int] = set()
+    if await current_version(engine):
+        async with engine.connect() as conn:
+            applied = await _applied_versions(conn)
+    for migration in load_migrations():
+        mark = "✅" if migration.version in applied else "⏳"
+        mode = " (CONCURRENTLY)" if migration.concurrent else ""
+        print(f"{mark} {migration.version:04d}_{migration.name}{mode}")
+
+
+async def _main(command: Optional[str]) -> None:
+    try:
+        if command == "upgrade":
+            applied = await upgrade_schema()
+            print(f"Применено миграций: {applied}")
+        else:
+            await _status(default_engine)
+    finally:
+        await default_engine.dispose()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 or (len(sys.argv) == 2 and sys.argv[1] not in ("status", "upgrade")):
+        sys.exit("Использование: python -m db.migrator [status|upgrade]")
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) == 2 else "status"))
@@ -1,7 +1,7 @@
 from sqlalchemy import (
     Column, Integer, String, DateTime, Text, Boolean, ForeignKey,
     Enum, DECIMAL, Index, UniqueConstraint, CheckConstraint, SmallInteger,
-    Table, JSON, Computed, BigInteger
+    Table, JSON, Computed, BigInteger, MetaData, Sequence
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, validates
@@ -98,19 +98,19 @@ executor_buyer_assignments = Table(
 class User(Base):
     __tablename__ = "users"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     telegram_id = Column(BigInteger, unique=True, index=True, nullable=False)
     username = Column(String(32), nullable=True)
     first_name = Column(String(64), nullable=True)
     last_name = Column(String(64), nullable=True)
-    role = Column(Enum(UserRole, name='user_role'), nullable=True, index=True)
+    role = Column(Enum(UserRole, name='user_role'), nullable=True)
 
-    direction = Column(Enum(DirectionType, name='direction_type'), nullable=True, index=True)
-    is_active = Column(Boolean, default=True, nullable=False, index=True)
-    is_available = Column(Boolean, default=True, nullable=False, index=True)
+    direction = Column(Enum(DirectionType, name='direction_type'), nullable=True)
+    is_active = Column(Boolean, default=True, nullable=False)
+    is_available = Column(Boolean, default=True, nullable=False)
     current_load = Column(SmallInteger, default=0)
     load_level = Column(Enum(ExecutorLoad, name='executor_load'),
-                        default=ExecutorLoad.FREE, index=True)
+                        default=ExecutorLoad.FREE)
 
     completed_tasks = Column(Integer, default=0)
     avg_rating = Column(DECIMAL(3, 2), default=0.00)
@@ -118,7 +118,7 @@ class User(Base):
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
-    last_activity = Column(DateTime(timezone=True), default=func.now(), index=True)
+    last_activity = Column(DateTime(timezone=True), default=func.now())
     deleted_at = Column(DateTime(timezone=True), nullable=True)
 
     created_tasks = relationship("Task", foreign_keys="Task.created_by_id",
@@ -140,7 +140,6 @@ class User(Base):
     )
 
     __table_args__ = (
-        Index("idx_users_telegram_active", "telegram_id", "is_active"),
         Index("idx_users_direction_load", "direction", "load_level"),
         Index("idx_users_role_available", "role", "is_available"),
         CheckConstraint("current_load >= 0", name="check_load_min"),
@@ -159,22 +158,27 @@ class Skill(Base):
     executors = relationship("User", secondary=executor_skills, back_populates="skills")
 
 
+# Номера задач T-<n>: nextval выдаёт номер атомарно, без гонки между
+# одновременными create_task (миграция 0007 продолжает с последнего номера)
+task_number_seq = Sequence("task_number_seq", metadata=Base.metadata)
+
+
 class Task(Base):
     __tablename__ = "tasks"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     task_number = Column(String(20), unique=True, index=True, nullable=False)
 
     title = Column(String(200), nullable=False)
     description = Column(Text, nullable=True)
     direction = Column(Enum(DirectionType), nullable=False, index=True)
-    priority = Column(SmallInteger, default=2, index=True)
-    status = Column(Enum(TaskStatus), default=TaskStatus.PENDING, index=True)
+    priority = Column(SmallInteger, default=2)
+    status = Column(Enum(TaskStatus), default=TaskStatus.PENDING)
 
-    created_by_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
-    executor_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    created_by_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    executor_id = Column(Integer, ForeignKey("users.id"), nullable=True)
 
-    deadline = Column(DateTime(timezone=True), nullable=True, index=True)
+    deadline = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     started_at = Column(DateTime(timezone=True), nullable=True)
@@ -189,6 +193,9 @@ class Task(Base):
     tags = Column(JSON, nullable=True)
     requirements = Column(JSON, nullable=True)
 
+    # Версия строки: ORM добавляет WHERE version = :old к UPDATE и увеличивает её
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
     creator = relationship("User", foreign_keys=[created_by_id], back_populates="created_tasks")
     executor = relationship("User", foreign_keys=[executor_id], back_populates="assigned_tasks")
     files = relationship("TaskFile", back_populates="task", lazy="dynamic")
@@ -198,15 +205,22 @@ class Task(Base):
 
     __table_args__ = (
         Index("idx_tasks_active", "status", "priority", "deadline"),
-        Index("idx_tasks_executor_active", "executor_id", "status"),
         Index("idx_tasks_creator_date", "created_by_id", "created_at"),
         Index("idx_tasks_creator_status_date", "created_by_id", "status", "created_at"),
         Index("idx_tasks_executor_status_date", "executor_id", "status", "created_at"),
         Index("idx_tasks_status_creator_date", "status", "created_by_id", "created_at"),
+        Index("idx_tasks_open_creator_created", created_by_id, created_at.desc(),
+              postgresql_where=status.in_([TaskStatus.PENDING, TaskStatus.IN_PROGRESS])),
+        Index("idx_tasks_open_executor_created", executor_id, created_at.desc(),
+              postgresql_where=status.in_([TaskStatus.PENDING, TaskStatus.IN_PROGRESS])),
+        Index("idx_tasks_unassigned_creator_created", created_by_id, created_at.desc(),
+              postgresql_where=(status == TaskStatus.PENDING) & executor_id.is_(None)),
         CheckConstraint("rating >= 1 AND rating <= 5", name="check_rating_range"),
         CheckConstraint("priority >= 1 AND priority <= 4", name="check_priority_range"),
     )
 
+    __mapper_args__ = {"version_id_col": version}
+
 
 class TaskFile(Base):
     __tablename__ = "task_files"
@@ -228,18 +242,22 @@ class TaskFile(Base):
     task = relationship("Task", back_populates="files")
     uploader = relationship("User")
 
+    __table_args__ = (
+        Index("idx_task_files_task_active", task_id, created_at, postgresql_where=is_deleted == False),
+    )
+
 
 class Message(Base):
     __tablename__ = "messages"
 
-    id = Column(Integer, primary_key=True, index=True)
-    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False, index=True)
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False)
     sender_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     content = Column(Text, nullable=False)
     message_type = Column(Enum(MessageType), default=MessageType.TEXT)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    is_read = Column(Boolean, default=False, index=True)
+    is_read = Column(Boolean, default=False)
     read_at = Column(DateTime(timezone=True), nullable=True)
 
     file_id = Column(Integer, ForeignKey("task_files.id"), nullable=True)
@@ -248,6 +266,11 @@ class Message(Base):
     sender = relationship("User", back_populates="messages")
     file = relationship("TaskFile")
 
+    __table_args__ = (
+        Index("idx_messages_task_created", "task_id", "created_at"),
+        Index("idx_messages_task_unread", task_id, created_at, postgresql_where=is_read == False),
+    )
+
 
 class TaskCorrection(Base):
     """Новая таблица для правок по задаче"""
@@ -265,39 +288,80 @@ class TaskCorrection(Base):
 
 
 class TaskLog(Base):
+    """Журнал задачи; секционирован по месяцам created_at (db/log_partitions.py)"""
     __tablename__ = "task_logs"
 
-    id = Column(Integer, primary_key=True, index=True)
-    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # Поиск по задаче — idx_task_logs_task_created (task_id, created_at)
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
     action = Column(String(50), nullable=False, index=True)
     old_status = Column(Enum(TaskStatus), nullable=True)
     new_status = Column(Enum(TaskStatus), nullable=True)
     details = Column(JSON, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    # Ключ секционирования входит в первичный ключ
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), index=True)
 
     task = relationship("Task", back_populates="logs")
     user = relationship("User")
 
+    __table_args__ = (
+        Index("idx_task_logs_task_created", "task_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
 
 class ActionLog(Base):
+    """Журнал действий; секционирован по месяцам created_at (db/log_partitions.py)"""
     __tablename__ = "action_logs"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete='SET NULL'), nullable=True, index=True)
     action_type = Column(String(50), nullable=False, index=True)
     entity_type = Column(String(30), nullable=False)
     entity_id = Column(Integer, nullable=True, index=True)
     details = Column(JSON, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    # Индекс по времени — idx_action_logs_time
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
 
     __table_args__ = (
         Index('idx_action_logs_time', 'created_at'),
+        Index('idx_action_logs_type_entity_created', action_type, entity_type, entity_id, created_at.desc()),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
 
     user = relationship("User", back_populates="action_logs")
 
 
+# Представление audit_events (миграция 0005): action_logs и task_logs одной лентой.
+# Своя MetaData — чтобы create_all не создал на его месте таблицу.
+audit_events = Table(
+    "audit_events",
+    MetaData(),
+    Column("source", String(10), primary_key=True),  # 'action' | 'task'
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer),
+    Column("action_type", String(50)),
+    Column("entity_type", String(30)),
+    Column("entity_id", Integer),
+    Column("old_status", Enum(TaskStatus)),
+    Column("new_status", Enum(TaskStatus)),
+    Column("details", JSON),
+    Column("created_at", DateTime(timezone=True)),
+)
+
+
+class AuditEvent(Base):
+    """
+    Событие журнала, только для чтения.
+
+    События задачи хранятся в task_logs (одна строка на событие), остальные
+    действия — в action_logs; представление показывает их как одну ленту
+    в формате ActionLog (для задач entity_type = 'task', entity_id = task_id).
+    """
+    __table__ = audit_events
+
+
 class TaskRejection(Base):
     __tablename__ = "task_rejections"
 
@@ -311,6 +375,10 @@ class TaskRejection(Base):
     task = relationship("Task")
     executor = relationship("User")
 
+    __table_args__ = (
+        Index("idx_task_rejections_task_executor", "task_id", "executor_id"),
+    )
+
 
 class NotificationQueue(Base):
     """Новая таблица для очереди уведомлений"""
@@ -484,3 +552,21 @@ class ChatRequest(Base):
     chat = relationship("Chat", foreign_keys=[chat_db_id])
     sender = relationship("User", foreign_keys=[sender_id])
     completed_by_user = relationship("User", foreign_keys=[completed_by_user_id])
+
+    __table_args__ = (
+        Index("idx_chat_requests_sender_completed_created", "sender_id", "is_completed", "created_at"),
+    )
+
+
+class FsmState(Base):
+    """Состояния FSM aiogram (общие для всех экземпляров бота)."""
+
+    __tablename__ = "fsm_states"
+
+    # Ключ строится aiogram KeyBuilder: fsm:<bot_id>:<chat_id>:<user_id>:<destiny>
+    key = Column(String(255), primary_key=True)
+    state = Column(String(255), nullable=True)
+    # Компактный JSON (без пробелов) — чтобы строки оставались маленькими
+    data = Column(Text, nullable=True)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
@@ -1,7 +1,7 @@
 """Модуль запросов к базе данных"""
 
 from .user_queries import UserQueries
-from .task_queries import TaskQueries
+from .task_queries import TaskQueries, TaskVersionConflict
 from .message_queries import MessageQueries
 from .file_queries import FileQueries
 from .log_queries import LogQueries
@@ -9,10 +9,13 @@ from .channel_queries import ChannelQueries
 from .chat_queries import ChatQueries
 from .chat_access_queries import ChatAccessQueries
 from .chat_request_queries import ChatRequestQueries
+from .pagination import Page, paginate
+from .task_transitions import TaskTransitions, TransitionOutcome, TransitionResult
 
 __all__ = [
     "UserQueries",
     "TaskQueries",
+    "TaskVersionConflict",
     "MessageQueries",
     "FileQueries",
     "LogQueries",
@@ -20,5 +23,10 @@ __all__ = [
     "ChatQueries",
     "ChatAccessQueries",
     "ChatRequestQueries",
+    "Page",
+    "paginate",
+    "TaskTransitions",
+    "TransitionOutcome",
+    "TransitionResult",
 ]
 
@@ -1,8 +1,11 @@
 """Запросы для работы с каналами"""
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from db.models import Channel
+from db.queries.pagination import Page, count_rows, paginate
+from db.queries.upsert import inserted_flag
 from log import logger
 
 
@@ -42,67 +45,60 @@ class ChannelQueries:
         can_manage_chat: bool = False,
         can_manage_video_chats: bool = False,
     ) -> Optional[Channel]:
-        """Добавить или обновить канал"""
-        try:
-            result = await session.execute(
-                select(Channel).where(Channel.channel_id == channel_id)
-            )
-            existing_channel = result.scalar_one_or_none()
-            
-            if existing_channel:
-                # Обновляем существующий канал
-                if channel_name:
-                    existing_channel.channel_name = channel_name
-                if bot_status:
-                    existing_channel.bot_status = bot_status
-                if created_by_id:
-                    existing_channel.created_by_id = created_by_id
-                existing_channel.is_active = True
-                existing_channel.can_post_messages = can_post_messages
-                existing_channel.can_edit_messages = can_edit_messages
-                existing_channel.can_delete_messages = can_delete_messages
-                existing_channel.can_restrict_members = can_restrict_members
-                existing_channel.can_promote_members = can_promote_members
-                existing_channel.can_change_info = can_change_info
-                existing_channel.can_invite_users = can_invite_users
-                existing_channel.can_pin_messages = can_pin_messages
-                existing_channel.can_manage_chat = can_manage_chat
-                existing_channel.can_manage_video_chats = can_manage_video_chats
-                
-                await session.commit()
-                await session.refresh(existing_channel)
-                logger.info(f"Обновлен канал {channel_id} ({channel_name})")
-                return existing_channel
-            
-            # Создаем новый канал
-            channel = Channel(
+        """
+        Добавить или обновить канал одним INSERT ... ON CONFLICT DO UPDATE.
+
+        Одновременные обновления одного канала не конфликтуют: строку
+        создаёт первый запрос, остальные обновляют её. Название, статус
+        и создатель перезаписываются, только если переданы.
+        """
+        permissions = dict(
+            can_post_messages=can_post_messages,
+            can_edit_messages=can_edit_messages,
+            can_delete_messages=can_delete_messages,
+            can_restrict_members=can_restrict_members,
+            can_promote_members=can_promote_members,
+            can_change_info=can_change_info,
+            can_invite_users=can_invite_users,
+            can_pin_messages=can_pin_messages,
+            can_manage_chat=can_manage_chat,
+            can_manage_video_chats=can_manage_video_chats,
+        )
+        changes = dict(permissions, is_active=True, updated_at=func.now())
+        if channel_name:
+            changes["channel_name"] = channel_name
+        if bot_status:
+            changes["bot_status"] = bot_status
+        if created_by_id:
+            changes["created_by_id"] = created_by_id
+        
+        statement = (
+            insert(Channel)
+            .values(
                 channel_id=channel_id,
                 channel_name=channel_name,
                 created_by_id=created_by_id,
                 is_active=True,
                 bot_status=bot_status or "administrator",
-                can_post_messages=can_post_messages,
-                can_edit_messages=can_edit_messages,
-                can_delete_messages=can_delete_messages,
-                can_restrict_members=can_restrict_members,
-                can_promote_members=can_promote_members,
-                can_change_info=can_change_info,
-                can_invite_users=can_invite_users,
-                can_pin_messages=can_pin_messages,
-                can_manage_chat=can_manage_chat,
-                can_manage_video_chats=can_manage_video_chats,
+                **permissions,
             )
-            
-            session.add(channel)
+            .on_conflict_do_update(index_elements=[Channel.channel_id], set_=changes)
+            .returning(Channel, inserted_flag())
+        )
+        try:
+            result = await session.execute(statement, execution_options={"populate_existing": True})
+            channel, inserted = result.one()
             await session.commit()
-            await session.refresh(channel)
-            logger.info(f"Добавлен новый канал {channel_id} ({channel_name})")
-            return channel
-            
         except Exception as e:
             await session.rollback()
             logger.error(f"Ошибка при добавлении/обновлении канала: {e}")
             return None
+        
+        if inserted:
+            logger.info(f"Добавлен новый канал {channel_id} ({channel_name})")
+        else:
+            logger.info(f"Обновлен канал {channel_id} ({channel_name})")
+        return channel
     
     @staticmethod
     async def get_all_active_channels(session: AsyncSession) -> List[Channel]:
@@ -113,10 +109,7 @@ class ChannelQueries:
     async def get_all_channels(session: AsyncSession, active_only: bool = True, page: int = 1, per_page: int = 10) -> List[Channel]:
         """Получить все каналы с пагинацией"""
         try:
-            query = select(Channel)
-            if active_only:
-                query = query.where(Channel.is_active == True)
-            query = query.order_by(Channel.created_at.desc())
+            query = ChannelQueries._channels_query(active_only)
             query = query.offset((page - 1) * per_page).limit(per_page)
             
             result = await session.execute(query)
@@ -126,16 +119,27 @@ class ChannelQueries:
             logger.error(f"Ошибка при получении каналов: {e}")
             return []
     
+    @staticmethod
+    def _channels_query(active_only: bool = True):
+        query = select(Channel)
+        if active_only:
+            query = query.where(Channel.is_active == True)
+        return query.order_by(Channel.created_at.desc())
+    
+    @staticmethod
+    async def get_channels_page(session: AsyncSession, active_only: bool = True, page: int = 1, per_page: int = 10) -> Page:
+        """Страница каналов и их общее число одним запросом"""
+        try:
+            return await paginate(session, ChannelQueries._channels_query(active_only), page, per_page)
+        except Exception as e:
+            logger.error(f"Ошибка при получении каналов: {e}")
+            return Page([], 0)
+    
     @staticmethod
     async def count_channels(session: AsyncSession, active_only: bool = True) -> int:
         """Подсчитать количество каналов"""
         try:
-            query = select(Channel)
-            if active_only:
-                query = query.where(Channel.is_active == True)
-            result = await session.execute(query)
-            channels = result.scalars().all()
-            return len(list(channels))
+            return await count_rows(session, ChannelQueries._channels_query(active_only))
         except Exception as e:
             logger.error(f"Ошибка при подсчете каналов: {e}")
             return 0
@@ -5,6 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from db.models import Chat, buyer_chat_access
+from db.queries.pagination import Page, paginate
 from log import logger
 
 
@@ -88,6 +89,15 @@ class ChatAccessQueries:
     ) -> List[Chat]:
         """Список чатов, доступных баеру."""
         result = await session.execute(
+            ChatAccessQueries._accessible_chats_query(buyer_id)
+            .offset((page - 1) * per_page)
+            .limit(per_page)
+        )
+        return list(result.scalars().all())
+
+    @staticmethod
+    def _accessible_chats_query(buyer_id: int):
+        return (
             select(Chat)
             .join(buyer_chat_access, buyer_chat_access.c.chat_id == Chat.id)
             .where(
@@ -95,8 +105,15 @@ class ChatAccessQueries:
                 Chat.bot_status.in_(["member", "administrator"]),
             )
             .order_by(Chat.created_at.desc())
-            .offset((page - 1) * per_page)
-            .limit(per_page)
         )
-        return list(result.scalars().all())
+
+    @staticmethod
+    async def get_accessible_chats_page(
+        session: AsyncSession,
+        buyer_id: int,
+        page: int = 1,
+        per_page: int = 10,
+    ) -> Page:
+        """Страница доступных баеру чатов и их общее число одним запросом."""
+        return await paginate(session, ChatAccessQueries._accessible_chats_query(buyer_id), page, per_page)
 
@@ -1,8 +1,11 @@
 """Запросы для работы с чатами"""
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from db.models import Chat
+from db.queries.pagination import Page, count_rows, paginate
+from db.queries.upsert import inserted_flag
 from log import logger
 
 
@@ -27,73 +30,62 @@ class ChatQueries:
         can_manage_chat: bool = False,
         can_manage_video_chats: bool = False,
     ) -> Optional[Chat]:
-        """Добавить или обновить чат"""
-        try:
-            # Проверяем, существует ли уже такой чат
-            result = await session.execute(
-                select(Chat).where(Chat.chat_id == chat_id)
-            )
-            existing_chat = result.scalar_one_or_none()
-            
-            if existing_chat:
-                # Обновляем существующий чат
-                existing_chat.chat_type = chat_type
-                existing_chat.chat_title = chat_title
-                if bot_status:
-                    existing_chat.bot_status = bot_status
-                existing_chat.can_post_messages = can_post_messages
-                existing_chat.can_edit_messages = can_edit_messages
-                existing_chat.can_delete_messages = can_delete_messages
-                existing_chat.can_restrict_members = can_restrict_members
-                existing_chat.can_promote_members = can_promote_members
-                existing_chat.can_change_info = can_change_info
-                existing_chat.can_invite_users = can_invite_users
-                existing_chat.can_pin_messages = can_pin_messages
-                existing_chat.can_manage_chat = can_manage_chat
-                existing_chat.can_manage_video_chats = can_manage_video_chats
-                
-                await session.commit()
-                await session.refresh(existing_chat)
-                logger.info(f"Обновлен чат {chat_id} ({chat_title})")
-                return existing_chat
-            
-            # Создаем новый чат
-            chat = Chat(
+        """
+        Добавить или обновить чат одним INSERT ... ON CONFLICT DO UPDATE.
+
+        Одновременные обновления одного чата (пачки my_chat_member) не
+        конфликтуют: строку создаёт первый запрос, остальные обновляют её.
+        Статус бота перезаписывается, только если передан.
+        """
+        permissions = dict(
+            can_post_messages=can_post_messages,
+            can_edit_messages=can_edit_messages,
+            can_delete_messages=can_delete_messages,
+            can_restrict_members=can_restrict_members,
+            can_promote_members=can_promote_members,
+            can_change_info=can_change_info,
+            can_invite_users=can_invite_users,
+            can_pin_messages=can_pin_messages,
+            can_manage_chat=can_manage_chat,
+            can_manage_video_chats=can_manage_video_chats,
+        )
+        changes = dict(permissions, chat_type=chat_type, chat_title=chat_title, updated_at=func.now())
+        if bot_status:
+            changes["bot_status"] = bot_status
+        
+        statement = (
+            insert(Chat)
+            .values(
                 chat_id=chat_id,
                 chat_type=chat_type,
                 chat_title=chat_title,
                 bot_status=bot_status or "member",
-                can_post_messages=can_post_messages,
-                can_edit_messages=can_edit_messages,
-                can_delete_messages=can_delete_messages,
-                can_restrict_members=can_restrict_members,
-                can_promote_members=can_promote_members,
-                can_change_info=can_change_info,
-                can_invite_users=can_invite_users,
-                can_pin_messages=can_pin_messages,
-                can_manage_chat=can_manage_chat,
-                can_manage_video_chats=can_manage_video_chats,
+                **permissions,
             )
-            
-            session.add(chat)
+            .on_conflict_do_update(index_elements=[Chat.chat_id], set_=changes)
+            .returning(Chat, inserted_flag())
+        )
+        try:
+            result = await session.execute(statement, execution_options={"populate_existing": True})
+            chat, inserted = result.one()
             await session.commit()
-            await session.refresh(chat)
-            logger.info(f"Добавлен новый чат {chat_id} ({chat_title})")
-            return chat
-            
         except Exception as e:
             await session.rollback()
             logger.error(f"Ошибка при добавлении/обновлении чата: {e}")
             return None
+        
+        if inserted:
+            logger.info(f"Добавлен новый чат {chat_id} ({chat_title})")
+        else:
+            logger.info(f"Обновлен чат {chat_id} ({chat_title})")
+        return chat
     
     @staticmethod
     async def get_all_chats(session: AsyncSession, page: int = 1, per_page: int = 10) -> List[Chat]:
         """Получить все чаты с пагинацией"""
         try:
             result = await session.execute(
-                select(Chat)
-                .where(Chat.bot_status.in_(["member", "administrator"]))  # Только активные чаты
-                .order_by(Chat.created_at.desc())
+                ChatQueries._active_chats_query()
                 .offset((page - 1) * per_page)
                 .limit(per_page)
             )
@@ -103,16 +95,28 @@ class ChatQueries:
             logger.error(f"Ошибка при получении чатов: {e}")
             return []
     
+    @staticmethod
+    def _active_chats_query():
+        return (
+            select(Chat)
+            .where(Chat.bot_status.in_(["member", "administrator"]))  # Только активные чаты
+            .order_by(Chat.created_at.desc())
+        )
+    
+    @staticmethod
+    async def get_chats_page(session: AsyncSession, page: int = 1, per_page: int = 10) -> Page:
+        """Страница активных чатов и их общее число одним запросом"""
+        try:
+            return await paginate(session, ChatQueries._active_chats_query(), page, per_page)
+        except Exception as e:
+            logger.error(f"Ошибка при получении чатов: {e}")
+            return Page([], 0)
+    
     @staticmethod
     async def count_chats(session: AsyncSession) -> int:
         """Подсчитать количество активных чатов"""
         try:
-            result = await session.execute(
-                select(Chat)
-                .where(Chat.bot_status.in_(["member", "administrator"]))
-            )
-            chats = result.scalars().all()
-            return len(list(chats))
+            return await count_rows(session, ChatQueries._active_chats_query())
         except Exception as e:
             logger.error(f"Ошибка при подсчете чатов: {e}")
             return 0
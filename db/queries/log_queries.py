@@ -4,12 +4,70 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional, Dict
 from datetime import datetime, timedelta, timezone
 
-from db.models import ActionLog, TaskLog
+from db.log_writer import log_writer
+from db.models import ActionLog, AuditEvent, Task, TaskLog
 from log import logger
 
 
 class LogQueries:
-    """Запросы для работы с логами"""
+    """
+    Запросы для работы с логами.
+
+    Журнал пишется через log_event: событие задачи — одна строка в task_logs,
+    остальные действия — строка в action_logs. Общая лента обеих таблиц —
+    представление audit_events (AuditEvent), история задачи — task_logs.
+
+    Таблицы секционированы по месяцам created_at (db/log_partitions.py), поэтому
+    каждый запрос ограничен по времени: за период — с начала периода, история
+    задачи — начиная с суток до её создания. Так читаются только нужные секции.
+    """
+    
+    @staticmethod
+    async def log_event(
+        session: AsyncSession,
+        user_id: Optional[int],
+        action: str,
+        entity_type: str,
+        entity_id: int = None,
+        details: dict = None,
+        old_status = None,
+        new_status = None,
+        immediate: bool = False
+    ):
+        """
+        Записать событие журнала одной строкой.
+
+        Запись уходит в буфер log_writer и пишется в БД фоновой задачей; сессия
+        не коммитится. immediate=True — записать сразу в этой сессии (для записей,
+        которые читаются сразу, в том числе другими репликами).
+        """
+        if entity_type == "task" and entity_id is not None:
+            model = TaskLog
+            values = dict(
+                task_id=entity_id,
+                user_id=user_id,
+                action=action,
+                old_status=old_status,
+                new_status=new_status,
+                details=details
+            )
+        else:
+            model = ActionLog
+            values = dict(
+                user_id=user_id,
+                action_type=action,
+                entity_type=entity_type,
+                entity_id=entity_id,
+                details=details
+            )
+        
+        if log_writer.running and not immediate:
+            await log_writer.submit(model, values)
+        else:
+            session.add(model(**values))
+            await session.commit()
+        
+        logger.info(f"Лог: пользователь {user_id} выполнил {action} на {entity_type} {entity_id or ''}".rstrip())
     
     @staticmethod
     async def create_action_log(
@@ -18,32 +76,30 @@ class LogQueries:
         action_type: str,
         entity_type: str,
         entity_id: int = None,
-        details: dict = None
+        details: dict = None,
+        immediate: bool = False
     ):
-        """Создать лог действия"""
-        log = ActionLog(
-            user_id=user_id,
-            action_type=action_type,
-            entity_type=entity_type,
-            entity_id=entity_id,
-            details=details
+        """Создать лог действия (см. log_event; действие над задачей пишется в task_logs)"""
+        await LogQueries.log_event(
+            session, user_id, action_type, entity_type, entity_id,
+            details=details, immediate=immediate
         )
-        session.add(log)
-        await session.commit()
-        
-        logger.info(f"Лог: пользователь {user_id} выполнил {action_type} на {entity_type}")
     
     @staticmethod
     async def get_user_actions(
         session: AsyncSession,
         user_id: int,
-        limit: int = 50
-    ) -> List[ActionLog]:
-        """Получить действия пользователя"""
+        limit: int = 50,
+        days: int = 90
+    ) -> List[AuditEvent]:
+        """Получить действия пользователя за последние days дней"""
+        await log_writer.flush()
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        
         result = await session.execute(
-            select(ActionLog)
-            .where(ActionLog.user_id == user_id)
-            .order_by(ActionLog.created_at.desc())
+            select(AuditEvent)
+            .where(AuditEvent.user_id == user_id, AuditEvent.created_at >= since)
+            .order_by(AuditEvent.created_at.desc())
             .limit(limit)
         )
         return result.scalars().all()
@@ -53,14 +109,15 @@ class LogQueries:
         session: AsyncSession,
         hours: int = 24,
         limit: int = 100
-    ) -> List[ActionLog]:
+    ) -> List[AuditEvent]:
         """Получить недавние действия"""
+        await log_writer.flush()
         since = datetime.now(timezone.utc) - timedelta(hours=hours)
         
         result = await session.execute(
-            select(ActionLog)
-            .where(ActionLog.created_at >= since)
-            .order_by(ActionLog.created_at.desc())
+            select(AuditEvent)
+            .where(AuditEvent.created_at >= since)
+            .order_by(AuditEvent.created_at.desc())
             .limit(limit)
         )
         return result.scalars().all()
@@ -71,30 +128,67 @@ class LogQueries:
         task_id: int
     ) -> List[TaskLog]:
         """Получить логи задачи"""
+        await log_writer.flush()
         result = await session.execute(
             select(TaskLog)
-            .where(TaskLog.task_id == task_id)
+            .where(TaskLog.task_id == task_id, TaskLog.created_at >= LogQueries._task_history_since(task_id))
             .order_by(TaskLog.created_at)
         )
         return result.scalars().all()
     
+    @staticmethod
+    async def get_last_task_event(
+        session: AsyncSession,
+        task_id: int,
+        action: str
+    ) -> Optional[TaskLog]:
+        """Последнее событие задачи данного типа (индекс task_id, created_at)"""
+        await log_writer.flush()
+        result = await session.execute(
+            select(TaskLog)
+            .where(
+                TaskLog.task_id == task_id,
+                TaskLog.action == action,
+                TaskLog.created_at >= LogQueries._task_history_since(task_id)
+            )
+            .order_by(TaskLog.created_at.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+    
+    @staticmethod
+    def _task_history_since(task_id: int):
+        """
+        Подзапрос: нижняя граница событий задачи — сутки до её создания.
+
+        Task.created_at — время БД, а события из буфера log_writer получают время
+        приложения; запас в сутки не теряет ранние события при расхождении часов,
+        а секции старше месяца создания задачи по-прежнему не читаются.
+        """
+        return (
+            select(Task.created_at - timedelta(days=1))
+            .where(Task.id == task_id)
+            .scalar_subquery()
+        )
+    
     @staticmethod
     async def get_actions_by_type(
         session: AsyncSession,
         action_type: str,
         days: int = 7,
         limit: int = 50
-    ) -> List[ActionLog]:
+    ) -> List[AuditEvent]:
         """Получить действия по типу"""
+        await log_writer.flush()
         since = datetime.now(timezone.utc) - timedelta(days=days)
         
         result = await session.execute(
-            select(ActionLog)
+            select(AuditEvent)
             .where(
-                ActionLog.action_type == action_type,
-                ActionLog.created_at >= since
+                AuditEvent.action_type == action_type,
+                AuditEvent.created_at >= since
             )
-            .order_by(ActionLog.created_at.desc())
+            .order_by(AuditEvent.created_at.desc())
             .limit(limit)
         )
         return result.scalars().all()
@@ -105,18 +199,19 @@ class LogQueries:
         days: int = 7
     ) -> Dict[str, int]:
         """Получить статистику действий"""
+        await log_writer.flush()
         from sqlalchemy import func
         
         since = datetime.now(timezone.utc) - timedelta(days=days)
         
         result = await session.execute(
             select(
-                ActionLog.action_type,
-                func.count(ActionLog.id).label('count')
+                AuditEvent.action_type,
+                func.count().label('count')
             )
-            .where(ActionLog.created_at >= since)
-            .group_by(ActionLog.action_type)
-            .order_by(func.count(ActionLog.id).desc())
+            .where(AuditEvent.created_at >= since)
+            .group_by(AuditEvent.action_type)
+            .order_by(func.count().desc())
         )
         
         stats = {}
@@ -133,19 +228,11 @@ class LogQueries:
         action: str,
         old_status = None,
         new_status = None,
-        details: dict = None
+        details: dict = None,
+        immediate: bool = False
     ):
-        """Создать лог задачи"""
-        log = TaskLog(
-            task_id=task_id,
-            user_id=user_id,
-            action=action,
-            old_status=old_status,
-            new_status=new_status,
-            details=details
+        """Создать лог задачи (см. log_event)"""
+        await LogQueries.log_event(
+            session, user_id, action, "task", task_id,
+            details=details, old_status=old_status, new_status=new_status, immediate=immediate
         )
-        session.add(log)
-        await session.commit()
-        
-        logger.info(f"Лог задачи {task_id}: {action}")
-
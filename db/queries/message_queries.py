@@ -54,6 +54,22 @@ class MessageQueries:
         result = await session.execute(query)
         return result.scalars().all()
     
+    @staticmethod
+    async def get_last_messages(
+        session: AsyncSession,
+        task_id: int,
+        count: int = 3
+    ) -> List[Message]:
+        """Последние count сообщений задачи в хронологическом порядке"""
+        result = await session.execute(
+            select(Message)
+            .options(selectinload(Message.sender))
+            .where(Message.task_id == task_id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(count)
+        )
+        return list(reversed(result.scalars().all()))
+    
     @staticmethod
     async def get_unread_messages(
         session: AsyncSession,
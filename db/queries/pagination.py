@@ -0,0 +1,58 @@
+"""Пагинация: страница и общее число строк за один запрос"""
+from typing import Any, List, NamedTuple, Optional
+
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class Page(NamedTuple):
+    """Страница списка; распаковывается как items, total = await ..."""
+    items: List[Any]
+    total: int
+
+
+async def count_rows(session: AsyncSession, query: Select, max_count: Optional[int] = None) -> int:
+    """Число строк запроса (не больше max_count, если он задан)"""
+    query = query.order_by(None)
+    if max_count is not None:
+        query = query.limit(max_count)
+    result = await session.execute(select(func.count()).select_from(query.subquery()))
+    return result.scalar() or 0
+
+
+async def paginate(
+    session: AsyncSession,
+    query: Select,
+    page: int = 1,
+    per_page: int = 10,
+    max_count: Optional[int] = None
+) -> Page:
+    """
+    Выполнить запрос страницы вместе с подсчётом всех строк.
+
+    query — запрос одной сущности с фильтрами и ORDER BY, без offset/limit.
+    К странице добавляется count(*) OVER () — отдельный запрос count_* не нужен.
+    Оконная функция считает все подходящие строки до LIMIT; для больших выборок
+    задайте max_count — тогда число считается подзапросом с LIMIT max_count
+    (total не больше max_count), а страница читается как обычно.
+
+    Если страница за пределами списка, строк нет и число досчитывается отдельно.
+    """
+    page = max(page, 1)
+    if max_count is None:
+        total_column = func.count().over()
+    else:
+        capped = query.order_by(None).limit(max_count).subquery()
+        total_column = select(func.count()).select_from(capped).scalar_subquery()
+
+    result = await session.execute(
+        query.add_columns(total_column.label("total"))
+        .offset((page - 1) * per_page)
+        .limit(per_page)
+    )
+    rows = result.all()
+    if rows:
+        return Page([row[0] for row in rows], rows[0].total)
+    if page == 1:
+        return Page([], 0)
+    return Page([], await count_rows(session, query, max_count))
@@ -1,16 +1,85 @@
 """Запросы для работы с задачами"""
-from sqlalchemy import select, func, delete
-from sqlalchemy.exc import IntegrityError
+from itertools import chain
+
+from sqlalchemy import event, select, func, delete, true, union_all, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from typing import List, Optional
+from sqlalchemy.orm import Session, aliased, contains_eager, defer, joinedload, selectinload
+from sqlalchemy.orm.exc import StaleDataError
+from typing import Dict, List, NamedTuple, Optional, Tuple
 from datetime import datetime, timezone
 
-from db.models import Task, TaskStatus, DirectionType, TaskRejection, executor_buyer_assignments
-from db.queries.user_queries import UserQueries
+from db.cache import task_card_cache
+from db.log_writer import log_writer
+from db.models import (
+    task_number_seq, Task, TaskStatus, DirectionType, TaskRejection, TaskCorrection, TaskFile, Message, User,
+    executor_buyer_assignments
+)
+from db.queries.pagination import Page, paginate
 from log import logger
 
 
+class TaskDetails(NamedTuple):
+    """Карточка задачи: задача с создателем и исполнителем, файлы и последние сообщения"""
+    task: Task
+    files: List[TaskFile]
+    messages: List[Message]
+    message_count: int
+
+
+# Записи, изменение которых меняет карточку задачи (кроме самой Task)
+_TASK_CARD_CHILDREN = (Message, TaskFile, TaskCorrection, TaskRejection)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_task_cards(session, flush_context):
+    """Сбросить карточки задач, изменённых в этом flush (в том числе из обработчиков)"""
+    changed = session.info.setdefault("changed_task_versions", {})
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Task):
+            if obj.id is not None:
+                # Версия после flush — с ней сверяется кэш после commit
+                changed[obj.id] = max(obj.version or 0, changed.get(obj.id) or 0)
+        elif isinstance(obj, _TASK_CARD_CHILDREN) and obj.task_id is not None:
+            changed.setdefault(obj.task_id, None)
+    for task_id in changed:
+        task_card_cache.invalidate(task_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_task_cards(session):
+    """
+    Повторный сброс после commit: карточку могли прочитать между flush и commit.
+    Версия записи запоминается — более старые карточки в кэш уже не попадут.
+    """
+    for task_id, version in session.info.pop("changed_task_versions", {}).items():
+        task_card_cache.invalidate(task_id, version or None)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _invalidate_rolled_back_task_cards(session, previous_transaction):
+    """Сброс после rollback: между flush и rollback могли закэшировать незафиксированную карточку"""
+    for task_id in session.info.pop("changed_task_versions", {}):
+        task_card_cache.invalidate(task_id)
+
+
+class TaskVersionConflict(Exception):
+    """
+    Задачу изменили после того, как её прочитали (не совпала Task.version).
+
+    Ошибка повторяемая: перечитайте задачу и повторите действие —
+    или предложите пользователю открыть задачу заново.
+    """
+
+    def __init__(self, task_id: int, expected_version: Optional[int] = None, current_version: Optional[int] = None):
+        self.task_id = task_id
+        self.expected_version = expected_version
+        self.current_version = current_version
+        super().__init__(
+            f"Задача {task_id} изменена другим пользователем "
+            f"(версия {expected_version}, в базе {current_version})"
+        )
+
+
 class TaskQueries:
     """Запросы для работы с задачами"""
     
@@ -25,83 +94,31 @@ class TaskQueries:
         executor_id: int = None,
         deadline: datetime = None
     ) -> Task:
-        """Создать новую задачу"""
-        # Генерируем номер задачи - находим максимальный существующий номер
-        # Получаем все номера задач и находим максимальный числовой номер
-        all_tasks_result = await session.execute(
-            select(Task.task_number)
+        """
+        Создать новую задачу.
+
+        Номер T-<n> берётся из последовательности task_number_seq в том же INSERT:
+        одновременные создания получают разные номера без повторных попыток.
+        """
+        task = Task(
+            task_number=func.concat("T-", task_number_seq.next_value()),
+            title=title,
+            description=description,
+            direction=direction,
+            priority=priority,
+            created_by_id=created_by_id,
+            executor_id=executor_id,
+            deadline=deadline,
+            status=TaskStatus.PENDING
         )
-        all_task_numbers = [row[0] for row in all_tasks_result.fetchall()]
-        
-        # Находим максимальный числовой номер
-        # Поддерживаем оба формата: старый TASK-xxxx и новый T-x
-        max_number = 0
-        for task_num in all_task_numbers:
-            if not task_num:
-                continue
-            try:
-                # Проверяем новый формат T-x
-                if task_num.startswith("T-"):
-                    num = int(task_num.split('-')[1])
-                    max_number = max(max_number, num)
-                # Проверяем старый формат TASK-xxxx (для обратной совместимости)
-                elif task_num.startswith("TASK-"):
-                    num = int(task_num.split('-')[1])
-                    max_number = max(max_number, num)
-            except (ValueError, IndexError):
-                continue
-        
-        # Следующий номер
-        next_number = max_number + 1
-        max_retries = 10
-        
-        # Пытаемся создать задачу с уникальным номером
-        for attempt in range(max_retries):
-            task_number = f"T-{next_number}"
-            
-            # Проверяем, что номер не существует
-            existing_task = await TaskQueries.get_task_by_number(session, task_number)
-            if existing_task:
-                next_number += 1
-                continue
-            
-            task = Task(
-                task_number=task_number,
-                title=title,
-                description=description,
-                direction=direction,
-                priority=priority,
-                created_by_id=created_by_id,
-                executor_id=executor_id,
-                deadline=deadline,
-                status=TaskStatus.PENDING
-            )
-            session.add(task)
-            
-            try:
-                await session.commit()
-                await session.refresh(task)
-                break  # Успешно создано
-            except IntegrityError as e:
-                # Если произошла ошибка уникальности (race condition), откатываем и пробуем следующий номер
-                await session.rollback()
-                if "task_number" in str(e) or "ix_tasks_task_number" in str(e):
-                    next_number += 1
-                    if attempt == max_retries - 1:
-                        logger.error(f"Не удалось создать задачу после {max_retries} попыток из-за конфликтов номеров")
-                        raise ValueError("Не удалось сгенерировать уникальный номер задачи после нескольких попыток")
-                    continue
-                else:
-                    # Другая ошибка целостности - пробрасываем дальше
-                    raise
-        else:
-            # Если цикл завершился без break
-            raise ValueError("Не удалось сгенерировать уникальный номер задачи")
+        session.add(task)
+        await session.commit()
+        await session.refresh(task)
         
         # Загрузка исполнителя НЕ увеличивается при создании задачи
         # Она увеличится только когда исполнитель примет задачу (PENDING -> IN_PROGRESS)
         
-        logger.info(f"Создана задача {task_number} от пользователя {created_by_id}")
+        logger.info(f"Создана задача {task.task_number} от пользователя {created_by_id}")
         return task
     
     @staticmethod
@@ -115,6 +132,168 @@ class TaskQueries:
         )
         return result.scalar_one_or_none()
     
+    @staticmethod
+    async def get_task_details(session: AsyncSession, task_id: int, last_messages: int = 3) -> Optional[TaskDetails]:
+        """
+        Задача для экрана просмотра за два запроса.
+
+        1. Задача, создатель, исполнитель, число сообщений и последние
+           last_messages сообщений с отправителями (LATERAL-подзапрос по
+           idx_messages_task_created) — все сообщения задачи не загружаются.
+        2. Неудалённые файлы без содержимого (photo_base64, file_data не читаются;
+           обращение к ним — ошибка, а не скрытый запрос).
+        Сообщения возвращаются в хронологическом порядке.
+        """
+        message_count = (
+            select(func.count(Message.id)).where(Message.task_id == Task.id).scalar_subquery()
+        )
+        last = (
+            select(Message)
+            .where(Message.task_id == Task.id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(last_messages)
+            .lateral("last_messages")
+        )
+        message = aliased(Message, last)
+        sender = aliased(User)
+        rows = (await session.execute(
+            select(Task, message_count.label("message_count"), message)
+            .outerjoin(last, true())
+            .outerjoin(sender, sender.id == message.sender_id)
+            .where(Task.id == task_id)
+            .order_by(message.created_at, message.id)
+            .options(
+                joinedload(Task.creator),
+                joinedload(Task.executor),
+                contains_eager(message.sender.of_type(sender)),
+            )
+        )).all()
+        if not rows:
+            return None
+
+        files = (await session.execute(
+            select(TaskFile)
+            .where(TaskFile.task_id == task_id, TaskFile.is_deleted == False)
+            .options(defer(TaskFile.photo_base64, raiseload=True), defer(TaskFile.file_data, raiseload=True))
+            .order_by(TaskFile.created_at)
+        )).scalars().all()
+
+        messages = [row[2] for row in rows if row[2] is not None]
+        return TaskDetails(rows[0][0], list(files), messages, rows[0].message_count)
+    
+    @staticmethod
+    async def get_cached_task_details(session: AsyncSession, task_id: int) -> Optional[TaskDetails]:
+        """
+        Карточка задачи (get_task_details) через кэш.
+
+        Возвращает detached-объекты: только для показа, не для изменения полей.
+        Изменения задачи, сообщений, файлов, правок и отказов через ORM сбрасывают
+        карточку автоматически; массовые UPDATE/DELETE — через invalidate_cached_task.
+        Карточка может отставать от базы (другая реплика), поэтому изменения по ней
+        передают details.task.version в update_task — устаревшая версия даст
+        TaskVersionConflict, а не перезапишет чужие правки.
+        """
+        if task_card_cache.ttl <= 0:
+            return await TaskQueries.get_task_details(session, task_id)
+        details = task_card_cache.get(task_id)
+        if details is None:
+            details = await TaskQueries.get_task_details(session, task_id)
+            if details:
+                task_card_cache.set(task_id, details, details.task.version)
+        return details
+    
+    @staticmethod
+    def invalidate_cached_task(task_id: int, version: Optional[int] = None):
+        """
+        Сбросить карточку задачи из кэша после изменения в обход ORM-объектов.
+
+        version — Task.version после изменения: более старые карточки не кэшируются.
+        """
+        task_card_cache.invalidate(task_id, version)
+    
+    @staticmethod
+    async def update_task(
+        session: AsyncSession,
+        task_id: int,
+        expected_version: Optional[int] = None,
+        **fields
+    ) -> Optional[Task]:
+        """
+        Изменить поля задачи одним UPDATE ... RETURNING с проверкой версии.
+
+        expected_version — Task.version, которую видел пользователь (например,
+        при открытии редактирования). Если задачу с тех пор изменили, поднимается
+        TaskVersionConflict. None — без проверки. Возвращает None, если задачи нет.
+
+        Смена executor_id меняет загрузку прежнего и нового исполнителя
+        в той же транзакции.
+        """
+        old_executor_id = None
+        if "executor_id" in fields:
+            # Прежний исполнитель — под блокировкой строки до конца транзакции
+            old_executor_id = await session.scalar(
+                select(Task.executor_id).where(Task.id == task_id).with_for_update()
+            )
+        
+        statement = (
+            update(Task)
+            .where(Task.id == task_id)
+            .values(**fields, version=Task.version + 1, updated_at=func.now())
+            .returning(Task)
+        )
+        if expected_version is not None:
+            statement = statement.where(Task.version == expected_version)
+        result = await session.execute(statement, execution_options={"populate_existing": True})
+        task = result.scalar_one_or_none()
+        
+        if task is None:
+            current_version = await session.scalar(select(Task.version).where(Task.id == task_id))
+            await session.rollback()
+            if current_version is None:
+                return None
+            raise TaskVersionConflict(task_id, expected_version, current_version)
+        
+        if "executor_id" in fields and old_executor_id != task.executor_id:
+            if old_executor_id:
+                await TaskQueries.shift_executor_load(session, old_executor_id, -1)
+            if task.executor_id:
+                await TaskQueries.shift_executor_load(session, task.executor_id, 1)
+        
+        await session.commit()
+        TaskQueries.invalidate_cached_task(task_id, task.version)
+        logger.info(f"Задача {task.task_number}: изменены поля {', '.join(fields)} (версия {task.version})")
+        return task
+    
+    @staticmethod
+    async def shift_executor_load(session: AsyncSession, user_id: int, increment: int):
+        """
+        Изменить загрузку исполнителя атомарно (не меньше 0), без commit.
+
+        Единственное место изменения current_load при смене статуса или
+        исполнителя задачи (в том числе в TaskTransitions).
+        """
+        await session.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(current_load=func.greatest(User.current_load + increment, 0))
+        )
+    
+    @staticmethod
+    async def _flush_versioned(session: AsyncSession, task: Task):
+        """
+        flush изменений задачи через ORM (UPDATE ... WHERE version = прочитанной).
+
+        Если задачу изменили после чтения (version_id_col), ORM поднимает
+        StaleDataError — он заменяется на повторяемый TaskVersionConflict.
+        После flush строка задачи заблокирована до commit.
+        """
+        task_id, version = task.id, task.version
+        try:
+            await session.flush()
+        except StaleDataError as e:
+            await session.rollback()
+            raise TaskVersionConflict(task_id, version) from e
+    
     @staticmethod
     async def get_task_by_number(session: AsyncSession, task_number: str) -> Optional[Task]:
         """Получить задачу по номеру"""
@@ -135,10 +314,7 @@ class TaskQueries:
         per_page: int = None
     ) -> List[Task]:
         """Получить задачи по создателю с пагинацией"""
-        query = select(Task).where(Task.created_by_id == creator_id)
-        if status:
-            query = query.where(Task.status == status)
-        query = query.order_by(Task.created_at.desc())
+        query = TaskQueries._tasks_by_creator_query(creator_id, status)
         
         # Применяем пагинацию на уровне SQL
         if page is not None and per_page is not None:
@@ -151,6 +327,25 @@ class TaskQueries:
         result = await session.execute(query)
         return result.scalars().all()
     
+    @staticmethod
+    def _tasks_by_creator_query(creator_id: int, status: TaskStatus = None):
+        query = select(Task).where(Task.created_by_id == creator_id)
+        if status:
+            query = query.where(Task.status == status)
+        return query.order_by(Task.created_at.desc())
+    
+    @staticmethod
+    async def get_tasks_by_creator_page(
+        session: AsyncSession,
+        creator_id: int,
+        status: TaskStatus = None,
+        page: int = 1,
+        per_page: int = 5
+    ) -> Page:
+        """Страница задач создателя и их общее число одним запросом"""
+        query = TaskQueries._tasks_by_creator_query(creator_id, status).options(selectinload(Task.executor))
+        return await paginate(session, query, page, per_page)
+    
     @staticmethod
     async def get_tasks_by_executor(
         session: AsyncSession,
@@ -176,6 +371,35 @@ class TaskQueries:
         result = await session.execute(query)
         return result.scalars().all()
     
+    @staticmethod
+    def _available_tasks_select(executor_id: int, status: TaskStatus = None):
+        """
+        id, created_at и status задач, доступных исполнителю, — одним запросом.
+
+        Ветки UNION ALL не пересекаются и каждая читает свой индекс:
+        1. задачи, назначенные исполнителю;
+        2. свободные PENDING-задачи назначенных ему баеров;
+        3. все свободные PENDING-задачи, если баеры не назначены (обратная совместимость).
+        Раньше назначенные баеры выбирались отдельным запросом, а ветки
+        объединялись через OR, который не обслуживается одним индексом.
+        """
+        columns = (Task.id, Task.created_at, Task.status)
+
+        assigned = select(*columns).where(Task.executor_id == executor_id)
+        if status:
+            assigned = assigned.where(Task.status == status)
+        if status not in (None, TaskStatus.PENDING):
+            # Для других статусов показываем только назначенные задачи
+            return assigned
+
+        unassigned = (Task.status == TaskStatus.PENDING, Task.executor_id.is_(None))
+        buyer_ids = select(executor_buyer_assignments.c.buyer_id).where(
+            executor_buyer_assignments.c.executor_id == executor_id
+        )
+        from_buyers = select(*columns).where(*unassigned, Task.created_by_id.in_(buyer_ids))
+        from_anyone = select(*columns).where(*unassigned, ~buyer_ids.exists())
+        return union_all(assigned, from_buyers, from_anyone)
+
     @staticmethod
     async def get_available_tasks_for_executor(
         session: AsyncSession,
@@ -185,58 +409,12 @@ class TaskQueries:
         per_page: int = None
     ) -> List[Task]:
         """Получить доступные задачи для исполнителя с учетом назначений баеров и пагинацией"""
-        from sqlalchemy import or_
-        
-        # Получаем назначенных баеров для исполнителя
-        assigned_buyers_stmt = select(executor_buyer_assignments.c.buyer_id).where(
-            executor_buyer_assignments.c.executor_id == executor_id
+        available = TaskQueries._available_tasks_select(executor_id, status).subquery("available")
+        query = (
+            select(Task)
+            .join(available, Task.id == available.c.id)
+            .order_by(available.c.created_at.desc(), available.c.id.desc())
         )
-        assigned_buyers_result = await session.execute(assigned_buyers_stmt)
-        assigned_buyer_ids = [row[0] for row in assigned_buyers_result.all()]
-        
-        # Если есть назначенные баеры, фильтруем задачи
-        if assigned_buyer_ids:
-            if status == TaskStatus.PENDING or status is None:
-                # Для PENDING или всех задач показываем:
-                # 1. Задачи, назначенные исполнителю
-                # 2. ИЛИ задачи в статусе PENDING от назначенных баеров (еще не назначенные)
-                conditions = [
-                    Task.executor_id == executor_id
-                ]
-                if status == TaskStatus.PENDING or status is None:
-                    conditions.append(
-                        (Task.status == TaskStatus.PENDING) & 
-                        (Task.created_by_id.in_(assigned_buyer_ids)) &
-                        (Task.executor_id.is_(None))
-                    )
-                
-                query = select(Task).where(or_(*conditions))
-                if status == TaskStatus.PENDING:
-                    query = query.where(Task.status == TaskStatus.PENDING)
-            else:
-                # Для других статусов показываем только назначенные задачи
-                query = select(Task).where(
-                    Task.executor_id == executor_id,
-                    Task.status == status
-                )
-        else:
-            # Если нет назначенных баеров, показываем все задачи (обратная совместимость)
-            conditions = [Task.executor_id == executor_id]
-            if status == TaskStatus.PENDING or status is None:
-                conditions.append(
-                    (Task.status == TaskStatus.PENDING) & (Task.executor_id.is_(None))
-                )
-            
-            query = select(Task).where(or_(*conditions))
-            if status and status != TaskStatus.PENDING:
-                # Для конкретного статуса (не PENDING) фильтруем только назначенные
-                query = query.where(
-                    (Task.executor_id == executor_id) & (Task.status == status)
-                )
-            elif status == TaskStatus.PENDING:
-                query = query.where(Task.status == TaskStatus.PENDING)
-        
-        query = query.order_by(Task.created_at.desc())
         
         # Применяем пагинацию на уровне SQL
         if page is not None and per_page is not None:
@@ -244,11 +422,48 @@ class TaskQueries:
             query = query.offset(offset).limit(per_page)
         
         # Всегда загружаем creator для избежания lazy loading в async контексте
-        query = query.options(selectinload(Task.creator))
+        query = query.options(joinedload(Task.creator))
         
         result = await session.execute(query)
         return result.scalars().all()
     
+    @staticmethod
+    async def get_available_tasks_page(
+        session: AsyncSession,
+        executor_id: int,
+        status: TaskStatus = None,
+        page: int = 1,
+        per_page: int = 5
+    ) -> Tuple[List[Task], int]:
+        """
+        Страница доступных задач и их общее число за один запрос.
+
+        Если страница за пределами списка (задачи разобрали между нажатиями),
+        возвращается пустой список, а число задач досчитывается отдельно.
+        """
+        available = TaskQueries._available_tasks_select(executor_id, status).cte("available")
+        page_ids = (
+            select(available.c.id, available.c.created_at)
+            .order_by(available.c.created_at.desc(), available.c.id.desc())
+            .offset((page - 1) * per_page)
+            .limit(per_page)
+            .subquery("page_ids")
+        )
+        total = select(func.count()).select_from(available).scalar_subquery()
+        query = (
+            select(Task, total.label("total"))
+            .join(page_ids, Task.id == page_ids.c.id)
+            .order_by(page_ids.c.created_at.desc(), page_ids.c.id.desc())
+            .options(joinedload(Task.creator))
+        )
+        
+        rows = (await session.execute(query)).all()
+        if rows:
+            return [row.Task for row in rows], rows[0].total
+        if page <= 1:
+            return [], 0
+        return [], await TaskQueries.count_available_tasks_for_executor(session, executor_id, status)
+    
     @staticmethod
     async def get_tasks_by_direction(
         session: AsyncSession,
@@ -272,7 +487,13 @@ class TaskQueries:
         user_id: int = None,
         comment: str = None
     ) -> Task:
-        """Обновить статус задачи"""
+        """
+        Обновить статус задачи без проверки текущего статуса.
+
+        Переходы по действиям пользователей (взятие, сдача, правки, одобрение,
+        отказ) выполняются через TaskTransitions — с проверкой и записью одним запросом.
+        Задачу изменили между чтением и записью — TaskVersionConflict.
+        """
         task = await TaskQueries.get_task_by_id(session, task_id)
         if not task:
             return None
@@ -285,15 +506,16 @@ class TaskQueries:
             task.started_at = datetime.now(timezone.utc)
         elif new_status in [TaskStatus.COMPLETED, TaskStatus.APPROVED]:
             task.completed_at = datetime.now(timezone.utc)
+        await TaskQueries._flush_versioned(session, task)
         
         # Обновляем загрузку исполнителя при смене статуса
         if task.executor_id:
             # Увеличиваем загрузку при принятии задачи (PENDING -> IN_PROGRESS)
             if old_status == TaskStatus.PENDING and new_status == TaskStatus.IN_PROGRESS:
-                await UserQueries.update_user_load(session, task.executor_id, 1)
+                await TaskQueries.shift_executor_load(session, task.executor_id, 1)
             # Уменьшаем загрузку при завершении/одобрении задачи (IN_PROGRESS -> COMPLETED/APPROVED)
             elif old_status == TaskStatus.IN_PROGRESS and new_status in [TaskStatus.COMPLETED, TaskStatus.APPROVED]:
-                await UserQueries.update_user_load(session, task.executor_id, -1)
+                await TaskQueries.shift_executor_load(session, task.executor_id, -1)
         
         # Записываем лог изменения
         from db.models import TaskLog
@@ -315,19 +537,20 @@ class TaskQueries:
     
     @staticmethod
     async def assign_executor(session: AsyncSession, task_id: int, executor_id: int) -> Task:
-        """Назначить исполнителя на задачу"""
+        """Назначить исполнителя на задачу (TaskVersionConflict — задачу изменили между чтением и записью)"""
         task = await TaskQueries.get_task_by_id(session, task_id)
         if not task:
             return None
         
         old_executor_id = task.executor_id
         task.executor_id = executor_id
+        await TaskQueries._flush_versioned(session, task)
         
         # Обновляем загрузку исполнителей
         if old_executor_id:
-            await UserQueries.update_user_load(session, old_executor_id, -1)
+            await TaskQueries.shift_executor_load(session, old_executor_id, -1)
         if executor_id:
-            await UserQueries.update_user_load(session, executor_id, 1)
+            await TaskQueries.shift_executor_load(session, executor_id, 1)
         
         await session.commit()
         await session.refresh(task)
@@ -337,10 +560,11 @@ class TaskQueries:
     
     @staticmethod
     async def update_task_rating(session: AsyncSession, task_id: int, rating: int):
-        """Обновить оценку задачи"""
+        """Обновить оценку задачи (TaskVersionConflict — задачу изменили между чтением и записью)"""
         task = await TaskQueries.get_task_by_id(session, task_id)
         if task:
             task.rating = rating
+            await TaskQueries._flush_versioned(session, task)
             await session.commit()
             logger.info(f"Задача {task.task_number}: оценка {rating}/5")
     
@@ -355,7 +579,12 @@ class TaskQueries:
         
         # Если задача была в работе, уменьшаем загрузку исполнителя
         if task.status == TaskStatus.IN_PROGRESS and task.executor_id:
-            await UserQueries.update_user_load(session, task.executor_id, -1)
+            await TaskQueries.shift_executor_load(session, task.executor_id, -1)
+        
+        # События задачи из буфера журнала пишем до удаления: после DELETE их
+        # INSERT нарушил бы внешний ключ task_logs.task_id, и пачка с ними
+        # ушла бы в запись по одной с потерей этих событий
+        await log_writer.flush()
         
         # Используем SQL DELETE для удаления задачи, чтобы база данных
         # обработала CASCADE удаление связанных записей (messages, files, logs и т.д.)
@@ -364,6 +593,7 @@ class TaskQueries:
             delete(Task).where(Task.id == task_id)
         )
         await session.commit()
+        TaskQueries.invalidate_cached_task(task_id)
         
         logger.info(f"Задача {task_number} полностью удалена пользователем {user_id}")
         return None
@@ -412,47 +642,15 @@ class TaskQueries:
         status: TaskStatus = None
     ) -> int:
         """Быстрый подсчет доступных задач для исполнителя"""
-        from sqlalchemy import or_
-        
-        # Получаем назначенных баеров для исполнителя
-        assigned_buyers_stmt = select(executor_buyer_assignments.c.buyer_id).where(
-            executor_buyer_assignments.c.executor_id == executor_id
-        )
-        assigned_buyers_result = await session.execute(assigned_buyers_stmt)
-        assigned_buyer_ids = [row[0] for row in assigned_buyers_result.all()]
-        
-        # Строим запрос для подсчета
-        if assigned_buyer_ids:
-            if status == TaskStatus.PENDING or status is None:
-                conditions = [Task.executor_id == executor_id]
-                if status == TaskStatus.PENDING or status is None:
-                    conditions.append(
-                        (Task.status == TaskStatus.PENDING) & 
-                        (Task.created_by_id.in_(assigned_buyer_ids)) &
-                        (Task.executor_id.is_(None))
-                    )
-                query = select(func.count(Task.id)).where(or_(*conditions))
-                if status == TaskStatus.PENDING:
-                    query = query.where(Task.status == TaskStatus.PENDING)
-            else:
-                query = select(func.count(Task.id)).where(
-                    Task.executor_id == executor_id,
-                    Task.status == status
-                )
-        else:
-            conditions = [Task.executor_id == executor_id]
-            if status == TaskStatus.PENDING or status is None:
-                conditions.append(
-                    (Task.status == TaskStatus.PENDING) & (Task.executor_id.is_(None))
-                )
-            query = select(func.count(Task.id)).where(or_(*conditions))
-            if status and status != TaskStatus.PENDING:
-                query = query.where(
-                    (Task.executor_id == executor_id) & (Task.status == status)
-                )
-            elif status == TaskStatus.PENDING:
-                query = query.where(Task.status == TaskStatus.PENDING)
-        
-        result = await session.execute(query)
+        available = TaskQueries._available_tasks_select(executor_id, status).subquery("available")
+        result = await session.execute(select(func.count()).select_from(available))
         return result.scalar() or 0
-
+    
+    @staticmethod
+    async def count_available_tasks_by_status(session: AsyncSession, executor_id: int) -> Dict[TaskStatus, int]:
+        """Число доступных исполнителю задач по статусам одним запросом"""
+        available = TaskQueries._available_tasks_select(executor_id).subquery("available")
+        result = await session.execute(
+            select(available.c.status, func.count()).group_by(available.c.status)
+        )
+        return {status: count for status, count in result.all()}
@@ -0,0 +1,248 @@
+"""Переходы задачи между статусами: проверка и запись одним UPDATE"""
+import enum
+from typing import Dict, FrozenSet, Iterable, NamedTuple, Optional
+
+from sqlalchemy import func, or_, select, true, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, joinedload
+
+from db.models import RejectionReason, Task, TaskLog, TaskRejection, TaskStatus
+from db.queries.task_queries import TaskQueries
+from log import logger
+
+
+# Допустимые переходы: из статуса -> в статусы
+ALLOWED_TRANSITIONS: Dict[TaskStatus, FrozenSet[TaskStatus]] = {
+    # Взятие в работу, выполнение из чата, отказ исполнителя до взятия
+    TaskStatus.PENDING: frozenset({TaskStatus.IN_PROGRESS, TaskStatus.COMPLETED, TaskStatus.PENDING}),
+    # Сдача результата, отказ исполнителя
+    TaskStatus.IN_PROGRESS: frozenset({TaskStatus.COMPLETED, TaskStatus.PENDING}),
+    # Одобрение, возврат на правки
+    TaskStatus.COMPLETED: frozenset({TaskStatus.APPROVED, TaskStatus.IN_PROGRESS}),
+    TaskStatus.APPROVED: frozenset(),
+    TaskStatus.REJECTED: frozenset(),
+    TaskStatus.CANCELLED: frozenset(),
+}
+
+
+class TransitionOutcome(enum.Enum):
+    APPLIED = "applied"
+    NOT_FOUND = "not_found"
+    # Задача уже в другом статусе (двойное нажатие, гонка с другим пользователем)
+    WRONG_STATUS = "wrong_status"
+    # Статус подходит, но задача назначена другому исполнителю
+    NOT_ALLOWED = "not_allowed"
+
+
+class TransitionResult(NamedTuple):
+    """
+    Результат перехода.
+
+    task — задача после перехода (с creator и executor), только для APPLIED.
+    previous_status — статус до перехода; для WRONG_STATUS и NOT_ALLOWED —
+    текущий статус задачи, по нему обработчик объясняет отказ без доп. запросов.
+    """
+    outcome: TransitionOutcome
+    task: Optional[Task] = None
+    previous_status: Optional[TaskStatus] = None
+    previous_executor_id: Optional[int] = None
+
+    @property
+    def applied(self) -> bool:
+        return self.outcome == TransitionOutcome.APPLIED
+
+
+class TaskTransitions:
+    """
+    Переходы статусов задачи.
+
+    Каждый переход — один запрос: строка задачи блокируется (FOR UPDATE),
+    и UPDATE ... WHERE status IN (...) RETURNING применяется, только если
+    статус (и исполнитель) ещё подходят. Из двух одновременных нажатий
+    проходит одно, второе получает WRONG_STATUS с текущим статусом.
+    Событие журнала, отказ и загрузка исполнителя пишутся в той же транзакции.
+    """
+
+    @staticmethod
+    async def take(session: AsyncSession, task_id: int, executor_id: int) -> TransitionResult:
+        """Взять задачу в работу (свою или ещё не назначенную)"""
+        return await TaskTransitions._apply(
+            session, task_id, TaskStatus.IN_PROGRESS,
+            sources=[TaskStatus.PENDING],
+            guard=or_(Task.executor_id == executor_id, Task.executor_id.is_(None)),
+            values={"executor_id": executor_id, "started_at": func.coalesce(Task.started_at, func.now())},
+            user_id=executor_id,
+            action="task_taken",
+            comment="Задача взята в работу",
+        )
+
+    @staticmethod
+    async def complete(
+        session: AsyncSession,
+        task_id: int,
+        executor_id: int,
+        completion_comment: str = None
+    ) -> TransitionResult:
+        """Сдать результат: исполнитель завершает задачу в работе"""
+        return await TaskTransitions._apply(
+            session, task_id, TaskStatus.COMPLETED,
+            sources=[TaskStatus.IN_PROGRESS],
+            guard=Task.executor_id == executor_id,
+            values={"completion_comment": completion_comment, "completed_at": func.now()},
+            user_id=executor_id,
+            action="task_completed",
+            comment="Задача выполнена",
+        )
+
+    @staticmethod
+    async def complete_from_chat(
+        session: AsyncSession,
+        task_id: int,
+        user_id: Optional[int],
+        details: dict = None
+    ) -> TransitionResult:
+        """Отметить выполненной из чата: любой участник, задача ещё открыта (details — чат и кто нажал)"""
+        return await TaskTransitions._apply(
+            session, task_id, TaskStatus.COMPLETED,
+            sources=[TaskStatus.PENDING, TaskStatus.IN_PROGRESS],
+            values={"completed_at": func.now()},
+            user_id=user_id,
+            action="chat_complete",
+            comment="Задача выполнена (чат)",
+            details=details,
+        )
+
+    @staticmethod
+    async def approve(session: AsyncSession, task_id: int, buyer_id: int, rating: int) -> TransitionResult:
+        """Одобрить выполненную задачу с оценкой"""
+        return await TaskTransitions._apply(
+            session, task_id, TaskStatus.APPROVED,
+            sources=[TaskStatus.COMPLETED],
+            values={"rating": rating, "completed_at": func.now()},
+            user_id=buyer_id,
+            action="task_approved",
+            comment=f"Оценка: {rating}/5",
+        )
+
+    @staticmethod
+    async def request_correction(session: AsyncSession, task_id: int, buyer_id: int, correction_text: str) -> TransitionResult:
+        """Вернуть выполненную задачу в работу на правки"""
+        return await TaskTransitions._apply(
+            session, task_id, TaskStatus.IN_PROGRESS,
+            sources=[TaskStatus.COMPLETED],
+            values={"started_at": func.coalesce(Task.started_at, func.now())},
+            user_id=buyer_id,
+            action="correction_requested",
+            comment=f"Запрошены правки: {correction_text}",
+        )
+
+    @staticmethod
+    async def reject(
+        session: AsyncSession,
+        task_id: int,
+        executor_id: int,
+        reason: RejectionReason,
+        reason_text: str
+    ) -> TransitionResult:
+        """Отказ исполнителя: задача снимается с него и возвращается в ожидание"""
+        return await TaskTransitions._apply(
+            session, task_id, TaskStatus.PENDING,
+            sources=[TaskStatus.PENDING, TaskStatus.IN_PROGRESS],
+            guard=Task.executor_id == executor_id,
+            # Время начала обнуляется для следующего исполнителя
+            values={"executor_id": None, "started_at": None},
+            user_id=executor_id,
+            action="task_rejected",
+            comment=f"Отказ от задачи. Причина: {reason_text}",
+            details={"reason": reason_text},
+            extra=[TaskRejection(
+                task_id=task_id,
+                executor_id=executor_id,
+                reason=reason,
+                custom_reason=reason_text if reason == RejectionReason.OTHER else None,
+            )],
+        )
+
+    @staticmethod
+    async def _apply(
+        session: AsyncSession,
+        task_id: int,
+        target: TaskStatus,
+        sources: Iterable[TaskStatus],
+        values: dict,
+        user_id: Optional[int],
+        action: str,
+        comment: str,
+        details: dict = None,
+        guard=None,
+        extra: Iterable = ()
+    ) -> TransitionResult:
+        """
+        WITH current_task AS (SELECT ... FOR UPDATE),
+             updated_task AS (UPDATE tasks ... WHERE status IN (:sources) RETURNING *)
+        SELECT статус до перехода, обновлённая задача — одним запросом.
+
+        action — имя события в журнале (task_logs): переход и есть событие,
+        отдельная запись в action_logs не нужна.
+        """
+        sources = list(sources)
+        for source in sources:
+            if target not in ALLOWED_TRANSITIONS[source]:
+                raise ValueError(f"Переход {source.value} -> {target.value} не разрешён")
+
+        current = (
+            select(Task.id, Task.status, Task.executor_id)
+            .where(Task.id == task_id)
+            .with_for_update()
+            .cte("current_task")
+        )
+        conditions = [Task.id == current.c.id, Task.status.in_(sources)]
+        if guard is not None:
+            conditions.append(guard)
+        updated = (
+            update(Task)
+            .where(*conditions)
+            .values(status=target, version=Task.version + 1, updated_at=func.now(), **values)
+            .returning(*Task.__table__.c)
+            .cte("updated_task")
+        )
+        task_alias = aliased(Task, updated)
+        row = (await session.execute(
+            select(current.c.status, current.c.executor_id, task_alias)
+            .select_from(current)
+            .outerjoin(updated, true())
+            .options(joinedload(task_alias.creator), joinedload(task_alias.executor)),
+            execution_options={"populate_existing": True}
+        )).one_or_none()
+
+        if row is None:
+            await session.rollback()
+            return TransitionResult(TransitionOutcome.NOT_FOUND)
+
+        previous_status, previous_executor_id, task = row
+        if task is None:
+            # Снимаем блокировку строки
+            await session.rollback()
+            outcome = TransitionOutcome.WRONG_STATUS if previous_status not in sources else TransitionOutcome.NOT_ALLOWED
+            return TransitionResult(outcome, None, previous_status, previous_executor_id)
+
+        # Загрузка исполнителя: +1 при входе в работу, -1 при выходе из неё
+        if previous_status == TaskStatus.IN_PROGRESS and target != TaskStatus.IN_PROGRESS and previous_executor_id:
+            await TaskQueries.shift_executor_load(session, previous_executor_id, -1)
+        elif target == TaskStatus.IN_PROGRESS and previous_status != TaskStatus.IN_PROGRESS and task.executor_id:
+            await TaskQueries.shift_executor_load(session, task.executor_id, 1)
+
+        session.add(TaskLog(
+            task_id=task_id,
+            user_id=user_id,
+            action=action,
+            old_status=previous_status,
+            new_status=target,
+            details={"comment": comment, **(details or {})}
+        ))
+        session.add_all(list(extra))
+        await session.commit()
+        TaskQueries.invalidate_cached_task(task_id, task.version)
+
+        logger.info(f"Задача {task.task_number}: статус {previous_status.value} -> {target.value}")
+        return TransitionResult(TransitionOutcome.APPLIED, task, previous_status, previous_executor_id)
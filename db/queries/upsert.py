@@ -0,0 +1,12 @@
+"""Общее для INSERT ... ON CONFLICT DO UPDATE"""
+from sqlalchemy import Boolean, literal_column
+
+
+def inserted_flag():
+    """
+    Колонка для RETURNING: True — строка вставлена, False — обновлена.
+
+    В PostgreSQL у только что вставленной строки xmax = 0, у строки,
+    обновлённой через ON CONFLICT DO UPDATE, — id текущей транзакции.
+    """
+    return literal_column("xmax = 0", Boolean).label("inserted")
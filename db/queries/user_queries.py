@@ -1,10 +1,14 @@
 """Запросы для работы с пользователями"""
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import and_
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
+from db.cache import user_cache
 from db.models import User, UserRole, DirectionType, executor_buyer_assignments
+from db.queries.pagination import Page, paginate
+from db.queries.upsert import inserted_flag
 from log import logger
 
 
@@ -20,6 +24,26 @@ class UserQueries:
         result = await session.execute(query)
         return result.scalar_one_or_none()
     
+    @staticmethod
+    async def get_cached_user(session: AsyncSession, telegram_id: int) -> Optional[User]:
+        """
+        Получить активного пользователя по Telegram ID через кэш.
+
+        Возвращает detached-объект: подходит для проверки роли, id и имени,
+        но не для изменения полей — для этого используйте get_user_by_telegram_id.
+        """
+        user = user_cache.get(telegram_id)
+        if user is None:
+            user = await UserQueries.get_user_by_telegram_id(session, telegram_id)
+            if user:
+                user_cache.set(telegram_id, user)
+        return user
+    
+    @staticmethod
+    def invalidate_cached_user(telegram_id: int):
+        """Сбросить пользователя из кэша после изменения роли, активности или имени"""
+        user_cache.invalidate(telegram_id)
+    
     @staticmethod
     async def get_user_by_id(session: AsyncSession, user_id: int) -> Optional[User]:
         """Получить пользователя по ID"""
@@ -51,22 +75,71 @@ class UserQueries:
         session.add(user)
         await session.commit()
         await session.refresh(user)
+        UserQueries.invalidate_cached_user(telegram_id)
         role_text = role.value if role else "без роли"
         logger.info(f"Создан новый пользователь: {telegram_id}, роль: {role_text}")
         return user
     
+    @staticmethod
+    async def register_user(
+        session: AsyncSession,
+        telegram_id: int,
+        role: UserRole = None,
+        username: str = None,
+        first_name: str = None,
+        last_name: str = None
+    ) -> Tuple[User, bool]:
+        """
+        Зарегистрировать пользователя при первом /start одним INSERT ... ON CONFLICT.
+
+        Возвращает (пользователь, создан ли он сейчас). Если пользователь с таким
+        telegram_id уже есть (повторный /start одновременно с первым или
+        деактивированный пользователь), обновляется только last_activity —
+        роль, имя и активность не меняются.
+        """
+        result = await session.execute(
+            insert(User)
+            .values(
+                telegram_id=telegram_id,
+                username=username,
+                first_name=first_name,
+                last_name=last_name,
+                role=role,
+                is_active=True
+            )
+            .on_conflict_do_update(index_elements=[User.telegram_id], set_={"last_activity": func.now()})
+            .returning(User, inserted_flag()),
+            execution_options={"populate_existing": True}
+        )
+        user, created = result.one()
+        await session.commit()
+        UserQueries.invalidate_cached_user(telegram_id)
+        if created:
+            role_text = role.value if role else "без роли"
+            logger.info(f"Создан новый пользователь: {telegram_id}, роль: {role_text}")
+        return user, created
+    
     @staticmethod
     async def get_all_users(session: AsyncSession, role: UserRole = None, active_only: bool = True, page: int = 1, per_page: int = 10) -> List[User]:
         """Получить всех пользователей с пагинацией"""
+        query = UserQueries._users_query(role, active_only)
+        query = query.offset((page - 1) * per_page).limit(per_page)
+        result = await session.execute(query)
+        return list(result.scalars())
+
+    @staticmethod
+    def _users_query(role: UserRole = None, active_only: bool = True):
         query = select(User)
         if active_only:
             query = query.where(User.is_active == True)
         if role:
             query = query.where(and_(User.role == role))
-        query = query.order_by(User.created_at.desc())
-        query = query.offset((page - 1) * per_page).limit(per_page)
-        result = await session.execute(query)
-        return list(result.scalars())
+        return query.order_by(User.created_at.desc())
+
+    @staticmethod
+    async def get_users_page(session: AsyncSession, role: UserRole = None, active_only: bool = True, page: int = 1, per_page: int = 10) -> Page:
+        """Страница пользователей и их общее число одним запросом"""
+        return await paginate(session, UserQueries._users_query(role, active_only), page, per_page)
 
     @staticmethod
     async def get_executors_by_direction(session: AsyncSession, direction: DirectionType, limit: int = None) -> List[User]:
@@ -85,16 +158,6 @@ class UserQueries:
         result = await session.execute(query)
         return result.scalars().all()
     
-    @staticmethod
-    async def update_user_load(session: AsyncSession, user_id: int, increment: int = 1):
-        """Обновить загрузку исполнителя"""
-        user = await UserQueries.get_user_by_id(session, user_id)
-        if user:
-            user.current_load += increment
-            user.current_load = max(0, user.current_load)  # Не меньше 0
-            await session.commit()
-            logger.info(f"Обновлена загрузка пользователя {user_id}: {user.current_load}")
-    
     @staticmethod
     async def deactivate_user(session: AsyncSession, user_id: int):
         """Деактивировать пользователя"""
@@ -102,6 +165,7 @@ class UserQueries:
         if user:
             user.is_active = False
             await session.commit()
+            UserQueries.invalidate_cached_user(user.telegram_id)
             logger.info(f"Пользователь {user_id} деактивирован")
     
     @staticmethod
@@ -117,6 +181,7 @@ class UserQueries:
                 user.direction = None
                 logger.info(f"Направление пользователя {user_id} удалено при смене роли: {old_direction.value}")
             await session.commit()
+            UserQueries.invalidate_cached_user(user.telegram_id)
             old_role_text = old_role.value if old_role else "без роли"
             new_role_text = new_role.value if new_role else "без роли"
             logger.info(f"Роль пользователя {user_id} изменена: {old_role_text} -> {new_role_text}")
@@ -130,6 +195,7 @@ class UserQueries:
         if user:
             user.direction = new_direction
             await session.commit()
+            UserQueries.invalidate_cached_user(user.telegram_id)
             logger.info(f"Направление пользователя {user_id} изменено: {new_direction.value}")
     
     @staticmethod
@@ -139,6 +205,7 @@ class UserQueries:
         if user:
             user.is_active = True
             await session.commit()
+            UserQueries.invalidate_cached_user(user.telegram_id)
             logger.info(f"Пользователь {user_id} активирован")
             return user
         return None
@@ -151,6 +218,7 @@ class UserQueries:
             telegram_id = user.telegram_id
             await session.delete(user)
             await session.commit()
+            UserQueries.invalidate_cached_user(telegram_id)
             logger.info(f"Пользователь {telegram_id} (ID: {user_id}) удален из базы данных")
             return True
         return False
@@ -165,6 +233,7 @@ class UserQueries:
             user.first_name = first_name
             user.last_name = last_name
             await session.commit()
+            UserQueries.invalidate_cached_user(user.telegram_id)
             logger.info(f"Имя пользователя {user_id} изменено: '{old_first_name} {old_last_name or ''}' -> '{first_name} {last_name or ''}'")
             return user
         return None
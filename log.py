@@ -1,9 +1,126 @@
+"""
+Логи приложения.
+
+Вызов logger.* только кладёт запись в очередь (QueueHandler); в файл пишет
+отдельный поток QueueListener, поэтому файловый ввод-вывод, ротация и сжатие
+не блокируют event loop. Файл ротируется по размеру (LOG_MAX_MB) или по
+времени (LOG_ROTATE_WHEN), старые файлы сжимаются в .gz.
+
+Каждая запись получает update_id и user_id текущего обновления
+(LogContextMiddleware); в формате json они отдельные поля.
+"""
+import atexit
+import gzip
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import shutil
+from contextvars import ContextVar
+from typing import Optional, Tuple
+
+from Data.config import (
+    LOG_FILE, LOG_LEVEL, LOG_FORMAT, LOG_ROTATE_WHEN, LOG_MAX_MB, LOG_BACKUP_COUNT,
+    LOG_COMPRESS, LOG_QUEUE_SIZE
+)
 
-logging.basicConfig(
-    filename="Data/log.log",
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s",
-    encoding="utf-8"
+TEXT_FORMAT = "%(asctime)s | %(levelname)s | %(message)s"
+
+# (update_id, user_id) обновления, которое сейчас обрабатывается
+current_log_context: ContextVar[Tuple[Optional[int], Optional[int]]] = ContextVar(
+    "current_log_context", default=(None, None)
 )
+
+
+class ContextFilter(logging.Filter):
+    """Добавляет к записи update_id и user_id (в потоке, где вызван logger)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.update_id, record.user_id = current_log_context.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in ("update_id", "user_id"):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который при переполнении очереди отбрасывает запись, а не ждёт"""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _gzip_namer(name: str) -> str:
+    return name + ".gz"
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    """Сжатие ротированного файла (в потоке QueueListener)"""
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def _file_handler() -> logging.Handler:
+    directory = os.path.dirname(LOG_FILE)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if LOG_ROTATE_WHEN:
+        handler = logging.handlers.TimedRotatingFileHandler(
+            LOG_FILE, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_MAX_MB * 1024 * 1024, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    if LOG_COMPRESS:
+        handler.namer = _gzip_namer
+        handler.rotator = _gzip_rotator
+
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    return handler
+
+
+def setup_logging() -> Tuple[DroppingQueueHandler, logging.handlers.QueueListener]:
+    """Корневой логгер -> очередь -> поток записи в файл"""
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(
+        queue_handler.queue, _file_handler(), respect_handler_level=True
+    )
+    listener.start()
+    # Дописать очередь при выходе из процесса
+    atexit.register(listener.stop)
+    return queue_handler, listener
+
+
+log_handler, log_listener = setup_logging()
 logger = logging.getLogger(__name__)
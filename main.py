@@ -4,12 +4,17 @@ import os
 from aiogram import Bot
 
 from bot.bot import create_bot, create_dispatcher
+from bot.webhook import run_webhook
 from bot.handlers import register_handlers
 from bot.utils.notifications import notify_admins_on_start
 from bot.utils.log_channel import LogChannel
+from bot.utils.fsm_storage import PostgresStorage
 from db.engine import engine, AsyncSessionLocal
 from db.init_db import create_tables
+from db.log_partitions import partition_maintenance
+from db.log_writer import log_writer
 from db.queries.channel_queries import ChannelQueries
+from Data.config import BOT_MODE
 from log import logger
 
 
@@ -28,6 +33,7 @@ async def load_channels_from_db():
 async def main():
     """Основная функция запуска бота"""
     bot = None
+    dp = None
     try:
         logger.info("=" * 50)
         logger.info("🚀 Запуск Task Manager Bot...")
@@ -46,6 +52,13 @@ async def main():
         await create_tables()
         logger.info("✅ Таблицы базы данных проверены")
         
+        log_writer.start()
+        partition_maintenance.start()
+        
+        if isinstance(dp.storage, PostgresStorage):
+            dp.storage.start_cleanup()
+        logger.info(f"✅ Хранилище FSM: {type(dp.storage).__name__}")
+        
         await load_channels_from_db()
         logger.info("✅ Каналы загружены из базы данных")
         
@@ -67,7 +80,12 @@ async def main():
         print("=" * 50)
         print("")
         
-        await dp.start_polling(bot, skip_updates=True)
+        if BOT_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            # Если ранее был выставлен webhook, getUpdates вернёт конфликт
+            await bot.delete_webhook()
+            await dp.start_polling(bot, skip_updates=True)
         
     except KeyboardInterrupt:
         logger.info("⚠️ Получен сигнал остановки (Ctrl+C)")
@@ -77,10 +95,19 @@ async def main():
         print(f"❌ Критическая ошибка: {type(e).__name__}: {str(e)}")
         raise
     finally:
+        if dp:
+            await dp.storage.close()
+            logger.info("🔌 Хранилище FSM закрыто")
+        
         if bot:
             await bot.session.close()
             logger.info("🔌 Сессия бота закрыта")
         
+        await partition_maintenance.close()
+        
+        # Дописываем журнал действий до закрытия соединений
+        await log_writer.close()
+        
         await engine.dispose()
         logger.info("🔌 Соединение с базой данных закрыто")
         print("🔌 Соединение с базой данных закрыто")